@@ -1,14 +1,73 @@
+import time
+
 import streamlit as st
-import pandas as pd
-from dotenv import load_dotenv
-import src.data as data_processor
-import src.llm as llm_handler
+from src.startup import lazy_module, load_env
+from src import telemetry
+from src.stream_parser import ReportStreamParser
 
 # Load environment variables
-load_dotenv()
+load_env()
+
+# Imported on first use, so the landing page renders without pandas or openai (see src/startup.py).
+data_processor = lazy_module("src.data")
+audit_jobs = lazy_module("src.jobs")
+materialized = lazy_module("src.materialize")
 
 st.set_page_config(page_title="Marketing Expert Chatbot", page_icon="📈", layout="wide")
 
+# Prometheus exporter, only started when TELEMETRY_PORT is set
+telemetry.serve_metrics()
+
+# Cached data layer. Entries are keyed on the data file's identity (path, mtime, size),
+# so new data gets picked up on its own; "Reload data" in the sidebar clears them explicitly.
+# max_entries caps memory: at most two versions of the full DataFrame (only loaded for
+# Show Raw Data) are kept around.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_data_cached(path, mtime_ns, size):
+    return data_processor.load_data(path)
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_daily_cached(path, mtime_ns, size):
+    return data_processor.load_daily_partials(path)
+
+# Files over DATA_STREAMING_MB are never loaded whole: they are aggregated in chunks once
+# per version of the file, and every category's metrics come from those partials.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def load_aggregates_cached(path, mtime_ns, size):
+    return data_processor.aggregate_data(path)
+
+# Audits only load the columns their category needs (src/schema.py). The frame is not kept:
+# once the category's metrics are cached it is never read again.
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_metrics_cached(path, mtime_ns, size, category):
+    if data_processor.use_streaming(path):
+        return data_processor.get_metrics_from_aggregates(category, load_aggregates_cached(path, mtime_ns, size))
+    return data_processor.get_metrics_for_category(category, data_processor.load_data(path, category=category),
+                                                   daily=load_daily_cached(path, mtime_ns, size))
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def metric_card_html(label, value):
+    return f"""
+    <div style="
+        background-color: white; 
+        padding: 18px; 
+        border-radius: 12px; 
+        box-shadow: 0 2px 8px rgba(0,0,0,0.10); 
+        border: 2px solid #6366f1;
+        text-align: center;
+        height: 100%;
+    ">
+        <span style="display:block; font-size:1.1em; font-weight:400; color:#4338ca; margin-bottom:6px; letter-spacing:0.03em;">{label}</span>
+        <span style="display:block; font-size:2.1em; font-weight:400; color:#111827;">{value}</span>
+    </div>
+    """
+
+def clear_data_caches():
+    load_data_cached.clear()
+    load_daily_cached.clear()
+    load_aggregates_cached.clear()
+    get_metrics_cached.clear()
+
 # Custom CSS for styling
 st.markdown("""
 <style>
@@ -50,8 +109,16 @@ st.markdown('<p class="sub-header">Select a category below to analyze your marke
 # Sidebar for debug/context
 with st.sidebar:
     st.header("Debug Info")
+    if st.button("Reload data"):
+        clear_data_caches()
+    fast_mode = st.checkbox("Fast mode", help="Answer clear-cut cases with the local rules engine and only ask the AI about the rest")
     if st.checkbox("Show Raw Data"):
-        df = data_processor.load_data()
+        data_identity = data_processor.file_identity()
+        if data_processor.use_streaming(data_identity[0]):
+            df = data_processor.load_preview(data_identity[0])
+            st.caption("Large file: showing the first 1,000 rows.")
+        else:
+            df = load_data_cached(*data_identity)
         if df is not None:
             st.dataframe(df)
         else:
@@ -62,11 +129,32 @@ if "selected_category" not in st.session_state:
     st.session_state.selected_category = ""
 if "run_analysis" not in st.session_state:
     st.session_state.run_analysis = False
+if "audit_job_id" not in st.session_state:
+    st.session_state.audit_job_id = None
+if "regenerate" not in st.session_state:
+    st.session_state.regenerate = False
+
+def show_job(job):
+    """
+    Makes job this session's audit; the session's previous audit is cancelled.
+    """
+    previous_job_id = st.session_state.audit_job_id
+    st.session_state.audit_job_id = job.id
+    if previous_job_id and previous_job_id != job.id:
+        audit_jobs.get_executor().cancel(previous_job_id)
+    elif previous_job_id == job.id:
+        # Re-clicking the running audit joined it a second time; keep one subscription so
+        # that Cancel still stops it.
+        audit_jobs.get_executor().unsubscribe(job.id)
 
 def handle_click_category(category_name):
     st.session_state.selected_category = category_name
     st.session_state.run_analysis = True
 
+def handle_click_regenerate(category_name):
+    handle_click_category(category_name)
+    st.session_state.regenerate = True
+
 # Recommended Categories
 st.subheader("💡 Choose a Category to Analyze")
 col1, col2 = st.columns(2)
@@ -122,131 +210,212 @@ with col4:
 
 st.markdown("---") # Section divider
 
+def render_report_html(report):
+    """
+    Builds the AI Evaluation Report block. Sections that have not arrived yet render empty.
+    """
+    return """
+    <div style="margin-top: 2.5em; margin-bottom: 1.5em;">
+        <div style="font-size:2.0em; font-weight:900; color:#4338ca; margin-bottom:0.5em;">📝 AI Evaluation Report</div>
+        <div style="font-size:1.3em; font-weight:800; color:#1e293b; margin-bottom:1.2em;">{headline}</div>
+        <div style="font-size:1.1em; font-weight:400; color:#0f172a; margin-bottom:1.1em;">
+            <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🔬 Analysis:</span><br>{analysis}</span>
+            <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🚨 Core Issue:</span><br>{core_issue}</span>
+            <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">📉 Why it matters:</span><br>{why_it_matters}</span>
+            <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">✅ Recommended Action:</span><br>{recommended_action}</span>
+            <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🔮 Expected Outcome:</span><br>{expected_outcome}</span>
+        </div>
+    </div>
+    """.format(
+        headline=report.get('headline', 'Analysis Report'),
+        analysis=report.get('analysis', ''),
+        core_issue=report.get('core_issue', ''),
+        why_it_matters=report.get('why_it_matters', ''),
+        recommended_action=report.get('recommended_action', ''),
+        expected_outcome=report.get('expected_outcome', '')
+    )
+
+
 # Main Logic
+# Audits precomputed for the current data (src/materialize.py) are a lookup. Otherwise they run
+# as background jobs (src/jobs.py). The session only keeps the job id, so the report keeps
+# streaming across reruns, and identical audits started by other sessions are shared.
 if st.session_state.run_analysis and st.session_state.selected_category:
     category = st.session_state.selected_category
-    
-    st.markdown(f"<h2 style='text-align: center; color: #4338ca;'>Analysis: {category}</h2>", unsafe_allow_html=True)
-
-    with st.spinner(f"Generating detailed report for {category}..."):
-        try:
-            # 1. Data Retrieval
-            df = data_processor.load_data()
-            if df is not None:
-                metrics = data_processor.get_metrics_for_category(category, df)
-                
-                # 2. LLM Generation
-                if "error" in metrics:
-                    st.error(metrics["error"])
-                else:
-                    # Display Metrics nicely in a grid
-                    st.markdown("### Key Metrics")
-                    
-                    # Define strict UI cards with emojis
-                    # Format numbers nicely
-                    revenue = metrics.get('Total Revenue', 0)
-                    spend = metrics.get('Total Spend', 0)
-                    formatted_revenue = f"${revenue:,.0f}" if isinstance(revenue, (int, float)) else str(revenue)
-                    formatted_spend = f"${spend:,.0f}" if isinstance(spend, (int, float)) else str(spend)
-                    
-                    # Note: Using 'Total Conversions' as proxy for New Customers if 'Total New Customers' is missing/0 based on data.py logic
-                    new_customers = metrics.get('Total New Customers', metrics.get('Total Conversions', 0))
-                    
-                    ui_cards = [
-                        ("📢 Campaign Name", metrics.get('Campaign Name', 'Unknown')),
-                        ("👥 Total New Customers", str(new_customers)),
-                        ("💰 Total Revenue", formatted_revenue),
-                        ("💸 Total Spend", formatted_spend)
-                    ]
-                    
-                    cols = st.columns(4)
-                    for idx, (label, value) in enumerate(ui_cards):
-                        with cols[idx]:
-                            st.markdown(f"""
-                            <div style="
-                                background-color: white; 
-                                padding: 18px; 
-                                border-radius: 12px; 
-                                box-shadow: 0 2px 8px rgba(0,0,0,0.10); 
-                                border: 2px solid #6366f1;
-                                text-align: center;
-                                height: 100%;
-                            ">
-                                <span style="display:block; font-size:1.1em; font-weight:400; color:#4338ca; margin-bottom:6px; letter-spacing:0.03em;">{label}</span>
-                                <span style="display:block; font-size:2.1em; font-weight:400; color:#111827;">{value}</span>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-
-                    # Generate AI Response (now returns JSON string)
-                    response_json_str = llm_handler.generate_response(f"Analyze metrics for {category}", category, metrics)
-                    
-                    try:
-                        import json
-                        # Attempt to parse as JSON
-                        report = json.loads(response_json_str)
-                        
-                        st.markdown("""
-                        <div style="margin-top: 2.5em; margin-bottom: 1.5em;">
-                            <div style="font-size:2.0em; font-weight:900; color:#4338ca; margin-bottom:0.5em;">📝 AI Evaluation Report</div>
-                            <div style="font-size:1.3em; font-weight:800; color:#1e293b; margin-bottom:1.2em;">{headline}</div>
-                            <div style="font-size:1.1em; font-weight:400; color:#0f172a; margin-bottom:1.1em;">
-                                <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🔬 Analysis:</span><br>{analysis}</span>
-                                <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🚨 Core Issue:</span><br>{core_issue}</span>
-                                <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">📉 Why it matters:</span><br>{why_it_matters}</span>
-                                <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">✅ Recommended Action:</span><br>{recommended_action}</span>
-                                <span style="display:block; margin-bottom:0.7em;"><span style="font-weight:800;">🔮 Expected Outcome:</span><br>{expected_outcome}</span>
-                            </div>
-                        </div>
-                        """.format(
-                            headline=report.get('headline', 'Analysis Report'),
-                            analysis=report.get('analysis', ''),
-                            core_issue=report.get('core_issue', ''),
-                            why_it_matters=report.get('why_it_matters', ''),
-                            recommended_action=report.get('recommended_action', ''),
-                            expected_outcome=report.get('expected_outcome', '')
-                        ), unsafe_allow_html=True)
-                        
-                        # Check confidence score and normalize it
-                        confidence = report.get('confidence_score', 0)
-                        if isinstance(confidence, str):
-                            try:
-                                confidence = int(confidence.strip('%'))
-                            except ValueError:
-                                confidence = 0
-                        
-                        # Ensure confidence is within 0-100 range
-                        confidence = max(0, min(100, confidence))
-                        
-                        st.progress(confidence / 100, text=f"Confidence Score: {confidence}%")
-                        
-                        # Detected Issues List
-                        with st.expander("Detailed Issues Found"):
-                            for issue in report.get('detected_issues', []):
-                                st.write(f"- {issue}")
-                                
-                    except json.JSONDecodeError:
-                        # Fallback if LLM didn't return valid JSON
-                        st.markdown("### 📝 AI Evaluation Report")
-                        st.markdown(f"""
-                        <div style="
-                            background-color: #f8fafc; 
-                            padding: 25px; 
-                            border-radius: 12px; 
-                            border-left: 5px solid #4338ca;
-                            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-                            font-family: 'Helvetica', sans-serif;
-                            line-height: 1.6;
-                            color: #374151;
-                        ">
-                            {response_json_str}
-                        </div>
-                        """, unsafe_allow_html=True)
+    # Regenerate skips the precomputed audit, the response cache and the near-duplicate index.
+    refresh = st.session_state.regenerate
+    try:
+        data_identity = data_processor.file_identity()
+        stored = (materialized.lookup(category, data_identity[0])
+                  if data_identity[1] is not None and not refresh else None)
+        if stored is not None:
+            show_job(audit_jobs.materialized_audit(category, stored))
+        elif data_identity[1] is None:
+            st.error("Data file not found. Please check data/campaign_data.csv")
+        else:
+            metrics = get_metrics_cached(*data_identity, category)
+            if "error" in metrics:
+                st.markdown(f"<h2 style='text-align: center; color: #4338ca;'>Analysis: {category}</h2>", unsafe_allow_html=True)
+                st.error(metrics["error"])
             else:
-                st.error("Data file not found. Please check data/campaign_data.csv")
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-            
-    # Reset analysis flag
+                show_job(audit_jobs.submit_audit(category, metrics, fast=fast_mode, refresh=refresh))
+    except Exception as e:
+        st.error(f"An error occurred: {e}")
+
+    # Reset analysis flags
     st.session_state.run_analysis = False
+    st.session_state.regenerate = False
+
+job = audit_jobs.get_executor().get(st.session_state.audit_job_id) if st.session_state.audit_job_id else None
+if job is not None:
+    category = job.meta["category"]
+    metrics = job.meta["metrics"]
+
+    st.markdown(f"<h2 style='text-align: center; color: #4338ca;'>Analysis: {category}</h2>", unsafe_allow_html=True)
+
+    # Display Metrics nicely in a grid
+    st.markdown("### Key Metrics")
+
+    # Define strict UI cards with emojis
+    # Format numbers nicely
+    revenue = metrics.get('Total Revenue', 0)
+    spend = metrics.get('Total Spend', 0)
+    formatted_revenue = f"${revenue:,.0f}" if isinstance(revenue, (int, float)) else str(revenue)
+    formatted_spend = f"${spend:,.0f}" if isinstance(spend, (int, float)) else str(spend)
+
+    # Note: Using 'Total Conversions' as proxy for New Customers if 'Total New Customers' is missing/0 based on data.py logic
+    new_customers = metrics.get('Total New Customers', metrics.get('Total Conversions', 0))
+
+    ui_cards = [
+        ("📢 Campaign Name", metrics.get('Campaign Name', 'Unknown')),
+        ("👥 Total New Customers", str(new_customers)),
+        ("💰 Total Revenue", formatted_revenue),
+        ("💸 Total Spend", formatted_spend)
+    ]
+
+    cols = st.columns(4)
+    for idx, (label, value) in enumerate(ui_cards):
+        with cols[idx]:
+            st.markdown(metric_card_html(label, value), unsafe_allow_html=True)
+
+    if metrics.get('Trend'):
+        with st.expander("📅 Trend"):
+            st.text(metrics['Trend'])
+
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # Clicking Cancel reruns the script, which stops the polling loop below; the job itself
+    # stops once no session is waiting for it.
+    if not job.done and st.button("Cancel analysis"):
+        audit_jobs.get_executor().cancel(job.id)
+        st.session_state.audit_job_id = None
+        st.info("Analysis cancelled.")
+    else:
+        # Report sections show up as soon as each one is complete in the job's output.
+        report_placeholder = st.empty()
+        status_placeholder = st.empty()
+        stream_parser = ReportStreamParser()
+        seen = 0
+        with st.spinner(f"Generating detailed report for {category}..."):
+            while True:
+                chunks, done = job.read(seen, timeout=0.5)
+                seen += len(chunks)
+                if stream_parser.feed("".join(chunks)):
+                    report_placeholder.markdown(render_report_html(stream_parser.fields), unsafe_allow_html=True)
+                if done or job.cancelled:
+                    break
+                # A Streamlit call on every poll lets a Cancel click (a rerun request) stop
+                # this loop right away instead of after the next completed section.
+                status_placeholder.caption(f"Running for {time.monotonic() - job.submitted_at:.0f}s")
+        status_placeholder.empty()
+        response_json_str = job.text
+        parsed = job.result
+        report = parsed.report if parsed is not None and parsed.report else None
+
+        if job.status == audit_jobs.FAILED:
+            report_placeholder.empty()
+            st.error(f"An error occurred: {job.error}")
+        elif job.status == audit_jobs.CANCELLED:
+            report_placeholder.empty()
+            st.info("Analysis cancelled.")
+        elif report is not None:
+            timings = job.timings
+            with telemetry.timed("render"):
+                report_placeholder.markdown(render_report_html(report), unsafe_allow_html=True)
+
+            if "materialized_at" in timings:
+                stored_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(timings["materialized_at"]))
+                st.caption(f"Precomputed for the current data on {stored_at}")
+            elif timings.get("local"):
+                st.caption("Answered by the rule-based pre-audit (fast mode)")
+            elif "similar_max_change" in timings:
+                st.caption(f"⚠️ Reused the report of an earlier audit with near-identical metrics "
+                           f"(every metric within {timings['similar_max_change']:.1%}); Regenerate for a fresh one")
+            elif timings.get("cached"):
+                st.caption("Served from the response cache")
+            elif "first_token_seconds" in timings:
+                st.caption(
+                    f"First content after {timings['first_token_seconds']:.2f}s"
+                    + (f", first section after {timings['first_field_seconds']:.2f}s" if "first_field_seconds" in timings else "")
+                    + f", full report after {timings['total_seconds']:.2f}s"
+                )
+            if "materialized_at" in timings or "similar_max_change" in timings or timings.get("cached"):
+                st.button("Regenerate", key="regenerate_report", on_click=handle_click_regenerate, args=(category,),
+                          help="Ask the model again instead of reusing a stored report")
+
+            # Check confidence score and normalize it
+            confidence = report.get('confidence_score', 0)
+            if isinstance(confidence, str):
+                try:
+                    confidence = int(confidence.strip('%'))
+                except ValueError:
+                    confidence = 0
+
+            # Ensure confidence is within 0-100 range
+            confidence = max(0, min(100, confidence))
+
+            st.progress(confidence / 100, text=f"Confidence Score: {confidence}%")
+
+            # Detected Issues List
+            with st.expander("Detailed Issues Found"):
+                for issue in report.get('detected_issues', []):
+                    st.write(f"- {issue}")
+
+        else:
+            # Fallback if nothing usable came back (e.g. an error message)
+            report_placeholder.empty()
+            st.markdown("### 📝 AI Evaluation Report")
+            st.markdown(f"""
+            <div style="
+                background-color: #f8fafc; 
+                padding: 25px; 
+                border-radius: 12px; 
+                border-left: 5px solid #4338ca;
+                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+                font-family: 'Helvetica', sans-serif;
+                line-height: 1.6;
+                color: #374151;
+            ">
+                {response_json_str}
+            </div>
+            """, unsafe_allow_html=True)
+
+# Hidden debug panel: open the app with ?debug=1
+if st.query_params.get("debug") == "1":
+    with st.sidebar.expander("Performance", expanded=True):
+        telemetry.enable(st.checkbox("Record timings", value=telemetry.enabled()))
+        snap = telemetry.snapshot()
+        rows = [
+            {"metric": name, "count": hist["count"],
+             "p50": round(hist["quantiles"][0.5], 4),
+             "p95": round(hist["quantiles"][0.95], 4),
+             "p99": round(hist["quantiles"][0.99], 4)}
+            for name, hist in sorted(snap["histograms"].items())
+        ]
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        if snap["recent_audits"]:
+            last = snap["recent_audits"][-1]
+            st.caption(f"Last audit: {last['seconds']:.2f}s, {last['prompt_tokens']} prompt + "
+                       f"{last['completion_tokens']} completion tokens, ${last['cost_usd']:.5f}")
+        st.code(telemetry.render_prometheus(), language="text")
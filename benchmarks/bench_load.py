@@ -0,0 +1,117 @@
+"""
+Load time and memory of campaign data: pandas' inferred types vs the typed schema
+(src/schema.py), with and without per-category column pruning and the columnar store,
+and out-of-core chunked aggregation (src/chunked.py; frame size is its daily partials).
+
+Each mode runs in a fresh interpreter, so peak RSS is not polluted by earlier runs. The
+peak is reported above the interpreter's RSS once pandas is imported, alongside the
+size of the resulting DataFrame.
+
+Run from the project root:
+    python -m benchmarks.bench_load --rows 1000000 [--json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADERS = {
+    "inferred": "pd.read_csv(path)",
+    "schema": "read_campaign_csv(path)",
+    "schema_one_category": "read_campaign_csv(path, columns_for('Customer Acquisition'))",
+    "store_warm": "load_data(path)",
+    # Out-of-core: never holds the whole file; the result is partials, not rows.
+    "chunked": "aggregate_data(path, chunk_bytes=16 * 2**20)",
+}
+
+# ru_maxrss survives fork+exec on Linux (the child would report the parent's peak), so the
+# peak comes from VmHWM, which starts over with every new process image.
+_CHILD = """
+import json, resource, sys, time
+import pandas as pd
+from src.data import aggregate_data, load_data
+from src.schema import columns_for, memory_usage, read_campaign_csv
+
+def peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+path = sys.argv[1]
+baseline = peak_rss()
+started = time.perf_counter()
+df = {loader}
+seconds = time.perf_counter() - started
+frame = df.daily if hasattr(df, "daily") else df
+print(json.dumps({{"seconds": seconds, "peak_rss_bytes": peak_rss() - baseline,
+                  "frame_bytes": memory_usage(frame), "rows": getattr(df, "rows", len(frame))}}))
+"""
+
+
+def measure(path, mode, repeat=1):
+    """
+    Best of `repeat` fresh interpreters loading path with one of LOADERS.
+    """
+    runs = []
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-c", _CHILD.format(loader=LOADERS[mode]), path],
+                              cwd=ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{mode} failed:\n{proc.stderr[-2000:]}")
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["seconds"])
+    return {"name": f"load.{mode}", "rows": best["rows"], "seconds": round(best["seconds"], 6),
+            "peak_rss_mb": round(max(run["peak_rss_bytes"] for run in runs) / 2**20, 1),
+            "frame_mb": round(best["frame_bytes"] / 2**20, 1)}
+
+
+def bench(path, repeat=1):
+    """
+    All LOADERS on one CSV. The store is built first so store_warm measures a warm open.
+    """
+    from src.data import load_data
+
+    load_data(path)
+    return [measure(path, mode, repeat) for mode in LOADERS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--campaigns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+
+    from benchmarks.synth import write_csv
+    from src import ingest
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        for n_rows in args.rows:
+            path = write_csv(os.path.join(workdir, f"campaigns_{n_rows}.csv"), n_rows, n_campaigns=args.campaigns)
+            results.extend(bench(path, args.repeat))
+            shutil.rmtree(ingest.default_store_dir(path), ignore_errors=True)
+            os.remove(path)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<28} {'rows':>10} {'seconds':>9} {'peak RSS MB':>12} {'frame MB':>9}")
+    for result in results:
+        print(f"{result['name']:<28} {result['rows']:>10} {result['seconds']:>9.3f} "
+              f"{result['peak_rss_mb']:>12.1f} {result['frame_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
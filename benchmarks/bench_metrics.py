@@ -0,0 +1,43 @@
+"""
+Benchmark for the vectorized metrics engine (src/metrics.py).
+
+Times one pass that produces the metrics for all four categories, ungrouped and
+grouped by campaign_name / channel / date, at increasing row counts.
+
+Run from the project root:
+    python -m benchmarks.bench_metrics --rows 1000 10000 100000 1000000
+"""
+import argparse
+import time
+
+from benchmarks.synth import make_frame
+from src.metrics import compute_all_metrics
+
+
+def time_call(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    groupings = [None, "campaign_name", "channel", "date", ["campaign_name", "channel"]]
+    print(f"{'rows':>10} {'group_by':>28} {'seconds':>10} {'rows/s':>14}")
+    for n_rows in args.rows:
+        df = make_frame(n_rows)
+        for group_by in groupings:
+            seconds = time_call(lambda: compute_all_metrics(df, group_by=group_by), args.repeat)
+            label = "+".join(group_by) if isinstance(group_by, list) else str(group_by)
+            print(f"{n_rows:>10} {label:>28} {seconds:>10.4f} {n_rows / seconds:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Reports input tokens per category before and after prompt compaction (src/prompts.py),
+and how much of the system prompt is a prefix shared by every category.
+
+Run from the project root:
+    python -m benchmarks.bench_prompts [--data data/campaign_data.csv]
+"""
+import argparse
+import json
+
+import src.data as data_processor
+from src.llm import user_prompt_fields
+from src.metrics import CATEGORIES
+from src.prompts import compaction_report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/campaign_data.csv")
+    parser.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = parser.parse_args()
+
+    df = data_processor.load_data(args.data)
+    metrics = {category: data_processor.get_metrics_for_category(category, df) for category in CATEGORIES}
+    report = compaction_report(metrics, user_prompt_fields)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Token counts ({report['method']})")
+    print(f"{'category':<24} {'before':>8} {'after':>8} {'saved':>8}")
+    for category, entry in report["categories"].items():
+        print(f"{category:<24} {entry['original']['total']:>8} {entry['compact']['total']:>8} {entry['saved_pct']:>7}%")
+    print(f"Shared system prefix: {report['shared_prefix_tokens_original']} tokens before, "
+          f"{report['shared_prefix_tokens_compact']} after")
+
+
+if __name__ == "__main__":
+    main()
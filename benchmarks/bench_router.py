@@ -0,0 +1,119 @@
+"""
+Tail latency of routed LLM calls (src/router.py) while one model endpoint is degraded.
+
+The mock server answers the primary model with a latency tail (--slow-rate of requests
+take --slow-latency seconds) and optionally errors (--failure-rate); the fallback model
+is healthy but a little slower. The same calls then run under three routers:
+    single   the primary model only, no hedging (what the app did before routing)
+    fallback primary, then the fallback model on errors
+    hedged   fallback, plus a hedge on the next model after the primary's p95
+and the p50/p95/p99 latency, error count and requests per model are reported.
+
+Run from the project root:
+    python -m benchmarks.bench_router [--calls 300] [--stream] [--json]
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.mock_openai import serve_in_thread
+from src.client import ClientConfig, ClientManager
+from src.router import Router
+
+PRIMARY = "gpt-4o-mini"
+FALLBACK = "gpt-4.1-mini"
+MESSAGES = [
+    {"role": "system", "content": "You are a marketing analyst."},
+    {"role": "user", "content": "Audit this campaign."},
+]
+
+ROUTERS = {
+    "single": dict(default_route=[PRIMARY], hedge=False),
+    "fallback": dict(default_route=[PRIMARY, FALLBACK], hedge=False),
+    "hedged": dict(default_route=[PRIMARY, FALLBACK], hedge=True),
+}
+
+
+def run(name, server, calls, workers, stream, deadline, hedge_after):
+    """
+    `calls` routed requests from `workers` threads with one of ROUTERS.
+    """
+    # SDK retries off: the router's fallback is what is being measured.
+    manager = ClientManager(ClientConfig(api_key="mock", base_url=server.base_url, max_retries=0,
+                                         max_connections=workers * 3, max_keepalive=workers * 3))
+    router = Router(deadline=deadline, hedge_after=hedge_after, manager=manager, **ROUTERS[name])
+    before = dict(server.model_counts)
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            if stream:
+                routed = router.stream("Revenue Growth", messages=MESSAGES)
+                try:
+                    for _ in routed:
+                        pass
+                finally:
+                    routed.close()
+            else:
+                router.complete("Revenue Growth", messages=MESSAGES)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - started, failed
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(one, range(calls)))
+    manager.close()
+    latencies = np.array([latency for latency, _ in outcomes])
+    requests = {model: count - before.get(model, 0) for model, count in server.model_counts.items()
+                if count - before.get(model, 0)}
+    return {
+        "name": f"router.{name}", "calls": calls, "stream": stream,
+        "p50_seconds": round(float(np.quantile(latencies, 0.5)), 4),
+        "p95_seconds": round(float(np.quantile(latencies, 0.95)), 4),
+        "p99_seconds": round(float(np.quantile(latencies, 0.99)), 4),
+        "errors": int(sum(failed for _, failed in outcomes)),
+        "requests": requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1, help="Primary model latency")
+    parser.add_argument("--fallback-latency", type=float, default=0.15)
+    parser.add_argument("--slow-rate", type=float, default=0.08, help="Share of primary requests in the tail")
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="Share of primary requests failing")
+    parser.add_argument("--deadline", type=float, default=10.0)
+    parser.add_argument("--hedge-after", type=float, default=0.5, help="Hedge delay until a p95 is known")
+    parser.add_argument("--stream", action="store_true", help="Race streams to their first chunk instead")
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    args = parser.parse_args()
+
+    server = serve_in_thread(latency=args.latency, seed=0, model_profiles={
+        PRIMARY: {"slow_rate": args.slow_rate, "slow_latency": args.slow_latency, "failure_rate": args.failure_rate},
+        FALLBACK: {"latency": args.fallback_latency},
+    })
+    try:
+        results = [run(name, server, args.calls, args.workers, args.stream, args.deadline, args.hedge_after)
+                   for name in ROUTERS]
+    finally:
+        server.shutdown()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'router':<18} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}  requests")
+    for result in results:
+        requests = ", ".join(f"{model}={count}" for model, count in sorted(result["requests"].items()))
+        print(f"{result['name']:<18} {result['p50_seconds']:>8.3f} {result['p95_seconds']:>8.3f} "
+              f"{result['p99_seconds']:>8.3f} {result['errors']:>7}  {requests}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold-start cost of app.py, measured with `python -X importtime` in fresh interpreters.
+
+Each run executes app.py once in Streamlit's bare mode (no server, nothing clicked), which
+is the work done before the landing page renders, and reports the wall time, the time
+spent importing, the slowest top-level imports and whether any of the heavy modules
+(pandas, numpy, pyarrow, openai) were loaded. The "first audit" scenario then imports
+what a category click needs, for comparison.
+
+Run from the project root:
+    python -m benchmarks.bench_startup [--repeat 5] [--json] [--check]
+
+--check exits non-zero if the landing page pulled in a heavy module.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "openai")
+
+# Runs inside the measured interpreter; prints its result as the last stdout line.
+SCENARIOS = {
+    "landing_page": """
+import runpy, sys, time
+started = time.perf_counter()
+import streamlit
+runpy.run_path("app.py", run_name="__main__")
+""",
+    "first_audit": """
+import runpy, sys, time
+started = time.perf_counter()
+import streamlit
+runpy.run_path("app.py", run_name="__main__")
+import src.data, src.jobs
+""",
+}
+REPORT = """
+import json
+print(json.dumps({"seconds": time.perf_counter() - started,
+                  "heavy": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """
+    Returns (total import seconds, {top-level module: cumulative seconds}) from
+    -X importtime output.
+    """
+    total_us, top = 0, {}
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        total_us += int(self_us)
+        # Nested imports are indented by two spaces per level.
+        if len(indent) <= 1:
+            top[name] = top.get(name, 0) + int(cumulative_us) / 1e6
+    return total_us / 1e6, top
+
+
+def run_once(scenario):
+    env = dict(os.environ, STREAMLIT_BROWSER_GATHER_USAGE_STATS="false")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", SCENARIOS[scenario] + REPORT],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{scenario} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["import_seconds"], result["top_imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def measure(scenario, repeat):
+    """
+    Best of `repeat` fresh interpreters (by wall time).
+    """
+    runs = [run_once(scenario) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run["seconds"])
+    slowest = sorted(best["top_imports"].items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "name": f"startup.{scenario}",
+        "seconds": round(best["seconds"], 4),
+        "import_seconds": round(best["import_seconds"], 4),
+        "heavy_modules": best["heavy"],
+        "slowest_imports": [{"module": name, "seconds": round(seconds, 4)} for name, seconds in slowest],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print the raw results as JSON")
+    parser.add_argument("--check", action="store_true", help="Fail if the landing page imports a heavy module")
+    args = parser.parse_args()
+
+    results = [measure(scenario, args.repeat) for scenario in SCENARIOS]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            heavy = ", ".join(result["heavy_modules"]) or "none"
+            print(f"{result['name']:<22} {result['seconds']:.3f}s wall, {result['import_seconds']:.3f}s importing, "
+                  f"heavy modules: {heavy}")
+            for entry in result["slowest_imports"][:5]:
+                print(f"    {entry['module']:<30} {entry['seconds']:.3f}s")
+
+    if args.check and results[0]["heavy_modules"]:
+        print(f"Landing page imported {', '.join(results[0]['heavy_modules'])}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
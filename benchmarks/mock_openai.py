@@ -0,0 +1,289 @@
+"""
+Local fake OpenAI-compatible chat-completions server.
+
+Answers POST /v1/chat/completions with a canned audit report (one per campaign for
+multi-campaign requests) after a configurable delay, streamed as server-sent events
+when the request sets "stream": true, so the batch runner and benchmarks can run
+without the real API. A share of requests can be made
+to fail with HTTP 429 or 500 to exercise the retry paths, or to take --slow-latency
+seconds instead (a latency tail). --model gives one model its own settings, so a
+degraded endpoint can be simulated for src/router.py.
+
+Run from the project root:
+    python -m benchmarks.mock_openai --port 8011 --latency 0.2 [--failure-rate 0.05 --rate-limit-rate 0.05]
+        [--model gpt-4o:latency=2,failure_rate=0.5]
+then point the client at it with OPENAI_BASE_URL=http://127.0.0.1:8011/v1
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_REPORT = {
+    "headline": "Mock audit: spend is converting at an average rate",
+    "analysis": "This is a canned response from the local mock server.",
+    "core_issue": "None - mock data",
+    "why_it_matters": "Lets the pipeline run without paying for tokens.",
+    "recommended_action": "Continue",
+    "expected_outcome": "Stable performance",
+    "detected_issues": ["Mock issue 1", "Mock issue 2"],
+    "confidence_score": 80
+}
+
+
+_CAMPAIGN_NAME = re.compile(r"^\s*Name: (.+?)\s*$", re.MULTILINE)
+
+
+def canned_content(request):
+    """
+    The canned report, or for a multi-campaign request (src/portfolio.py) one canned
+    report per campaign named in the prompt.
+    """
+    prompt = "".join(m.get("content", "") for m in request.get("messages", []) if m.get("role") == "user")
+    if '"reports"' not in prompt:
+        return json.dumps(CANNED_REPORT)
+    names = _CAMPAIGN_NAME.findall(prompt)
+    return json.dumps({"reports": [dict(campaign_name=name, **CANNED_REPORT) for name in names]})
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        try:
+            self._chat_completion()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away, e.g. it closed a hedged request that lost
+
+    def _chat_completion(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record_request(request)
+        profile = self.server.profile(request.get("model"))
+
+        failure = self.server.pick_failure(profile)
+        if failure is not None:
+            time.sleep(profile["latency"] / 4)
+            self._send_failure(failure)
+            return
+
+        latency = self.server.pick_latency(profile)
+        content = canned_content(request)
+        if request.get("stream"):
+            # A slow stream is slow to start (e.g. queued upstream), then streams at the usual pace.
+            time.sleep(max(0.0, latency - profile["latency"]))
+            self._stream(request, content, profile["latency"])
+            return
+
+        time.sleep(latency)
+
+        prompt_tokens, completion_tokens = self._usage(request, content)
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock-model"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _send_failure(self, status):
+        body = json.dumps({"error": {"message": f"Mock failure ({status})", "type": "mock_error"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _usage(self, request, content):
+        prompt_text = "".join(m.get("content", "") for m in request.get("messages", []))
+        return _estimate_tokens(prompt_text), _estimate_tokens(content)
+
+    def _stream(self, request, content, latency, chunk_size=16):
+        """
+        Sends the content as server-sent events, spreading the latency across the chunks.
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        delay = latency / max(len(pieces), 1)
+        for piece in pieces:
+            time.sleep(delay)
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock-model"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if (request.get("stream_options") or {}).get("include_usage"):
+            prompt_tokens, completion_tokens = self._usage(request, content)
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock-model"),
+                "choices": [],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            }
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, verbose=False, failure_rate=0.0,
+                 rate_limit_rate=0.0, seed=None, slow_rate=0.0, slow_latency=0.0, model_profiles=None):
+        super().__init__((host, port), MockHandler)
+        self.latency = latency
+        self.verbose = verbose
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # model -> overrides of latency, failure_rate, rate_limit_rate, slow_rate, slow_latency
+        self.model_profiles = dict(model_profiles or {})
+        self.request_count = 0
+        self.failure_count = 0
+        self.model_counts = {}
+        self._random = random.Random(seed)
+        self._count_lock = threading.Lock()
+
+    def record_request(self, request):
+        with self._count_lock:
+            self.request_count += 1
+            model = request.get("model")
+            self.model_counts[model] = self.model_counts.get(model, 0) + 1
+
+    def profile(self, model):
+        """
+        The settings that apply to requests for model.
+        """
+        profile = {"latency": self.latency, "failure_rate": self.failure_rate,
+                   "rate_limit_rate": self.rate_limit_rate, "slow_rate": self.slow_rate,
+                   "slow_latency": self.slow_latency}
+        profile.update(self.model_profiles.get(model, {}))
+        return profile
+
+    def pick_latency(self, profile):
+        """
+        The profile's latency, or its slow_latency for the share of requests set by slow_rate.
+        """
+        with self._count_lock:
+            slow = self._random.random() < profile["slow_rate"]
+        return profile["slow_latency"] if slow else profile["latency"]
+
+    def pick_failure(self, profile=None):
+        """
+        Returns 429 or 500 for the share of requests configured to fail, else None.
+        """
+        profile = profile or self.profile(None)
+        with self._count_lock:
+            roll = self._random.random()
+            if roll < profile["rate_limit_rate"]:
+                status = 429
+            elif roll < profile["rate_limit_rate"] + profile["failure_rate"]:
+                status = 500
+            else:
+                return None
+            self.failure_count += 1
+            return status
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def serve_in_thread(**kwargs):
+    """
+    Starts a MockOpenAIServer on a background thread (port 0 picks a free port).
+    Call server.shutdown() when done.
+    """
+    server = MockOpenAIServer(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_model_profile(value):
+    """
+    "gpt-4o:latency=2,failure_rate=0.5" -> ("gpt-4o", {"latency": 2.0, "failure_rate": 0.5})
+    """
+    model, _, settings = value.partition(":")
+    profile = {}
+    for setting in filter(None, settings.split(",")):
+        key, _, number = setting.partition("=")
+        profile[key.strip()] = float(number)
+    return model.strip(), profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds to wait before answering")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with HTTP 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests answered after --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--model", action="append", default=[], metavar="NAME:KEY=VALUE,...",
+                        help="Settings for one model, e.g. gpt-4o:latency=2,failure_rate=0.5")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.verbose,
+                              failure_rate=args.failure_rate, rate_limit_rate=args.rate_limit_rate,
+                              slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+                              model_profiles=dict(parse_model_profile(value) for value in args.model))
+    print(f"Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Benchmark suite for the whole request path, run against synthetic data and the local
+mock OpenAI server (no API key or network needed).
+
+Times app.py's cold start (see bench_startup.py), then, per data size: load_data
+(plain CSV, first ingest into the store, warm store), load time and peak memory with and
+without the typed schema (see bench_load.py), get_metrics_for_category, and prompt
+construction; then end-to-end generate_response throughput against the mock server. Results are written as JSON so runs can be compared.
+
+Run from the project root:
+    python -m benchmarks.suite --rows 1 10000 1000000
+    python -m benchmarks.suite --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import bench_load, bench_startup
+from benchmarks.mock_openai import serve_in_thread
+from benchmarks.synth import write_csv
+from src.metrics import CATEGORIES
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def best_of(fn, repeat):
+    """
+    Runs fn `repeat` times; returns (best seconds, last return value).
+    """
+    best, value = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        value = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, value
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def bench_data(n_rows, workdir, campaigns, repeat):
+    """
+    Data-path timings for one synthetic CSV of n_rows rows.
+    """
+    import src.data as data_processor
+    from src import ingest
+    import src.llm as llm_handler
+
+    path = os.path.join(workdir, f"campaigns_{n_rows}.csv")
+    write_csv(path, n_rows, n_campaigns=campaigns)
+    store_dir = ingest.default_store_dir(path)
+    results = []
+
+    def record(name, seconds, **extra):
+        results.append(dict(name=name, rows=n_rows, seconds=round(seconds, 6), **extra))
+
+    seconds, df = best_of(lambda: data_processor.load_data(path, use_store=False), repeat)
+    record("load_data.csv", seconds, rows_per_second=round(n_rows / seconds))
+
+    def cold_ingest():
+        shutil.rmtree(store_dir, ignore_errors=True)
+        return data_processor.load_data(path)
+    seconds, _ = best_of(cold_ingest, repeat)
+    record("load_data.store_first_ingest", seconds)
+    seconds, df = best_of(lambda: data_processor.load_data(path), repeat)
+    record("load_data.store_warm", seconds)
+
+    seconds, daily = best_of(lambda: data_processor.load_daily_partials(path), repeat)
+    record("load_daily_partials.store_warm", seconds)
+
+    # Peak RSS and frame size per loading mode, each in a fresh interpreter.
+    results.extend(bench_load.bench(path))
+
+    for category in CATEGORIES:
+        seconds, metrics = best_of(lambda: data_processor.get_metrics_for_category(category, df, daily=daily), repeat)
+        record("get_metrics_for_category", seconds, category=category)
+
+    metrics = data_processor.get_metrics_for_category("Revenue Growth", df, daily=daily)
+    calls = 1000
+    seconds, _ = best_of(lambda: [llm_handler.build_messages("Revenue Growth", metrics) for _ in range(calls)], repeat)
+    record("build_messages", seconds / calls, calls=calls)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.remove(path)
+    return results
+
+
+def bench_generate(requests, workers, metrics):
+    """
+    generate_response throughput against the mock server (cache off, so every call is a request).
+    'seconds' is wall time per request, so runs with different request counts compare.
+    """
+    import src.llm as llm_handler
+
+    def one(i):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        started = time.perf_counter()
+        content = llm_handler.generate_response("benchmark", category, metrics, use_cache=False)
+        return time.perf_counter() - started, content.startswith("Error generating response")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+    latencies = np.array([latency for latency, _ in outcomes])
+    return {
+        "name": "generate_response", "requests": requests, "workers": workers,
+        "seconds": round(wall / requests, 6), "wall_seconds": round(wall, 6),
+        "requests_per_second": round(requests / wall, 2),
+        "p50_seconds": round(float(np.quantile(latencies, 0.5)), 6),
+        "p95_seconds": round(float(np.quantile(latencies, 0.95)), 6),
+        "errors": int(sum(failed for _, failed in outcomes)),
+    }
+
+
+def compare(old_path, new_path, threshold):
+    """
+    Prints new/old time ratios for every benchmark in both files. Returns the number of
+    entries that got slower by more than threshold (a fraction).
+    """
+    def index(path):
+        with open(path, "r", encoding="utf-8") as f:
+            results = json.load(f)["results"]
+        return {(r["name"], r.get("rows"), r.get("category"), r.get("workers")): r for r in results}
+
+    old, new = index(old_path), index(new_path)
+    regressions = 0
+    print(f"{'benchmark':<50} {'rows':>10} {'old':>12} {'new':>12} {'ratio':>8}")
+    for key in sorted(old.keys() & new.keys(), key=lambda k: tuple(str(part) for part in k)):
+        name, rows, category, _ = key
+        before, after = old[key]["seconds"], new[key]["seconds"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions += 1
+            flag = "  SLOWER"
+        label = f"{name} ({category})" if category else name
+        print(f"{label:<50} {str(rows or ''):>10} {before:>12.6f} {after:>12.6f} {ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10_000, 1_000_000])
+    parser.add_argument("--campaigns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200, help="generate_response calls (0 to skip)")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent generate_response callers")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock server latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=RESULTS_DIR, help="Directory for the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        return 1 if compare(*args.compare, args.threshold) else 0
+
+    server = serve_in_thread(latency=args.latency, failure_rate=args.failure_rate,
+                             rate_limit_rate=args.rate_limit_rate, seed=0)
+    # The shared client reads these when it is first used.
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    os.environ["LLM_CACHE_DISABLED"] = "1"
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    try:
+        for scenario in bench_startup.SCENARIOS:
+            result = bench_startup.measure(scenario, args.repeat)
+            results.append(result)
+            print(f"{result['name']:<34} {'':>10} {result['seconds']:>12.6f}s", flush=True)
+
+        for n_rows in args.rows:
+            for result in bench_data(n_rows, workdir, args.campaigns, args.repeat):
+                results.append(result)
+                extra = f" [{result['category']}]" if "category" in result else ""
+                if "peak_rss_mb" in result:
+                    extra = f" [peak RSS {result['peak_rss_mb']} MB, frame {result['frame_mb']} MB]"
+                print(f"{result['name']:<34} {n_rows:>10} {result['seconds']:>12.6f}s{extra}", flush=True)
+
+        if args.requests:
+            from benchmarks.synth import make_frame
+            import src.data as data_processor
+            metrics = data_processor.get_metrics_for_category("Revenue Growth", make_frame(1000))
+            result = bench_generate(args.requests, args.workers, metrics)
+            result.update(mock_latency=args.latency, mock_failures=server.failure_count)
+            results.append(result)
+            print(f"generate_response: {result['requests_per_second']} req/s, p50 {result['p50_seconds']:.3f}s, "
+                  f"p95 {result['p95_seconds']:.3f}s, {result['errors']} errors")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "out")},
+        "results": results,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    out_path = os.path.join(args.out, f"suite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Synthetic campaign data with the same columns as data/campaign_data.csv.
+
+Campaigns get their own click-through and conversion rates, order value and budget
+(log-normal, so a few campaigns dominate spend as in real accounts); channels shift
+those rates and days follow a weekly cycle. Large files are written in chunks, so
+10M rows do not need 10M rows in memory.
+
+Run from the project root:
+    python -m benchmarks.synth --rows 1000000 --campaigns 500 --out data/synth_1m.csv
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+CHANNELS = ["Meta", "Google", "TikTok", "LinkedIn", "Email"]
+# Relative click-through and conversion multipliers per channel.
+CHANNEL_CTR = np.array([1.0, 1.6, 0.8, 0.6, 2.5])
+CHANNEL_CVR = np.array([1.0, 1.3, 0.7, 1.1, 1.8])
+CHANNEL_WEIGHTS = np.array([0.35, 0.30, 0.15, 0.10, 0.10])
+
+CHUNK_ROWS = 1_000_000
+
+
+def campaign_profiles(n_campaigns, seed=0):
+    """
+    Per-campaign parameters: base CTR, conversion rate, order value, daily budget and churn.
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        "name": np.array([f"Campaign {i:05d}" for i in range(n_campaigns)], dtype=object),
+        "ctr": np.clip(rng.lognormal(np.log(0.015), 0.5, n_campaigns), 0.001, 0.2),
+        "cvr": np.clip(rng.lognormal(np.log(0.03), 0.6, n_campaigns), 0.002, 0.5),
+        "order_value": rng.lognormal(np.log(45), 0.6, n_campaigns),
+        "budget": rng.lognormal(np.log(800), 1.0, n_campaigns),
+        "csat": np.clip(rng.normal(4.0, 0.4, n_campaigns), 1.0, 5.0),
+        "churn": np.clip(rng.beta(2, 25, n_campaigns), 0.0, 1.0),
+    }
+
+
+def make_frame(n_rows, n_campaigns=200, n_days=365, seed=0, profiles=None, start="2025-01-01"):
+    """
+    Builds a synthetic campaign DataFrame with the same columns as data/campaign_data.csv.
+    """
+    rng = np.random.default_rng(seed + 1)
+    profiles = profiles if profiles is not None else campaign_profiles(n_campaigns, seed)
+    n_campaigns = len(profiles["name"])
+
+    campaign = rng.integers(0, n_campaigns, n_rows)
+    channel = rng.choice(len(CHANNELS), n_rows, p=CHANNEL_WEIGHTS)
+    day = rng.integers(0, n_days, n_rows)
+    dates = pd.date_range(start, periods=n_days)
+    weekly = 1.0 + 0.15 * np.sin(2 * np.pi * dates.dayofweek.to_numpy() / 7)
+
+    spend = np.round(profiles["budget"][campaign] * weekly[day] * rng.gamma(4.0, 0.25, n_rows), 2)
+    cpm = rng.lognormal(np.log(15.0), 0.3, n_rows)
+    impressions = np.maximum((spend / cpm * 1000).astype(np.int64), 1)
+    clicks = rng.binomial(impressions, np.clip(profiles["ctr"][campaign] * CHANNEL_CTR[channel], 0, 1))
+    conversions = rng.binomial(clicks, np.clip(profiles["cvr"][campaign] * CHANNEL_CVR[channel], 0, 1))
+    revenue = np.round(conversions * profiles["order_value"][campaign] * rng.lognormal(0.0, 0.2, n_rows), 2)
+    new_customers = rng.binomial(conversions, 0.6)
+
+    return pd.DataFrame({
+        "campaign_name": profiles["name"][campaign],
+        "date": dates.strftime("%Y-%m-%d").to_numpy()[day],
+        "channel": np.array(CHANNELS, dtype=object)[channel],
+        "spend": spend,
+        "revenue": revenue,
+        "conversions": conversions,
+        "impressions": impressions,
+        "clicks": clicks,
+        "new_customers": new_customers,
+        "customer_satisfaction_score": np.round(np.clip(profiles["csat"][campaign] + rng.normal(0, 0.3, n_rows), 1, 5), 1),
+        "retained_customers": rng.binomial(np.maximum(conversions * 3, 0), 1 - profiles["churn"][campaign]),
+        "churn_rate": np.round(np.clip(profiles["churn"][campaign] + rng.normal(0, 0.01, n_rows), 0, 1), 3),
+    })
+
+
+def write_csv(path, n_rows, n_campaigns=200, n_days=365, seed=0, chunk_rows=CHUNK_ROWS):
+    """
+    Writes n_rows synthetic rows to path in chunks. Returns the path.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    profiles = campaign_profiles(n_campaigns, seed)
+    written = 0
+    chunk = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        while written < n_rows or chunk == 0:
+            rows = min(chunk_rows, n_rows - written)
+            frame = make_frame(rows, n_days=n_days, seed=seed + chunk, profiles=profiles)
+            frame.to_csv(f, index=False, header=chunk == 0)
+            written += rows
+            chunk += 1
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--campaigns", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="data/synth.csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    write_csv(args.out, args.rows, args.campaigns, args.days, args.seed)
+    size_mb = os.path.getsize(args.out) / 1024 / 1024
+    print(f"Wrote {args.rows:,} rows ({size_mb:.1f} MB) to {args.out} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Headless batch audit runner.
+
+Audits every campaign in the CSV for all four categories concurrently and streams
+one JSON line per finished audit.
+
+    python -m src.batch --data data/campaign_data.csv --out audits.jsonl --concurrency 16 --rps 10
+
+With --portfolio, the campaigns of each category are packed several to a request
+(sized to --token-budget) and answered as an array of reports.
+
+Set OPENAI_BASE_URL (or --base-url) to run against a local OpenAI-compatible server,
+e.g. benchmarks/mock_openai.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import openai
+
+import src.data as data_processor
+from src import telemetry
+import src.llm as llm_handler
+from src.cache import get_cache
+from src.client import get_manager
+from src.metrics import CATEGORIES, compute_all_metrics
+from src.trends import daily_partials, trend_summaries
+from src.portfolio import DEFAULT_TOKEN_BUDGET, block_token_counts, parse_reports, plan_batches
+from src.prompts import count_tokens
+from src.report import format_kwargs, parse_report, portfolio_schema
+from src.rules import fast_response
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter: allows `rate` acquisitions per second on average,
+    with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """
+    Exponential backoff with full jitter.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def audit_one(client, campaign, category, metrics, semaphore, bucket, max_retries=5, use_cache=True,
+                    fast=False, use_similar=True):
+    """
+    Runs one campaign x category audit with retries. Never raises; failures are
+    reported in the result's 'error' field. With fast=True clear-cut cases are
+    answered by the rules engine without an API call; with use_similar=False reports
+    for near-identical metrics are not reused.
+    """
+    result = {"campaign_name": campaign, "category": category, "metrics": metrics,
+              "response": None, "error": None, "cached": False, "similar": False, "local": False, "attempts": 0}
+    started = time.perf_counter()
+
+    if fast:
+        local = fast_response(category, metrics)
+        if local is not None:
+            result.update(response=local, local=True, latency_ms=round((time.perf_counter() - started) * 1000, 3))
+            return result
+
+    messages, prompt_versions = llm_handler.build_messages(category, metrics)
+    # Batches keep their own retries and rate limit: no hedging, the route's first model.
+    model = llm_handler.model_for(category)
+
+    cache = get_cache() if use_cache else None
+    cache_key = llm_handler.cache_key_for(category, messages, prompt_versions) if cache is not None else None
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            result.update(response=cached, cached=True, latency_ms=0.0)
+            return result
+        match = llm_handler.find_similar(category, metrics, prompt_versions) if use_similar else None
+        if match is not None:
+            # Flagged in the output: the report was written for near-identical metrics.
+            result.update(response=match.response, similar=True, similar_max_change=round(match.max_change, 6),
+                          latency_ms=round((time.perf_counter() - started) * 1000, 3))
+            return result
+
+    for attempt in range(max_retries + 1):
+        result["attempts"] = attempt + 1
+        try:
+            await bucket.acquire()
+            async with semaphore:
+                with telemetry.timed("llm_call"):
+                    response = await client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        temperature=llm_handler.TEMPERATURE,
+                        **format_kwargs(),
+                    )
+            telemetry.record_usage(model, getattr(response, "usage", None))
+            content = response.choices[0].message.content
+            parsed = parse_report(content)
+            if parsed.report:
+                content = parsed.to_json()
+            result["response"] = content
+            result["missing_fields"] = parsed.missing
+            if cache is not None and content and parsed.complete:
+                llm_handler.remember(cache, cache_key, category, metrics, prompt_versions, content)
+            break
+        except RETRYABLE_ERRORS as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            if attempt < max_retries:
+                await asyncio.sleep(backoff_delay(attempt))
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+            break
+
+    if result["response"] is not None:
+        result["error"] = None
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+async def _audit_with_telemetry(client, campaign, category, *args, **kwargs):
+    with telemetry.audit(category):
+        return await audit_one(client, campaign, category, *args, **kwargs)
+
+
+def campaign_metrics(df, categories=CATEGORIES):
+    """
+    {campaign: {category: metrics}} for every campaign, with its trend summary.
+    """
+    all_metrics = compute_all_metrics(df, group_by="campaign_name", categories=categories)
+    if "error" in all_metrics:
+        raise ValueError(all_metrics["error"])
+
+    daily = daily_partials(df)
+    if daily is not None:
+        trends = trend_summaries(daily, by="campaign_name")
+        for campaign, by_category in all_metrics.items():
+            for metrics in by_category.values():
+                metrics["Trend"], metrics["Trend Changes"] = trends[campaign]
+    return all_metrics
+
+
+async def run_batch(df, out_path, client, concurrency=16, rps=0.0, max_retries=5,
+                    categories=CATEGORIES, use_cache=True, fast=False):
+    """
+    Fans audits out over every campaign x category and appends results to out_path
+    as they complete. Returns a summary dict.
+    """
+    all_metrics = campaign_metrics(df, categories)
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rps)
+    tasks = [
+        asyncio.create_task(_audit_with_telemetry(client, campaign, category, metrics, semaphore, bucket,
+                                      max_retries=max_retries, use_cache=use_cache, fast=fast))
+        for campaign, by_category in all_metrics.items()
+        for category, metrics in by_category.items()
+    ]
+
+    summary = {"total": len(tasks), "ok": 0, "failed": 0, "cached": 0, "similar": 0, "local": 0}
+    started = time.perf_counter()
+    with open(out_path, "a", encoding="utf-8") as out:
+        for finished in asyncio.as_completed(tasks):
+            result = await finished
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            summary["failed" if result["error"] else "ok"] += 1
+            summary["cached"] += int(result["cached"])
+            summary["similar"] += int(result["similar"])
+            summary["local"] += int(result["local"])
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+async def audit_portfolio(client, category, items, semaphore, bucket, max_retries=5, use_cache=True):
+    """
+    Audits several campaigns of one category in a single request. items is a list of
+    (campaign, metrics). Campaigns the response has no valid report for are split in two
+    halves and retried; a single campaign falls back to audit_one. Returns one result per
+    campaign, in the same shape as audit_one's plus 'batch_size'.
+    """
+    started = time.perf_counter()
+    names = [campaign for campaign, _ in items]
+    messages, prompt_versions = llm_handler.build_portfolio_messages(category, [m for _, m in items])
+    model = llm_handler.model_for(category)
+
+    cache = get_cache() if use_cache else None
+    cache_key = llm_handler.cache_key_for(category, messages, prompt_versions) if cache is not None else None
+    content = cache.get(cache_key) if cache is not None else None
+    cached = content is not None
+    error = None
+    attempts = 0
+
+    if content is None:
+        for attempt in range(max_retries + 1):
+            attempts = attempt + 1
+            try:
+                await bucket.acquire()
+                async with semaphore:
+                    with telemetry.timed("llm_call"):
+                        response = await client.chat.completions.create(
+                            model=model,
+                            messages=messages,
+                            temperature=llm_handler.TEMPERATURE,
+                            **format_kwargs(portfolio_schema(), "audit_reports"),
+                        )
+                telemetry.record_usage(model, getattr(response, "usage", None))
+                content = response.choices[0].message.content
+                break
+            except RETRYABLE_ERRORS as e:
+                error = f"{type(e).__name__}: {e}"
+                if attempt < max_retries:
+                    await asyncio.sleep(backoff_delay(attempt))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                break
+
+    reports, missing = parse_reports(content, names)
+    if cache is not None and not cached and reports and not missing:
+        cache.set(cache_key, content)
+
+    latency_ms = round((time.perf_counter() - started) * 1000, 2)
+    results = [
+        {"campaign_name": campaign, "category": category, "metrics": metrics,
+         "response": json.dumps(reports[campaign]), "error": None, "cached": cached, "local": False,
+         "attempts": attempts, "latency_ms": latency_ms, "batch_size": len(items)}
+        for campaign, metrics in items if campaign in reports
+    ]
+    if not missing:
+        return results
+
+    retry = [(campaign, metrics) for campaign, metrics in items if campaign not in reports]
+    if content is None:
+        # The request itself failed after its retries; splitting would only multiply the failures.
+        return results + [
+            {"campaign_name": campaign, "category": category, "metrics": metrics, "response": None,
+             "error": error, "cached": False, "local": False, "attempts": attempts,
+             "latency_ms": latency_ms, "batch_size": len(items)}
+            for campaign, metrics in retry
+        ]
+    if len(retry) == 1:
+        # Nothing left to split: fall back to a normal single-campaign audit.
+        campaign, metrics = retry[0]
+        single = await audit_one(client, campaign, category, metrics, semaphore, bucket,
+                                 max_retries=max_retries, use_cache=use_cache)
+        single["batch_size"] = 1
+        return results + [single]
+    telemetry.increment("portfolio_splits_total")
+    halves = [retry[:(len(retry) + 1) // 2], retry[(len(retry) + 1) // 2:]]
+    parts = await asyncio.gather(*(
+        audit_portfolio(client, category, half, semaphore, bucket, max_retries, use_cache)
+        for half in halves if half
+    ))
+    return results + [result for part in parts for result in part]
+
+
+async def run_portfolio_batch(df, out_path, client, concurrency=16, rps=0.0, max_retries=5,
+                              categories=CATEGORIES, use_cache=True, fast=False,
+                              token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Like run_batch, but audits the campaigns of each category in batches sized to
+    token_budget (see src/portfolio.py), one request per batch.
+    """
+    all_metrics = campaign_metrics(df, categories)
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rps)
+    summary = {"total": 0, "ok": 0, "failed": 0, "cached": 0, "local": 0, "requests": 0}
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        def write(result):
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            summary["total"] += 1
+            summary["failed" if result["error"] else "ok"] += 1
+            summary["cached"] += int(result["cached"])
+            summary["local"] += int(result["local"])
+
+        tasks = []
+        for category in categories:
+            items = []
+            for campaign, by_category in all_metrics.items():
+                metrics = by_category[category]
+                local = fast_response(category, metrics) if fast else None
+                if local is not None:
+                    write({"campaign_name": campaign, "category": category, "metrics": metrics,
+                           "response": local, "error": None, "cached": False, "local": True,
+                           "attempts": 0, "latency_ms": 0.0, "batch_size": 1})
+                else:
+                    items.append((campaign, metrics))
+            if not items:
+                continue
+
+            blocks = llm_handler.portfolio_blocks(category, [metrics for _, metrics in items])
+            empty, _ = llm_handler.build_portfolio_messages(category, [], blocks=[])
+            fixed = sum(count_tokens(message["content"])[0] for message in empty)
+            for batch in plan_batches(block_token_counts(blocks), fixed, token_budget):
+                summary["requests"] += 1
+                tasks.append(asyncio.create_task(audit_portfolio(
+                    client, category, [items[i] for i in batch], semaphore, bucket,
+                    max_retries=max_retries, use_cache=use_cache)))
+
+        for finished in asyncio.as_completed(tasks):
+            for result in await finished:
+                write(result)
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/campaign_data.csv")
+    parser.add_argument("--out", default="audits.jsonl")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--rps", type=float, default=0.0, help="Requests per second limit (0 = unlimited)")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"))
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk response cache")
+    parser.add_argument("--fast", action="store_true", help="Answer clear-cut cases with the local rules engine")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="Audit several campaigns per request (one request per batch and category)")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help="Prompt token budget per request in --portfolio mode")
+    args = parser.parse_args(argv)
+
+    df = data_processor.load_data(args.data)
+    if df is None:
+        print(f"Data file not found: {args.data}", file=sys.stderr)
+        return 1
+
+    # Retries are handled by audit_one so the SDK's own retry loop is turned off.
+    client = get_manager().async_client(base_url=args.base_url, timeout=args.timeout, max_retries=0)
+    if args.portfolio:
+        summary = asyncio.run(run_portfolio_batch(df, args.out, client, concurrency=args.concurrency, rps=args.rps,
+                                                  max_retries=args.max_retries, use_cache=not args.no_cache,
+                                                  fast=args.fast, token_budget=args.token_budget))
+    else:
+        summary = asyncio.run(run_batch(df, args.out, client, concurrency=args.concurrency, rps=args.rps,
+                                        max_retries=args.max_retries, use_cache=not args.no_cache,
+                                        fast=args.fast))
+    print(json.dumps(summary))
+    if telemetry.enabled():
+        print(telemetry.render_prometheus(), file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "llm_responses.sqlite")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+def make_key(model, temperature, system_prompt, user_prompt, prompt_versions=None):
+    """
+    Content-addressed cache key: a SHA-256 over everything that can change the answer.
+    prompt_versions is a dict of {prompt file name: version hash}.
+    """
+    payload = json.dumps({
+        "model": model,
+        "temperature": temperature,
+        "system": system_prompt,
+        "user": user_prompt,
+        "prompt_versions": prompt_versions or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent LLM response cache stored in a SQLite file.
+    Entries expire after ttl_seconds; when the stored responses exceed max_bytes
+    the least recently used ones are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """
+        Returns the cached response for key, or None if it is missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, value):
+        """
+        Stores a response and evicts old entries if the cache is over its limits.
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            cursor = self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cursor.rowcount, 0)
+
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Walk entries from least to most recently used until we are back under the limit.
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        """
+        Returns hit/miss counters plus the current number of entries and bytes stored.
+        """
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+
+_default_cache = None
+
+
+def get_cache():
+    """
+    Returns the shared cache, configured from LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS
+    and LLM_CACHE_MAX_MB. Returns None when LLM_CACHE_DISABLED is set.
+    """
+    global _default_cache
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    if _default_cache is None:
+        _default_cache = ResponseCache(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_MAX_BYTES / (1024 * 1024))) * 1024 * 1024),
+        )
+    return _default_cache
@@ -0,0 +1,108 @@
+"""
+Out-of-core aggregation for campaign CSVs that do not fit in memory.
+
+The file is cut into byte ranges on line boundaries; each range is parsed on its own
+(with the typed schema) and reduced to the same mergeable partials the in-memory path
+uses: overall sums and counts from metrics.compute_partials, and daily partials
+summed over campaigns and channels (trends.overall_daily), which is all the trend
+summary reads. The partials are merged in file order, so the metrics built from them
+match get_metrics_for_category on the whole file, while memory stays bounded by one
+range per worker plus one row per day.
+
+Ranges can be processed in parallel with a process pool; each worker reads its own
+range from disk, so no DataFrames are pickled between processes. Fields containing
+line breaks (quoted newlines) are not supported by the range split.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from src.metrics import compute_partials, finalize_totals, merge_partials
+from src.schema import read_campaign_csv
+from src.trends import daily_partials, overall_daily
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+# Range results are merged this many at a time, which saves concat/groupby passes;
+# each one is small (one row per day in the range).
+MERGE_EVERY = 8
+
+
+def chunk_ranges(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Returns (header, [(start, end), ...]): byte ranges of the data rows, each ending
+    at a line break, of about chunk_bytes each.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        ranges = []
+        start = len(header)
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # move to the end of the line the cut falls in
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header, ranges
+
+
+def aggregate_range(path, header, start, end, columns=None):
+    """
+    Partials for one byte range: (overall partials, daily partials or None, row count).
+    Module-level so a process pool can run it.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(end - start)
+    if not body.strip():
+        return None, None, 0
+    frame = read_campaign_csv(io.BytesIO(header + body), columns, name=path)
+    return compute_partials(frame), overall_daily(daily_partials(frame)), len(frame)
+
+
+class Aggregates:
+    """
+    Merged partials for a whole file: `partials` (one row, ungrouped) and `daily`
+    (per day, over all campaigns and channels), plus the number of rows read.
+    """
+
+    def __init__(self, partials, daily, rows):
+        self.partials = partials
+        self.daily = daily
+        self.rows = rows
+
+    def totals(self):
+        """
+        The single row of metrics.compute_totals(df) for the whole file.
+        """
+        return finalize_totals(self.partials).iloc[0]
+
+
+def aggregate_csv(path, chunk_bytes=DEFAULT_CHUNK_BYTES, workers=0, columns=None):
+    """
+    Streams path in byte ranges and folds them into an Aggregates. With workers > 1 the
+    ranges are processed by a process pool; results are merged in file order either way.
+    Returns None when the file has no data rows.
+    """
+    header, ranges = chunk_ranges(path, chunk_bytes)
+    if workers and workers > 1 and len(ranges) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, which keeps the first campaign name stable.
+            starts, ends = zip(*ranges)
+            parts = list(pool.map(aggregate_range, repeat(path), repeat(header), starts, ends, repeat(columns)))
+    else:
+        parts = (aggregate_range(path, header, start, end, columns) for start, end in ranges)
+
+    partials, daily, rows = None, None, 0
+    pending = []
+    for index, part in enumerate(parts, 1):
+        pending.append(part)
+        rows += part[2]
+        if len(pending) >= MERGE_EVERY or index == len(ranges):
+            partials = merge_partials([partials] + [p for p, _, _ in pending])
+            daily = merge_partials([daily] + [d for _, d, _ in pending])
+            pending = []
+    if partials is None:
+        return None
+    return Aggregates(partials, daily, rows)
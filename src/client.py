@@ -0,0 +1,271 @@
+"""
+Shared OpenAI client, created on first use.
+
+One client (and so one keep-alive HTTP connection pool) serves every session in the
+process, with explicit connect/read timeouts and optional HTTP/2. A circuit breaker per
+model fails calls fast while that model is timing out or returning server errors, so
+one slow upstream does not tie up every session (and src/router.py can route around it).
+
+Settings come from the environment:
+    OPENAI_CONNECT_TIMEOUT, OPENAI_READ_TIMEOUT   seconds (default 5 and 60)
+    OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE  pool size (default 20 and 10)
+    OPENAI_MAX_RETRIES                            SDK retries per call (default 2)
+    OPENAI_HTTP2                                  1 to use HTTP/2 (needs the h2 package)
+    OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SECONDS   (default 5 and 30)
+"""
+import importlib.util
+import os
+import threading
+import time
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from src import telemetry
+from src.startup import load_env
+
+try:
+    # Pool limits come from whichever transport the installed SDK is built on
+    # (httpx, or httpx2 in newer releases) rather than importing one of them here.
+    from openai._constants import DEFAULT_CONNECTION_LIMITS
+    Limits = type(DEFAULT_CONNECTION_LIMITS)
+except ImportError:
+    Limits = None
+
+# Errors that mean the API itself is degraded. Rate limits (429) are not counted:
+# they are a quota signal, not an outage.
+BREAKER_ERRORS = (
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        print(f"Invalid {name}, using {default}")
+        return float(default)
+
+
+class ClientConfig:
+    """
+    Connection settings for the shared client; from_env() reads them from the environment.
+    """
+
+    def __init__(self, api_key=None, base_url=None, connect_timeout=5.0, read_timeout=60.0,
+                 max_connections=20, max_keepalive=10, keepalive_expiry=30.0, max_retries=2,
+                 http2=False, breaker_failures=5, breaker_reset_seconds=30.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.max_retries = max_retries
+        self.http2 = http2
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+
+    @classmethod
+    def from_env(cls):
+        load_env()
+        return cls(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            base_url=os.getenv("OPENAI_BASE_URL") or None,
+            connect_timeout=_env_float("OPENAI_CONNECT_TIMEOUT", 5.0),
+            read_timeout=_env_float("OPENAI_READ_TIMEOUT", 60.0),
+            max_connections=int(_env_float("OPENAI_MAX_CONNECTIONS", 20)),
+            max_keepalive=int(_env_float("OPENAI_MAX_KEEPALIVE", 10)),
+            max_retries=int(_env_float("OPENAI_MAX_RETRIES", 2)),
+            http2=os.getenv("OPENAI_HTTP2", "").lower() in ("1", "true", "yes"),
+            breaker_failures=int(_env_float("OPENAI_BREAKER_FAILURES", 5)),
+            breaker_reset_seconds=_env_float("OPENAI_BREAKER_RESET_SECONDS", 30.0),
+        )
+
+    def timeout(self, read=None):
+        return openai.Timeout(read or self.read_timeout, connect=self.connect_timeout)
+
+    def http_client_kwargs(self):
+        http2 = self.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("OPENAI_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+        kwargs = {"http2": http2, "timeout": self.timeout()}
+        if Limits is None:
+            print("Connection pool limits are not supported by this openai version; using its defaults")
+            return kwargs
+        kwargs["limits"] = Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_keepalive,
+                                  keepalive_expiry=self.keepalive_expiry)
+        return kwargs
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the API while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_seconds`; then lets one trial call through (half-open) and closes again if
+    it succeeds. Every allowed call must end in record_success, record_failure or
+    record_neutral, or a half-open breaker never admits another trial.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_neutral(self):
+        """
+        Ends a call whose outcome says nothing about the API's health (e.g. a rate limit,
+        a bad request or a cancellation): frees the half-open trial, state unchanged.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    telemetry.increment("circuit_opened_total")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class ClientManager:
+    """
+    Owns the shared OpenAI client and a circuit breaker per model. The client is built on
+    the first call, not at import, so importing the app never needs the API key.
+    """
+
+    def __init__(self, config=None):
+        self.config = config
+        self.breakers = {}
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _ensure_config(self):
+        if self.config is None:
+            self.config = ClientConfig.from_env()
+
+    def breaker_for(self, model):
+        breaker = self.breakers.get(model)
+        if breaker is None:
+            with self._lock:
+                self._ensure_config()
+                breaker = self.breakers.setdefault(
+                    model, CircuitBreaker(self.config.breaker_failures, self.config.breaker_reset_seconds))
+        return breaker
+
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._ensure_config()
+                    config = self.config
+                    self._client = OpenAI(
+                        api_key=config.api_key,
+                        base_url=config.base_url,
+                        max_retries=config.max_retries,
+                        timeout=config.timeout(),
+                        http_client=openai.DefaultHttpxClient(**config.http_client_kwargs()),
+                    )
+        return self._client
+
+    def async_client(self, **overrides):
+        """
+        A new AsyncOpenAI client with the same pool and timeout settings. Async clients
+        belong to one event loop, so callers (e.g. src/batch.py) create and own theirs.
+        """
+        self._ensure_config()
+        config = self.config
+        kwargs = {"api_key": config.api_key, "base_url": config.base_url,
+                  "max_retries": config.max_retries, "timeout": config.timeout()}
+        kwargs.update({key: value for key, value in overrides.items() if value is not None})
+        http_kwargs = config.http_client_kwargs()
+        http_kwargs["timeout"] = kwargs["timeout"]
+        return AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(**http_kwargs), **kwargs)
+
+    def chat_completion(self, read_timeout=None, **kwargs):
+        """
+        client.chat.completions.create guarded by the model's circuit breaker. read_timeout
+        overrides the configured read timeout for this call only.
+        """
+        client = self.client()
+        breaker = self.breaker_for(kwargs.get("model"))
+        if not breaker.allow():
+            telemetry.increment("circuit_rejected_total")
+            raise CircuitOpenError(
+                f"{kwargs.get('model')} marked unavailable after repeated failures; retrying in {breaker.retry_in():.0f}s")
+        if read_timeout is not None:
+            client = client.with_options(timeout=self.config.timeout(read_timeout))
+        try:
+            response = client.chat.completions.create(**kwargs)
+        except BREAKER_ERRORS:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.record_neutral()
+            raise
+        breaker.record_success()
+        return response
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """
+    Returns the process-wide ClientManager.
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ClientManager()
+    return _manager
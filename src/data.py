@@ -1,13 +1,78 @@
-import pandas as pd
+import io
+import os
 
-def load_data(filepath="data/campaign_data.csv"):
+from src import telemetry
+from src.chunked import DEFAULT_CHUNK_BYTES, aggregate_csv
+from src.metrics import compute_totals, metrics_from_row
+from src.schema import columns_for, read_campaign_csv
+from src.trends import daily_partials, trend_summary
+
+try:
+    from src import ingest
+except ImportError:  # pyarrow not installed: fall back to reading the CSV directly
+    ingest = None
+
+DEFAULT_DATA_PATH = "data/campaign_data.csv"
+
+# Files larger than this are aggregated in chunks (src/chunked.py) instead of loaded whole.
+STREAMING_THRESHOLD_BYTES = int(float(os.getenv("DATA_STREAMING_MB", "1024")) * 1024 * 1024)
+# Processes for chunked aggregation; 0 or 1 aggregates in this process.
+STREAMING_WORKERS = int(os.getenv("DATA_STREAMING_WORKERS", "0"))
+
+def file_identity(filepath=DEFAULT_DATA_PATH):
+    """
+    (absolute path, mtime in ns, size) of the data file, used as a cache key.
+    mtime and size are None when the file does not exist.
+    """
+    path = os.path.abspath(filepath)
+    try:
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return path, None, None
+
+@telemetry.instrument("load_data")
+def load_data(filepath=DEFAULT_DATA_PATH, use_store=True, category=None):
+    """
+    Loads the campaign data with the typed schema from src/schema.py. With use_store (and
+    pyarrow installed) only rows that are new since the last call are parsed from the CSV;
+    the rest comes from the columnar store next to it (see src/ingest.py).
+    With category, only the columns that category's metrics need are loaded.
+    """
+    columns = columns_for(category)
     try:
-        df = pd.read_csv(filepath)
+        if use_store and ingest is not None:
+            try:
+                df = ingest.sync(filepath).load(columns)
+                if df is not None:
+                    return df
+            except OSError as e:
+                if not os.path.exists(filepath):
+                    raise FileNotFoundError(filepath) from e
+                print(f"Campaign store unavailable, reading CSV directly: {e}")
+        df = read_campaign_csv(filepath, columns)
         return df
     except FileNotFoundError:
         return None
 
-def get_metrics_for_category(category_name, df):
+@telemetry.instrument("load_data")
+def load_daily_partials(filepath=DEFAULT_DATA_PATH, use_store=True):
+    """
+    Per campaign / channel / day partials for the trend summary. The store keeps them
+    up to date as new rows are ingested; without it they are computed from the CSV.
+    """
+    try:
+        if use_store and ingest is not None:
+            try:
+                return ingest.sync(filepath).daily_partials()
+            except OSError as e:
+                print(f"Campaign store unavailable, reading CSV directly: {e}")
+        return daily_partials(read_campaign_csv(filepath))
+    except FileNotFoundError:
+        return None
+
+@telemetry.instrument("metrics")
+def get_metrics_for_category(category_name, df, daily=None):
     """
     Calculates metrics specific to the prompt category.
     Categories:
@@ -15,79 +80,66 @@ def get_metrics_for_category(category_name, df):
     2. Customer Satisfaction (Ad & Content Relevance)
     3. Revenue Growth
     4. Customer Retention
+    daily can be passed from load_daily_partials(); otherwise the trend is computed from df.
     """
     if df is None or df.empty:
         return {"error": "No data available"}
 
-    metrics = {}
-    
-    # Calculate overall totals/averages first
-    # Convert numpy types to native Python types for JSON serialization
-    # Since we now have a single row, sum() works (it just sums the single value)
-    # but we should handle potential missing columns gracefully if needed.
-    
-    # Extract values safely
-    total_spend = float(df['spend'].sum()) if 'spend' in df else 0.0
-    total_revenue = float(df['revenue'].sum()) if 'revenue' in df else 0.0
-    total_impressions = int(df['impressions'].sum()) if 'impressions' in df else 0
-    total_clicks = int(df['clicks'].sum()) if 'clicks' in df else 0
-    total_conversions = int(df['conversions'].sum()) if 'conversions' in df else 0
-    
-    # 'new_customers' might not exist in the new CSV format if we removed it, 
-    # but let's check. If not, use conversions as proxy for new customers?
-    # The prompts use Cost per Customer (CPA).
-    # If new_customers column is missing, we use conversions.
-    new_customers_col = 'new_customers' if 'new_customers' in df else 'conversions'
-    total_new_customers = int(df[new_customers_col].sum()) if new_customers_col in df else 0
-
-    campaign_name = df['campaign_name'].iloc[0] if 'campaign_name' in df and not df.empty else "Unknown Campaign"
+    # All totals and ratios come from one vectorized pass (see src/metrics.py).
+    # The campaign shown is the first row's, as before.
+    totals = compute_totals(df)
+    return _metrics(category_name, totals.iloc[0], daily if daily is not None else daily_partials(df))
 
-    # Common base metrics for the LLM prompt
-    metrics['Campaign Name'] = campaign_name
-    metrics['Total Spend'] = total_spend
-    metrics['Total Revenue'] = total_revenue
-    metrics['Total Impressions'] = total_impressions
-    metrics['Total Clicks'] = total_clicks
-    metrics['Total Conversions'] = total_conversions
-    metrics['Total New Customers'] = total_new_customers # Always include for UI consistency
-    
-    # Derived Metrics
-    # CPA (Cost Per Acquisition)
-    metrics['CPA'] = round(total_spend / total_new_customers, 2) if total_new_customers > 0 else 0.0
-    
-    # Conversion Rate
-    metrics['Conversion Rate'] = f"{round((total_conversions / total_clicks) * 100, 2)}%" if total_clicks > 0 else "0%"
-    
-    # CTR
-    metrics['CTR'] = f"{round((total_clicks / total_impressions) * 100, 2)}%" if total_impressions > 0 else "0%"
-    
-    # ROAS
-    metrics['ROAS'] = round(total_revenue / total_spend, 2) if total_spend > 0 else 0.0
-
-    if category_name == "Customer Acquisition":
-        metrics['Total New Customers'] = total_new_customers
+def _metrics(category_name, totals_row, daily):
+    metrics = metrics_from_row(category_name, totals_row)
+    trend, changes = trend_summary(daily)
+    if trend:
+        metrics['Trend'] = trend
+        metrics['Trend Changes'] = changes
+    return metrics
 
-    elif category_name == "Customer Satisfaction":
-        # In the new single-row CSV, we might not have CSAT. 
-        # If missing, we might omit or set a placeholder.
-        if 'customer_satisfaction_score' in df:
-            metrics['Average CSAT Score'] = round(float(df['customer_satisfaction_score'].mean()), 2)
-        else:
-             metrics['Average CSAT Score'] = "N/A (Not in data)"
+def use_streaming(filepath=DEFAULT_DATA_PATH):
+    """
+    True when the file is too large to load whole (over DATA_STREAMING_MB).
+    """
+    try:
+        return os.path.getsize(filepath) > STREAMING_THRESHOLD_BYTES
+    except OSError:
+        return False
 
-    elif category_name == "Revenue Growth":
-        # Additional metrics specific to Revenue
-        # ROAS and Revenue are already in base metrics
-        pass
+@telemetry.instrument("load_data")
+def aggregate_data(filepath=DEFAULT_DATA_PATH, chunk_bytes=DEFAULT_CHUNK_BYTES, workers=None):
+    """
+    Aggregates the CSV in chunks with bounded memory (see src/chunked.py). Returns an
+    Aggregates for get_metrics_from_aggregates(), or None if the file is missing or empty.
+    """
+    try:
+        return aggregate_csv(filepath, chunk_bytes, STREAMING_WORKERS if workers is None else workers)
+    except FileNotFoundError:
+        return None
 
-    elif category_name == "Customer Retention":
-        # Since the new CSV format does not have retention data (retained_customers, churn_rate),
-        # we will set these to N/A or derive proxies if possible.
-        # For this exercise, we'll mark them as Not Available.
-        metrics['Retention Volume'] = "Data Not Available"
-        metrics['Average Churn Rate'] = "Data Not Available"
+@telemetry.instrument("metrics")
+def get_metrics_from_aggregates(category_name, aggregates):
+    """
+    Same metrics dict as get_metrics_for_category, from aggregate_data() instead of a DataFrame.
+    """
+    if aggregates is None or not aggregates.rows:
+        return {"error": "No data available"}
+    return _metrics(category_name, aggregates.totals(), aggregates.daily)
 
-    else:
-        metrics['info'] = "General category, showing summary."
+def get_metrics_streaming(category_name, filepath=DEFAULT_DATA_PATH, chunk_bytes=DEFAULT_CHUNK_BYTES, workers=None):
+    """
+    get_metrics_for_category for a CSV that does not fit in memory.
+    """
+    return get_metrics_from_aggregates(category_name, aggregate_data(filepath, chunk_bytes, workers))
 
-    return metrics
+def load_preview(filepath=DEFAULT_DATA_PATH, rows=1000):
+    """
+    The first rows of the CSV, for displaying files too large to load.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            head = b"".join(line for _, line in zip(range(rows + 1), f))
+        return read_campaign_csv(io.BytesIO(head), name=filepath)
+    except FileNotFoundError:
+        return None
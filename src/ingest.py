@@ -0,0 +1,312 @@
+"""
+Incremental ingestion of campaign CSV drops into an append-only columnar store.
+
+Each ingestion run converts only the rows it has not seen yet into a new Arrow IPC
+part file (memory-mapped on read) and folds them into per-campaign totals, so
+opening the app does not mean parsing the whole CSV history again.
+
+    python -m src.ingest data/campaign_data.csv [more.csv ...] --store data/.store/campaign_data
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+
+import pandas as pd
+import pyarrow as pa
+
+from src.metrics import GROUP_KEYS, compute_partials, finalize_totals, merge_partials
+from src.schema import SCHEMA_VERSION, apply_schema, read_campaign_csv
+from src.trends import daily_partials, update_daily_partials
+
+MANIFEST = "manifest.json"
+# Bump when the manifest layout changes: stores with another version are rebuilt.
+MANIFEST_VERSION = 2
+TOTALS_FILE = "campaign_totals.arrow"
+DAILY_FILE = "daily_partials.arrow"
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def default_store_dir(csv_path):
+    """
+    Store location for a CSV: data/campaign_data.csv -> data/.store/campaign_data
+    """
+    csv_path = os.path.abspath(csv_path)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(os.path.dirname(csv_path), ".store", stem)
+
+
+def _store_lock(store_dir):
+    with _locks_guard:
+        return _locks.setdefault(os.path.abspath(store_dir), threading.Lock())
+
+
+def _write_arrow(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _read_arrow(path):
+    with pa.memory_map(path, "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+class CampaignStore:
+    """
+    Append-only store of campaign rows in Arrow IPC part files plus a manifest that
+    records, for every source CSV, how many bytes and rows have been ingested and a
+    hash of those bytes. Sources are keyed by their path relative to the store, so a
+    data directory moved together with its store stays incremental.
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        self.parts_dir = os.path.join(store_dir, "parts")
+        self.manifest_path = os.path.join(store_dir, MANIFEST)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return _empty_manifest()
+
+    def _save_manifest(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def _source_key(self, csv_path):
+        return os.path.relpath(os.path.abspath(csv_path), self.store_dir)
+
+    def _source_path(self, key):
+        # Manifests from before MANIFEST_VERSION 2 hold absolute paths; join() keeps those.
+        return os.path.normpath(os.path.join(self.store_dir, key))
+
+    def reset(self):
+        """
+        Drops every part and the totals and saves an empty manifest; the next ingest
+        re-reads all sources from scratch. Returns the paths of the known sources.
+        """
+        for name in self.manifest["parts"]:
+            try:
+                os.remove(os.path.join(self.parts_dir, name))
+            except OSError:
+                pass
+        for name in (TOTALS_FILE, DAILY_FILE):
+            try:
+                os.remove(os.path.join(self.store_dir, name))
+            except OSError:
+                pass
+        sources = [self._source_path(key) for key in self.manifest["sources"]]
+        self.manifest = _empty_manifest()
+        self._save_manifest()
+        return sources
+
+    def _pending(self, csv_path):
+        """
+        Returns (header, start_offset, prefix_hash) for the unread part of csv_path, or None
+        when there is nothing new. prefix_hash covers the bytes before start_offset, ready to
+        be extended with the new ones. Raises _Rewritten if the file no longer extends what
+        we ingested, which includes in-place edits that keep the size.
+        """
+        key = self._source_key(csv_path)
+        stat = os.stat(csv_path)
+        seen = self.manifest["sources"].get(key)
+        with open(csv_path, "rb") as f:
+            header = f.readline()
+            if seen is None:
+                return header, len(header), hashlib.sha256(header)
+            if stat.st_size < seen["offset"] or header.decode("utf-8") != seen["header"]:
+                raise _Rewritten(key)
+            if stat.st_size == seen["offset"] and stat.st_mtime_ns == seen.get("mtime_ns"):
+                return None
+            # Modified since the last run: the ingested prefix must be byte-for-byte unchanged.
+            f.seek(0)
+            prefix_hash = _hash_prefix(f, seen["offset"])
+        if prefix_hash.hexdigest() != seen.get("prefix_sha256"):
+            raise _Rewritten(key)
+        if stat.st_size == seen["offset"]:
+            seen["mtime_ns"] = stat.st_mtime_ns
+            return None
+        return header, seen["offset"], prefix_hash
+
+    def ingest(self, csv_paths):
+        """
+        Appends rows that are new since the last run from each CSV.
+        Returns the number of rows added. If a source was truncated or rewritten
+        the store is rebuilt from all known sources.
+        """
+        os.makedirs(self.parts_dir, exist_ok=True)
+        with _store_lock(self.store_dir):
+            self.manifest = self._load_manifest()
+            paths = [os.path.abspath(p) for p in csv_paths]
+            try:
+                if (self.manifest.get("schema") != SCHEMA_VERSION
+                        or self.manifest.get("version") != MANIFEST_VERSION):
+                    # Parts written under another schema would not concatenate with new ones.
+                    raise _Rewritten(self.store_dir)
+                pending = [(p, self._pending(p)) for p in paths]
+            except _Rewritten:
+                known = [p for p in self.reset() if p not in paths]
+                missing = [p for p in known if not os.path.exists(p)]
+                if missing:
+                    print(f"Sources no longer found, dropped from the store: {', '.join(missing)}")
+                paths = sorted(set(known) - set(missing) | set(paths))
+                pending = [(p, self._pending(p)) for p in paths]
+
+            new_frames = []
+            for path, todo in pending:
+                if todo is None:
+                    continue
+                header, offset, prefix_hash = todo
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    body = f.read()
+                    stat = os.fstat(f.fileno())
+                # Exports are written whole, so the remaining bytes (even without a final newline)
+                # are taken as complete rows.
+                if not body.strip():
+                    continue
+                frame = read_campaign_csv(io.BytesIO(header + body), name=path)
+                if len(frame):
+                    new_frames.append(frame)
+                prefix_hash.update(body)
+                key = self._source_key(path)
+                seen = self.manifest["sources"].get(key, {"rows": 0})
+                self.manifest["sources"][key] = {
+                    "header": header.decode("utf-8"),
+                    "offset": offset + len(body),
+                    "rows": seen["rows"] + len(frame),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "prefix_sha256": prefix_hash.hexdigest(),
+                }
+
+            added = 0
+            if new_frames:
+                # Categoricals with different categories concatenate to object; cast them back.
+                batch = apply_schema(pd.concat(new_frames, ignore_index=True))
+                name = f"part-{self.manifest['next_part']:06d}.arrow"
+                _write_arrow(batch, os.path.join(self.parts_dir, name))
+                self.manifest["parts"].append(name)
+                self.manifest["next_part"] += 1
+                self.manifest["total_rows"] += len(batch)
+                self._update_totals(batch)
+                added = len(batch)
+
+            self._save_manifest()
+            return added
+
+    def _update_totals(self, batch):
+        totals_path = os.path.join(self.store_dir, TOTALS_FILE)
+        new = compute_partials(batch, group_by="campaign_name")
+        if os.path.exists(totals_path):
+            old = _read_arrow(totals_path).to_pandas().set_index("campaign_name")
+            new = merge_partials([old, new])
+        _write_arrow(new.reset_index(), totals_path)
+
+        daily_path = os.path.join(self.store_dir, DAILY_FILE)
+        if "date" in batch:
+            old = self.daily_partials() if os.path.exists(daily_path) else None
+            _write_arrow(update_daily_partials(old, batch).reset_index(), daily_path)
+
+    def load(self, columns=None):
+        """
+        Returns every ingested row as a DataFrame, reading the part files via memory maps.
+        """
+        tables = [_read_arrow(os.path.join(self.parts_dir, name)) for name in self.manifest["parts"]]
+        if not tables:
+            return None
+        table = pa.concat_tables(tables, promote_options="permissive")
+        if columns is not None:
+            table = table.select([c for c in columns if c in table.column_names])
+        return table.to_pandas()
+
+    def campaign_partials(self):
+        """
+        Pre-aggregated partials per campaign, kept up to date on every ingest.
+        """
+        totals_path = os.path.join(self.store_dir, TOTALS_FILE)
+        if not os.path.exists(totals_path):
+            return None
+        return _read_arrow(totals_path).to_pandas().set_index("campaign_name")
+
+    def daily_partials(self):
+        """
+        Partials per campaign, channel and day (see src/trends.py), kept up to date on every
+        ingest. Stores created before this file existed get it built from the parts once.
+        """
+        daily_path = os.path.join(self.store_dir, DAILY_FILE)
+        if not os.path.exists(daily_path):
+            df = self.load()
+            daily = daily_partials(df)
+            if daily is not None:
+                _write_arrow(daily.reset_index(), daily_path)
+            return daily
+        return _read_arrow(daily_path).to_pandas().set_index(GROUP_KEYS)
+
+    def campaign_totals(self):
+        """
+        Per-campaign totals and ratios in the same shape as metrics.compute_totals(df, "campaign_name").
+        """
+        partials = self.campaign_partials()
+        return finalize_totals(partials) if partials is not None else None
+
+
+class _Rewritten(Exception):
+    pass
+
+
+def _empty_manifest():
+    return {"sources": {}, "parts": [], "next_part": 0, "total_rows": 0, "schema": SCHEMA_VERSION,
+            "version": MANIFEST_VERSION}
+
+
+def _hash_prefix(f, size, block=1 << 20):
+    digest = hashlib.sha256()
+    while size > 0:
+        chunk = f.read(min(block, size))
+        if not chunk:
+            break
+        digest.update(chunk)
+        size -= len(chunk)
+    return digest
+
+
+def sync(csv_path, store_dir=None):
+    """
+    Ingests whatever is new in csv_path and returns the store.
+    """
+    store = CampaignStore(store_dir or default_store_dir(csv_path))
+    store.ingest([csv_path])
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="+", help="CSV files to ingest")
+    parser.add_argument("--store", help="Store directory (default: next to the first CSV)")
+    parser.add_argument("--rebuild", action="store_true", help="Drop the store and re-ingest from scratch")
+    args = parser.parse_args(argv)
+
+    store = CampaignStore(args.store or default_store_dir(args.csv[0]))
+    if args.rebuild:
+        store.reset()
+    added = store.ingest(args.csv)
+    print(json.dumps({"store": store.store_dir, "rows_added": added, "total_rows": store.manifest["total_rows"],
+                      "parts": len(store.manifest["parts"])}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+Background audit jobs shared by every session of the app.
+
+Audits run on one process-wide thread pool instead of inside the Streamlit script run,
+so a session only holds a job id and reads the job's output as it arrives; reruns,
+reconnects and other widgets no longer wait on the LLM call. Identical in-flight
+audits (same category, metrics and mode) are deduplicated: a second session attaches
+to the running job instead of starting another request. A job is cancelled once every
+session that submitted it has cancelled; the worker stops at the next chunk.
+
+Settings come from the environment:
+    AUDIT_WORKERS         pool size (default 8)
+    AUDIT_JOB_RETENTION   seconds a finished job stays readable (default 600)
+"""
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import src.llm as llm_handler
+from src import telemetry
+from src.report import parse_report
+from src.stream_parser import ReportStreamParser
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Job:
+    """
+    One background audit. Output chunks are appended as they arrive; read() returns the
+    ones a caller has not seen yet. `result` holds the ParsedReport once status is DONE.
+    """
+
+    def __init__(self, job_id, key, meta=None):
+        self.id = job_id
+        self.key = key
+        self.meta = meta or {}
+        self.status = QUEUED
+        self.chunks = []
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.submitted_at = time.monotonic()
+        self.finished_at = None
+        self.subscribers = 1
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def text(self):
+        with self._changed:
+            return "".join(self.chunks)
+
+    def append(self, chunk):
+        with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    def finish(self, status, result=None, error=None):
+        with self._changed:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.monotonic()
+            self._changed.notify_all()
+
+    def read(self, seen=0, timeout=None):
+        """
+        Waits up to timeout seconds for chunks after the first `seen` ones (or for the
+        job to end). Returns (new chunks, done).
+        """
+        with self._changed:
+            if len(self.chunks) <= seen and not self.done:
+                self._changed.wait(timeout)
+            return self.chunks[seen:], self.done
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while not self.done:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return self.done
+
+
+class JobExecutor:
+    """
+    Thread pool plus the table of jobs, keyed by id and (while in flight) by dedupe key.
+    """
+
+    def __init__(self, max_workers=8, retention_seconds=600.0):
+        self.retention_seconds = retention_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="audit-job")
+        self._jobs = {}
+        self._in_flight = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, meta=None, **kwargs):
+        """
+        Runs fn(job, *args, **kwargs) on the pool and returns its Job. If a job with the
+        same key is still running, that job is returned instead (and gains a subscriber).
+        fn should append output with job.append() and check job.cancelled between chunks;
+        its return value becomes job.result.
+        """
+        with self._lock:
+            self._purge()
+            job = self._in_flight.get(key)
+            if job is not None and not job.done and not job.cancelled:
+                job.subscribers += 1
+                telemetry.increment("audit_jobs_deduplicated_total")
+                return job
+            job = Job(f"job-{next(self._ids)}", key, meta)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        telemetry.increment("audit_jobs_submitted_total")
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def add_finished(self, key, content, result, timings=None, meta=None):
+        """
+        Registers a job that is already DONE with content as its output (e.g. a
+        precomputed report), so sessions read it like any other job.
+        """
+        with self._lock:
+            self._purge()
+            job = Job(f"job-{next(self._ids)}", key, meta)
+            self._jobs[job.id] = job
+        job.timings.update(timings or {})
+        job.append(content)
+        job.finish(DONE, result=result)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        telemetry.observe("audit_job_queue_seconds", time.monotonic() - job.submitted_at)
+        try:
+            result = fn(job, *args, **kwargs)
+        except Exception as e:
+            print(f"Audit job {job.id} failed: {e}")
+            self._finish(job, FAILED, error=str(e))
+            return
+        self._finish(job, CANCELLED if job.cancelled else DONE, result=result)
+
+    def _finish(self, job, status, result=None, error=None):
+        with self._lock:
+            if self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+        job.finish(status, result, error)
+        telemetry.increment(f"audit_jobs_{status}_total")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def unsubscribe(self, job_id):
+        """
+        Drops one subscriber that joined a job it already held (e.g. a session re-submitting
+        its own running audit). Never stops the job, even if it was the last subscriber.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and not job.done and job.subscribers > 1:
+                job.subscribers -= 1
+
+    def cancel(self, job_id):
+        """
+        Drops one subscriber from the job; the job itself stops when none are left.
+        Returns True if the job was told to stop.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.subscribers -= 1
+            if job.subscribers > 0:
+                return False
+            job._cancel.set()
+            if self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+        # Wake readers so they see the cancellation without waiting for a chunk.
+        with job._changed:
+            job._changed.notify_all()
+        return True
+
+    def _purge(self):
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.done and now - job.finished_at > self.retention_seconds]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            for job in self._jobs.values():
+                job._cancel.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the process-wide JobExecutor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = JobExecutor(
+                    max_workers=int(os.getenv("AUDIT_WORKERS", "8")),
+                    retention_seconds=float(os.getenv("AUDIT_JOB_RETENTION", "600")),
+                )
+    return _executor
+
+
+def audit_key(category, metrics, fast=False, refresh=False):
+    """
+    Dedupe key for an audit: identical inputs give identical prompts, hence the same answer.
+    A refresh only joins other refreshes, never a job that may answer from the caches.
+    """
+    payload = json.dumps({"category": category, "metrics": metrics, "fast": bool(fast), "refresh": bool(refresh)},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _run_audit(job, category, metrics, fast, refresh):
+    # The audit span lives in the worker, so a job shared by several sessions is recorded once.
+    with telemetry.audit(category):
+        parser = ReportStreamParser()
+        stream = llm_handler.generate_response_stream(f"Analyze metrics for {category}", category, metrics,
+                                                      timings=job.timings, fast=fast, refresh=refresh)
+        try:
+            for chunk in stream:
+                if job.cancelled:
+                    return None
+                parser.feed(chunk)
+                job.append(chunk)
+        finally:
+            # Closing the generator closes the HTTP stream when the job is cancelled mid-answer.
+            stream.close()
+        if parser.first_field_seconds is not None:
+            job.timings["first_field_seconds"] = parser.first_field_seconds
+        # Fences and broken or cut-off JSON are repaired locally; only missing fields are re-asked for.
+        with telemetry.timed("parse"):
+            return llm_handler.complete_report(category, metrics, parser.buffer)
+
+
+def submit_audit(category, metrics, fast=False, refresh=False):
+    """
+    Starts (or joins) the background audit of one category. Returns its Job; the
+    ParsedReport ends up in job.result. refresh=True skips the response cache and the
+    near-duplicate index (see llm.generate_response_stream).
+    """
+    return get_executor().submit(audit_key(category, metrics, fast, refresh), _run_audit, category, metrics, fast,
+                                 refresh, meta={"category": category, "metrics": metrics})
+
+
+def materialized_audit(category, stored):
+    """
+    A finished Job for a precomputed audit (a src.materialize.Materialized); no request is made.
+    """
+    return get_executor().add_finished(
+        audit_key(category, stored.metrics), stored.report, parse_report(stored.report),
+        timings={"materialized_at": stored.created_at}, meta={"category": category, "metrics": stored.metrics})
@@ -1,12 +1,21 @@
+import hashlib
 import os
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import time
+
+from src import telemetry
+from src.cache import get_cache, make_key
+from src.report import format_kwargs, merge_reports, parse_report, reask_message, report_schema
+from src.router import get_router
+from src.rules import fast_response
+from src.similar import get_similar_cache
+from src.prompts import CATEGORY_PROMPT_FILES, PROMPTS_DIR, get_registry, render_system_prompt
+from src.startup import load_env
 
 # Load environment variables
-load_dotenv()
+load_env()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+TEMPERATURE = 0.2
 
 CATEGORIES = [
     "Customer Acquisition",
@@ -19,15 +28,10 @@ CATEGORIES = [
 def load_prompt(filename, **kwargs):
     """
     Loads a prompt from the 'prompts' directory and formats it with kwargs.
+    Prompt files are served from the in-memory registry (src/prompts.py).
     """
     try:
-        # Assuming the 'prompts' directory is one level up from 'src'
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        filepath = os.path.join(base_dir, "prompts", filename)
-        
-        with open(filepath, "r") as f:
-            template = f.read()
-            return template.format(**kwargs)
+        return get_registry().text(filename).format(**kwargs)
     except Exception as e:
         print(f"Error loading prompt {filename}: {e}")
         return ""
@@ -36,9 +40,12 @@ def load_prompt(filename, **kwargs):
 def load_target_prompt(file_path):
     """
     Load target_prompt prompt from a markdown file and return it as a string.
+    Files inside prompts/ come from the registry; other paths are read from disk.
     Returns:
         str: The target prompt as a string.
     """
+    if os.path.dirname(os.path.abspath(file_path)) == PROMPTS_DIR:
+        return get_registry().text(os.path.basename(file_path))
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
             return file.read()
@@ -47,170 +54,319 @@ def load_target_prompt(file_path):
         return ""
 
 
-def generate_response(query, category, metrics):
+@telemetry.instrument("prompt_build")
+def build_messages(category, metrics):
     """
-    Generates a response based on the category using a specific prompt file.
-    Uses the new system_prompt and build_user_prompt structure while adapting to available metrics.
+    Builds the chat messages for one audit from the precompiled templates.
+    Returns (messages, prompt_versions) where prompt_versions holds the template
+    version hashes, for cache keys.
     """
-    metrics_str = json.dumps(metrics, indent=2)
+    registry = get_registry()
 
-    # Map category to specific prompt file (Target Explanation)
-    category_map = {
-        "Customer Acquisition": "customer_acquisition.md",
-        "Customer Satisfaction": "customer_satisfaction.md",
-        "Revenue Growth": "revenue_growth.md",
-        "Customer Retention": "customer_retention.md"
-    }
+    # 1. System Prompt (precompiled per category)
+    sys_prompt, user_template = registry.compiled(category)
 
-    # Get the correct filename, default to generic response_generation.md if not found
-    prompt_file = category_map.get(category, "response_generation.md")
+    # 2. User Prompt (adapting strictly to available metrics)
+    user_prompt_str = user_template.render(**user_prompt_fields(metrics))
 
-    # Construct absolute path for load_target_prompt
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    target_prompt_path = os.path.join(base_dir, "prompts", prompt_file)
+    messages = [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt_str}
+    ]
+    return messages, registry.versions(category)
 
-    # 1. Build System Prompt
-    sys_prompt = system_prompt(category, target_prompt_path)
 
-    # 2. Build User Prompt (adapting strictly to available metrics)
-    user_prompt_str = build_user_prompt(category, metrics)
+def portfolio_blocks(category, metrics_list):
+    """
+    The per-campaign blocks of a multi-campaign audit, numbered from 1.
+    """
+    _, _, block = get_registry().portfolio(category)
+    return [block.render(index=i, **user_prompt_fields(metrics)) for i, metrics in enumerate(metrics_list, 1)]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": user_prompt_str}
-            ],
-            temperature=0.2,
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"Error generating response: {e}"
 
+@telemetry.instrument("prompt_build")
+def build_portfolio_messages(category, metrics_list, blocks=None):
+    """
+    Chat messages auditing several campaigns in one request (see src/portfolio.py).
+    The system prompt is the category's usual one, sent once for the whole batch.
+    Returns (messages, prompt_versions).
+    """
+    registry = get_registry()
+    sys_prompt, portfolio, block = registry.portfolio(category)
+    blocks = blocks if blocks is not None else portfolio_blocks(category, metrics_list)
+    user_prompt_str = portfolio.render(count=len(blocks), campaigns="\n\n".join(blocks))
+    messages = [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content": user_prompt_str}
+    ]
+    versions = dict(registry.versions(category), portfolio=portfolio.version, block=block.version)
+    return messages, versions
+
+
+def model_for(category):
+    """
+    The first model of the category's route (src/router.py), for callers that do not route.
+    """
+    return get_router().route(category)[0]
 
-def system_prompt(target, target_prompt_path):
-    # Load target campaign explanation prompt
-    # Note: Using load_prompt helper to handle path resolution relative to workspace if needed, 
-    # or the new load_target_prompt if path is absolute. Using load_target_prompt here as requested.
-    target_explanation = load_target_prompt(target_prompt_path)
 
-    return f"""
-            You are a senior marketing performance auditor.
+def cache_key_for(category, messages, prompt_versions):
+    return make_key(get_router().route_key(category), TEMPERATURE, messages[0]["content"], messages[1]["content"],
+                    prompt_versions)
 
-            Your job is to diagnose paid advertising campaigns and deliver a decisive business verdict.
 
-            You think step-by-step internally but NEVER reveal your reasoning process.
+def report_version(category):
+    """
+    Hash of everything besides the metrics that shapes a category's report (route,
+    temperature and prompt template versions); precomputed audits (src/materialize.py)
+    are only served while it is unchanged.
+    """
+    payload = json.dumps([get_router().route_key(category), TEMPERATURE, get_registry().versions(category)],
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-            ------------------------------------------------------------
-            STEP 1 — Diagnose Performance
-            Evaluate every metric.
-            Label each as STRONG, NORMAL, or WEAK based on industry standards.
 
-            Do not analyze metrics in isolation.
-            Identify relationships between them.
-            Explain cause-and-effect chains.
+def similar_group(category, metrics, prompt_versions):
+    """
+    Reports may only be reused (src/similar.py) for the same route, category, campaign and
+    prompts. The trend is compared through the 'Trend Changes' ratios in the metric vector.
+    """
+    return (get_router().route_key(category), TEMPERATURE, category, metrics.get("Campaign Name"), prompt_versions)
 
-            ------------------------------------------------------------
-            STEP 2 — Identify Root Cause
-            Go beyond surface metrics.
-            Find the single biggest leverage point.
-            Is the problem:
-            - Audience
-            - Message
-            - Offer
-            - Budget allocation
-            - Landing page
-            - Timing
 
-            Choose ONE primary root cause.
+def find_similar(category, metrics, prompt_versions):
+    """
+    A stored report for near-identical metrics (a src.similar.Match), or None.
+    """
+    similar = get_similar_cache()
+    if similar is None:
+        return None
+    match = similar.lookup(similar_group(category, metrics, prompt_versions), metrics)
+    telemetry.increment("similar_cache_hits_total" if match is not None else "similar_cache_misses_total")
+    return match
 
-            ------------------------------------------------------------
-            STEP 3 — Make a Decision
-            Give ONE clear verdict:
-            - Continue
-            - Fix
-            - Cut
 
-            Be decisive.
+def remember(cache, cache_key, category, metrics, prompt_versions, content):
+    """
+    Stores a complete report in the exact-match cache and the near-duplicate index.
+    """
+    cache.set(cache_key, content)
+    similar = get_similar_cache()
+    if similar is not None:
+        similar.add(similar_group(category, metrics, prompt_versions), metrics, content)
 
-            ------------------------------------------------------------
-            IMPORTANT CONTEXT
 
-            The analysis MUST align with this campaign target:
+def generate_response(query, category, metrics, use_cache=True, fast=False, info=None):
+    """
+    Generates a response based on the category using a specific prompt file.
+    Uses the new system_prompt and build_user_prompt structure while adapting to available metrics.
+    Responses are served from the on-disk cache (src/cache.py) when the same prompts were seen before,
+    or reused from an audit with near-identical metrics (src/similar.py); an info dict, if
+    passed, then receives 'similar_max_change'.
+    With fast=True, clear-cut cases are answered by the local rules engine (src/rules.py).
+    """
+    if fast:
+        local = fast_response(category, metrics)
+        if local is not None:
+            return local
+
+    messages, prompt_versions = build_messages(category, metrics)
+
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache_key_for(category, messages, prompt_versions)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+        match = find_similar(category, metrics, prompt_versions)
+        if match is not None:
+            if info is not None:
+                info["similar_max_change"] = match.max_change
+            return match.response
 
-            TARGET:
-            {target}
+    try:
+        # Routed: fallback and hedging across the category's models (src/router.py).
+        with telemetry.timed("llm_call"):
+            model, response = get_router().complete(
+                category,
+                messages=messages,
+                temperature=TEMPERATURE,
+                **format_kwargs(),
+            )
+        telemetry.record_usage(model, getattr(response, "usage", None))
+        content = response.choices[0].message.content
+    except Exception as e:
+        return f"Error generating response: {e}"
 
-            TARGET EXPLANATION:
-            {target_explanation}
+    # Bad or cut-off JSON is repaired, and only the missing fields are asked for again.
+    parsed = complete_report(category, metrics, content, use_cache=False, messages=messages)
+    if parsed.report:
+        content = parsed.to_json()
+    if cache is not None and content and parsed.complete:
+        remember(cache, cache_key, category, metrics, prompt_versions, content)
+    return content
 
-            ------------------------------------------------------------
-            COMMUNICATION STYLE
 
-            Write for a smart business owner.
+def generate_response_stream(query, category, metrics, use_cache=True, timings=None, fast=False, refresh=False):
+    """
+    Streaming version of generate_response: yields the response text in chunks as they arrive.
+    If a timings dict is passed it receives 'first_token_seconds' (time to first content)
+    and 'total_seconds' once the stream ends, 'model' (the model that answered), plus
+    'similar_max_change' when a report for near-identical metrics was reused.
+    With refresh=True neither the cache nor the near-duplicate index is read, but the
+    fresh report replaces what they hold.
+    """
+    started = time.perf_counter()
+    timings = timings if timings is not None else {}
+
+    if fast:
+        local = fast_response(category, metrics)
+        if local is not None:
+            timings["first_token_seconds"] = timings["total_seconds"] = time.perf_counter() - started
+            timings["local"] = True
+            yield local
+            return
+    messages, prompt_versions = build_messages(category, metrics)
+
+    cache = get_cache() if use_cache else None
+    if cache is not None:
+        cache_key = cache_key_for(category, messages, prompt_versions)
+    if cache is not None and not refresh:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            timings["first_token_seconds"] = timings["total_seconds"] = time.perf_counter() - started
+            timings["cached"] = True
+            yield cached
+            return
+        match = find_similar(category, metrics, prompt_versions)
+        if match is not None:
+            timings["first_token_seconds"] = timings["total_seconds"] = time.perf_counter() - started
+            timings["similar_max_change"] = match.max_change
+            yield match.response
+            return
+
+    parts = []
+    stream = None
+    try:
+        stream = get_router().stream(
+            category,
+            messages=messages,
+            temperature=TEMPERATURE,
+            stream_options={"include_usage": True},
+            **format_kwargs(),
+        )
+        timings["model"] = stream.model
+        for event in stream:
+            # With include_usage the final event carries token usage and no choices.
+            if getattr(event, "usage", None) is not None:
+                telemetry.record_usage(stream.model, event.usage)
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if not delta:
+                continue
+            if not parts:
+                timings["first_token_seconds"] = time.perf_counter() - started
+            parts.append(delta)
+            yield delta
+    except Exception as e:
+        yield f"Error generating response: {e}"
+        return
+    finally:
+        timings["total_seconds"] = time.perf_counter() - started
+        # Also reached when the consumer stops early (e.g. a cancelled job): release the connection.
+        if stream is not None:
+            stream.close()
+        if "first_token_seconds" in timings:
+            telemetry.record_stage("llm_call", timings["total_seconds"])
+            telemetry.observe("first_token_seconds", timings["first_token_seconds"])
+
+    content = "".join(parts)
+    # Incomplete reports are left to complete_report, which caches the fixed version.
+    if cache is not None and content and parse_report(content).complete:
+        remember(cache, cache_key, category, metrics, prompt_versions, content)
+
+
+def complete_report(category, metrics, content, use_cache=True, messages=None):
+    """
+    Parses a report response into a ParsedReport (src/report.py). Fences and broken or
+    truncated JSON are repaired locally; fields that are still missing are asked for in
+    one small follow-up call instead of regenerating the whole report. When something
+    had to be fixed and the report is now complete, the cache gets the fixed version.
+    """
+    parsed = parse_report(content)
+    if parsed.complete and not parsed.repaired:
+        return parsed
+    if not parsed.report:
+        # Nothing usable (e.g. an error message or plain prose): leave it to the caller.
+        telemetry.increment("report_unparseable_total")
+        return parsed
+
+    if messages is None:
+        messages, prompt_versions = build_messages(category, metrics)
+    else:
+        prompt_versions = get_registry().versions(category)
+
+    if parsed.missing:
+        telemetry.increment("report_reask_total")
+        followup = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": reask_message(parsed.report, parsed.missing)},
+        ]
+        try:
+            with telemetry.timed("llm_reask"):
+                model, response = get_router().complete(
+                    category,
+                    messages=followup,
+                    temperature=TEMPERATURE,
+                    **format_kwargs(report_schema(parsed.missing), "report_fields"),
+                )
+            telemetry.record_usage(model, getattr(response, "usage", None))
+            extra = parse_report(response.choices[0].message.content, parsed.missing)
+            parsed.report = merge_reports(parsed.report, extra.report)
+            parsed.missing = [field for field in parsed.missing if field not in parsed.report]
+        except Exception as e:
+            print(f"Error completing report: {e}")
+    else:
+        telemetry.increment("report_repaired_total")
+
+    cache = get_cache() if use_cache else None
+    if cache is not None and parsed.complete:
+        remember(cache, cache_key_for(category, messages, prompt_versions), category, metrics, prompt_versions, parsed.to_json())
+    return parsed
 
-            1) First explain in plain English (no acronyms).
-            2) Then briefly reference technical metrics (CTR, ROAS, CAC).
 
-            Be direct.
-            Be blunt if money is being wasted.
-            Never invent data.
+def system_prompt(target, target_prompt_path):
+    """
+    Returns the system prompt for a target. Prompts in prompts/ for a known category come
+    precompiled from the registry; anything else is formatted on the fly.
+    """
+    registry = get_registry()
+    if target in CATEGORY_PROMPT_FILES and os.path.abspath(target_prompt_path) == os.path.join(PROMPTS_DIR, registry.prompt_file(target)):
+        return registry.compiled(target)[0]
+    target_explanation = load_target_prompt(target_prompt_path)
+    return render_system_prompt(target, target_explanation, registry.compact)
 
-            ------------------------------------------------------------
-            OUTPUT RULES
 
-            Return ONLY valid JSON.
-            No markdown.
-            No explanation outside JSON.
-            Match the exact schema provided below:
-            {{
-            "headline": "Short punchy headline summary",
-            "analysis": "Detailed analysis of the performance step-by-step",
-            "core_issue": "The one main problem",
-            "why_it_matters": "Business impact explanation",
-            "recommended_action": "Specific action to take",
-            "expected_outcome": "What will happen after fix",
-            "detected_issues": ["Issue 1", "Issue 2"],
-            "confidence_score": 85
-            }}
-            """
+def user_prompt_fields(metrics):
+    """
+    Values for the user prompt template, taken from the metrics dictionary.
+    """
+    return {
+        "campaign_name": metrics.get('Campaign Name', 'Unknown'),
+        "spend": metrics.get('Total Spend', 0),
+        "revenue": metrics.get('Total Revenue', 0),
+        "sales": metrics.get('Total Conversions', 0),
+        "impressions": metrics.get('Total Impressions', 0),
+        "clicks": metrics.get('Total Clicks', 0),
+        "ctr": metrics.get('CTR', 'N/A'),
+        "conversion_rate": metrics.get('Conversion Rate', 'N/A'),
+        "roas": metrics.get('ROAS', 'N/A'),
+        "cpa": metrics.get('CPA', 'N/A'),
+        "trend": metrics.get('Trend', 'No trend data available.'),
+    }
 
 
 def build_user_prompt(category, metrics):
     # Constructing a simulated 'user_input' based on the metrics we have
-    # Since we moved to a single row CSV, we can assume the metrics dictionary 
-    # has the raw values passed from data.py (which I need to verify in data.py next)
-
-    return f"""
-            BUSINESS:
-            (Infer business type from campaign data)
-            Goal: {category}
-
-            CAMPAIGN:
-            Name: {metrics.get('Campaign Name', 'Unknown')}
-            Spend: ${metrics.get('Total Spend', 0)}
-            Revenue: ${metrics.get('Total Revenue', 0)}
-            Sales: {metrics.get('Total Conversions', 0)}
-            Impressions: {metrics.get('Total Impressions', 0)}
-            Clicks: {metrics.get('Total Clicks', 0)}
-
-            METRICS:
-            Click-through rate: {metrics.get('CTR', 'N/A')}
-            Conversion rate: {metrics.get('Conversion Rate', 'N/A')}
-            Return on ad spend: {metrics.get('ROAS', 'N/A')}
-            Cost per customer: ${metrics.get('CPA', 'N/A')} (CPA estimated as Cost per Customer)
-
-            Return JSON:
-            {{
-            "headline": "",
-            "analysis": "",
-            "core_issue": "",
-            "why_it_matters": "",
-            "recommended_action": "",
-            "expected_outcome": "",
-            "detected_issues": [],
-            "confidence_score": 0
-            }}
-            Please audit this performance based on the metrics above.
-        """
+    return get_registry().compiled(category)[1].render(**user_prompt_fields(metrics))
@@ -0,0 +1,370 @@
+"""
+Precomputed audits: metrics and report for every campaign x category, kept in SQLite.
+
+Campaign data changes about once a day, so instead of auditing on every page load a
+scheduled job audits everything once per data refresh:
+
+    python -m src.materialize --data data/campaign_data.csv [--watch 300]
+
+Run it after each ingest (or from cron), or let --watch poll the file. app.py looks the
+report up first and only starts a live audit when nothing matches the current data.
+
+Entries are versioned by data version (a hash of the CSV's contents) and report version
+(llm.report_version: route, temperature and prompt template versions), so a data
+refresh or a prompt edit never serves an outdated report. The whole-data audit that
+the app shows is stored under the campaign ALL_CAMPAIGNS. Each run also records the
+file's (path, mtime, size) next to the version it hashed, so a lookup only stats the
+file: a file nothing was materialized for misses until the next run.
+
+Settings come from the environment:
+    MATERIALIZED_PATH       SQLite file (default .cache/materialized.sqlite)
+    MATERIALIZED_DISABLED   1 to never read or write precomputed audits
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import src.data as data_processor
+import src.llm as llm_handler
+from src import telemetry
+from src.batch import audit_one, campaign_metrics, TokenBucket
+from src.client import get_manager
+from src.metrics import CATEGORIES
+from src.report import parse_report
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "materialized.sqlite")
+ALL_CAMPAIGNS = ""
+# Data versions kept after a run; older ones are pruned.
+KEEP_VERSIONS = 3
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def data_version(data_path=data_processor.DEFAULT_DATA_PATH):
+    """
+    SHA-256 of the data file's contents, or None if it does not exist. Memoized per
+    (path, mtime, size). Only materialization runs hash the file; lookups use the
+    version the last run recorded for the file's stat (MaterializedStore.version_for).
+    """
+    identity = data_processor.file_identity(data_path)
+    if identity[1] is None:
+        return None
+    with _versions_lock:
+        version = _versions.get(identity)
+    if version is None:
+        digest = hashlib.sha256()
+        with open(identity[0], "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        version = digest.hexdigest()
+        with _versions_lock:
+            _versions[identity] = version
+    return version
+
+
+class Materialized:
+    """
+    One precomputed audit: the metrics it was run on, the report and when it was stored.
+    """
+
+    def __init__(self, metrics, report, created_at):
+        self.metrics = metrics
+        self.report = report
+        self.created_at = created_at
+
+
+class MaterializedStore:
+    """
+    Precomputed audits in a SQLite file, keyed by (data version, category, campaign,
+    report version), plus one row per materialization run.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS audits (
+                data_version TEXT NOT NULL,
+                category TEXT NOT NULL,
+                campaign TEXT NOT NULL,
+                report_version TEXT NOT NULL,
+                metrics TEXT NOT NULL,
+                report TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (data_version, category, campaign, report_version)
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                data_version TEXT PRIMARY KEY,
+                data_path TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                stored INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                data_path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                data_version TEXT NOT NULL,
+                PRIMARY KEY (data_path, mtime_ns, size)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def get(self, data_version, category, report_version, campaign=ALL_CAMPAIGNS):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metrics, report, created_at FROM audits "
+                "WHERE data_version = ? AND category = ? AND campaign = ? AND report_version = ?",
+                (data_version, category, campaign, report_version)).fetchone()
+        if row is None:
+            return None
+        return Materialized(json.loads(row[0]), row[1], row[2])
+
+    def stored_keys(self, data_version):
+        """
+        {(category, campaign, report version)} already stored for a data version.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT category, campaign, report_version FROM audits WHERE data_version = ?",
+                                      (data_version,)).fetchall()
+        return set(rows)
+
+    def put(self, data_version, category, campaign, report_version, metrics, report):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO audits VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (data_version, category, campaign, report_version, json.dumps(metrics), report, time.time()))
+            self._conn.commit()
+
+    def start_run(self, data_version, data_path):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO runs (data_version, data_path, started_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(data_version) DO UPDATE SET started_at = excluded.started_at, finished_at = NULL",
+                (data_version, os.path.abspath(data_path), time.time()))
+            self._conn.commit()
+
+    def record_file(self, identity, data_version):
+        """
+        Remembers that the file with identity (data.file_identity) hashes to data_version.
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (*identity, data_version))
+            self._conn.commit()
+
+    def version_for(self, identity):
+        """
+        The data version recorded for a file identity, or None.
+        """
+        if identity[1] is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT data_version FROM files WHERE data_path = ? AND mtime_ns = ? AND size = ?",
+                                     identity).fetchone()
+        return row[0] if row else None
+
+    def finish_run(self, data_version, stored, failed):
+        with self._lock:
+            self._conn.execute("UPDATE runs SET finished_at = ?, stored = stored + ?, failed = ? WHERE data_version = ?",
+                               (time.time(), stored, failed, data_version))
+            self._conn.commit()
+
+    def prune(self, keep=KEEP_VERSIONS):
+        """
+        Drops the audits of all but the `keep` most recently started data versions.
+        Returns the number of audits removed.
+        """
+        with self._lock:
+            old = [row[0] for row in self._conn.execute(
+                "SELECT data_version FROM runs ORDER BY started_at DESC LIMIT -1 OFFSET ?", (keep,))]
+            removed = 0
+            for version in old:
+                removed += self._conn.execute("DELETE FROM audits WHERE data_version = ?", (version,)).rowcount
+                self._conn.execute("DELETE FROM runs WHERE data_version = ?", (version,))
+                self._conn.execute("DELETE FROM files WHERE data_version = ?", (version,))
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        with self._lock:
+            audits, versions = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT data_version) FROM audits").fetchone()
+            last = self._conn.execute(
+                "SELECT data_version, finished_at FROM runs ORDER BY started_at DESC LIMIT 1").fetchone()
+        return {"audits": audits, "data_versions": versions,
+                "last_version": last[0] if last else None, "last_finished_at": last[1] if last else None}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Returns the shared store (MATERIALIZED_PATH), or None when MATERIALIZED_DISABLED is set.
+    """
+    global _store
+    if os.getenv("MATERIALIZED_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MaterializedStore(os.getenv("MATERIALIZED_PATH", DEFAULT_PATH))
+    return _store
+
+
+def lookup(category, data_path=data_processor.DEFAULT_DATA_PATH, campaign=ALL_CAMPAIGNS):
+    """
+    The precomputed audit of category for the current contents of data_path, or None
+    when there is none for this data and these prompts (e.g. the data is newer than
+    the last run). Only stats the file; the contents are never read here.
+    """
+    store = get_store()
+    version = store.version_for(data_processor.file_identity(data_path)) if store is not None else None
+    if version is None:
+        return None
+    found = store.get(version, category, llm_handler.report_version(category), campaign)
+    telemetry.increment("materialized_hits_total" if found is not None else "materialized_misses_total")
+    return found
+
+
+def audit_targets(data_path, categories=CATEGORIES, campaigns=True):
+    """
+    [(campaign, category, metrics)] to audit: the whole-data audit per category, as the
+    app computes it, then every campaign x category.
+    """
+    if data_processor.use_streaming(data_path):
+        aggregates = data_processor.aggregate_data(data_path)
+        if campaigns:
+            print(f"{data_path} is over DATA_STREAMING_MB: per-campaign audits skipped")
+        return [(ALL_CAMPAIGNS, category, data_processor.get_metrics_from_aggregates(category, aggregates))
+                for category in categories]
+
+    df = data_processor.load_data(data_path)
+    if df is None:
+        return []
+    daily = data_processor.load_daily_partials(data_path)
+    targets = [(ALL_CAMPAIGNS, category, data_processor.get_metrics_for_category(category, df, daily=daily))
+               for category in categories]
+    if campaigns:
+        targets.extend((campaign, category, metrics)
+                       for campaign, by_category in campaign_metrics(df, categories).items()
+                       for category, metrics in by_category.items())
+    return targets
+
+
+async def _audit_all(client, todo, store, version, report_versions, concurrency, rps, max_retries, use_cache):
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rps)
+    # No reuse from the similar index: a stored audit is served as written for exactly these metrics.
+    tasks = [asyncio.create_task(audit_one(client, campaign, category, metrics, semaphore, bucket,
+                                           max_retries=max_retries, use_cache=use_cache, use_similar=False))
+             for campaign, category, metrics in todo]
+    stored = failed = 0
+    for finished in asyncio.as_completed(tasks):
+        result = await finished
+        response = result["response"]
+        # Incomplete reports are not stored: the app then audits live, which re-asks for missing fields.
+        if result["error"] or not response or not parse_report(response).complete:
+            failed += 1
+            continue
+        store.put(version, result["category"], result["campaign_name"], report_versions[result["category"]],
+                  result["metrics"], response)
+        stored += 1
+    return stored, failed
+
+
+def materialize(data_path=data_processor.DEFAULT_DATA_PATH, categories=CATEGORIES, campaigns=True, client=None,
+                concurrency=16, rps=0.0, max_retries=5, use_cache=True, store=None):
+    """
+    Audits the current data and stores the results. Audits already stored for this data
+    and report version are skipped, so a repeated or interrupted run only does what is
+    missing. Returns a summary dict.
+    """
+    # MATERIALIZED_DISABLED only stops the app from reading; an explicit run still writes.
+    store = store or get_store() or MaterializedStore(os.getenv("MATERIALIZED_PATH", DEFAULT_PATH))
+    started = time.perf_counter()
+    identity = data_processor.file_identity(data_path)
+    version = data_version(data_path)
+    if version is None:
+        raise FileNotFoundError(data_path)
+
+    targets = [(campaign, category, metrics) for campaign, category, metrics
+               in audit_targets(data_path, categories, campaigns) if "error" not in metrics]
+    report_versions = {category: llm_handler.report_version(category) for category in categories}
+    stored_keys = store.stored_keys(version)
+    todo = [(campaign, category, metrics) for campaign, category, metrics in targets
+            if (category, campaign, report_versions[category]) not in stored_keys]
+
+    store.start_run(version, data_path)
+    if data_processor.file_identity(data_path) == identity:
+        # Not if the file changed while it was hashed: the version may not match that stat.
+        store.record_file(identity, version)
+    stored = failed = 0
+    if todo:
+        # Retries are handled by audit_one, so the SDK's own retry loop is turned off.
+        client = client or get_manager().async_client(max_retries=0)
+        stored, failed = asyncio.run(_audit_all(client, todo, store, version, report_versions,
+                                                concurrency, rps, max_retries, use_cache))
+    store.finish_run(version, stored, failed)
+    pruned = store.prune()
+    return {"data_version": version[:12], "targets": len(targets), "already_stored": len(targets) - len(todo),
+            "stored": stored, "failed": failed, "pruned": pruned,
+            "seconds": round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=data_processor.DEFAULT_DATA_PATH)
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--rps", type=float, default=0.0, help="Requests per second limit (0 = unlimited)")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--no-campaigns", action="store_true", help="Only the whole-data audits the app shows")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk response cache")
+    parser.add_argument("--watch", type=float, default=0.0, metavar="SECONDS",
+                        help="Keep running and materialize again whenever the data file changes")
+    args = parser.parse_args(argv)
+
+    def run():
+        summary = materialize(args.data, campaigns=not args.no_campaigns, concurrency=args.concurrency,
+                              rps=args.rps, max_retries=args.max_retries, use_cache=not args.no_cache)
+        print(json.dumps(summary), flush=True)
+        return summary
+
+    if not args.watch:
+        if data_processor.file_identity(args.data)[1] is None:
+            print(f"Data file not found: {args.data}", file=sys.stderr)
+            return 1
+        return 0 if run()["failed"] == 0 else 2
+
+    seen = None
+    while True:
+        identity = data_processor.file_identity(args.data)
+        if identity[1] is not None and identity != seen:
+            try:
+                # Failed audits are retried on the next poll; a clean run waits for new data.
+                if run()["failed"] == 0:
+                    seen = identity
+            except Exception as e:
+                print(f"Materialization failed: {e}", file=sys.stderr)
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+CATEGORIES = [
+    "Customer Acquisition",
+    "Customer Satisfaction",
+    "Revenue Growth",
+    "Customer Retention"
+]
+
+# Columns we add up per group, and the ones we average.
+SUM_COLUMNS = ["spend", "revenue", "impressions", "clicks", "conversions", "new_customers", "retained_customers"]
+MEAN_COLUMNS = ["customer_satisfaction_score", "churn_rate"]
+
+GROUP_KEYS = ["campaign_name", "channel", "date"]
+
+
+def _group_codes(df, group_by):
+    """
+    Maps every row to a dense group id in one vectorized pass.
+    Returns (codes, index, first_rows) where index holds the group keys in sorted order
+    (None without group_by) and first_rows the index of the first row of each group.
+    """
+    n_rows = len(df)
+    if not group_by:
+        return np.zeros(n_rows, dtype=np.intp), None, np.zeros(1, dtype=np.intp)
+
+    level_codes = []
+    level_uniques = []
+    for key in group_by:
+        codes, uniques = pd.factorize(df[key], sort=True)
+        if isinstance(uniques, pd.CategoricalIndex):
+            # Keys are plain values whether the column is categorical or not.
+            uniques = pd.Index(uniques.to_numpy())
+        level_codes.append(codes)
+        level_uniques.append(uniques)
+
+    shape = tuple(max(len(u), 1) for u in level_uniques)
+    flat = np.ravel_multi_index(level_codes, shape) if len(level_codes) > 1 else level_codes[0]
+    flat_keys, first_rows, codes = np.unique(flat, return_index=True, return_inverse=True)
+
+    key_levels = np.unravel_index(flat_keys, shape)
+    # Built from the level arrays directly; going through Python tuples is far slower.
+    levels = [level_uniques[i].take(key_levels[i]) for i in range(len(group_by))]
+    index = pd.MultiIndex.from_arrays(levels, names=group_by) if len(levels) > 1 \
+        else levels[0].rename(group_by[0])
+    return codes.reshape(-1), index, first_rows
+
+
+def _normalize_group_by(group_by):
+    group_by = [group_by] if isinstance(group_by, str) else list(group_by or [])
+    unknown = [key for key in group_by if key not in GROUP_KEYS]
+    if unknown:
+        raise ValueError(f"Unsupported group_by columns: {unknown}. Use any of {GROUP_KEYS}")
+    return group_by
+
+
+def compute_partials(df, group_by=None):
+    """
+    Computes mergeable per-group partial aggregates in one pass over NumPy arrays:
+    sums for SUM_COLUMNS, '<column>_sum' / '<column>_count' pairs for MEAN_COLUMNS,
+    a row count and the first campaign name. Partials from different slices of the
+    data can be combined with merge_partials() and turned into totals with finalize_totals().
+    """
+    group_by = _normalize_group_by(group_by)
+    codes, index, first_rows = _group_codes(df, group_by)
+    n_groups = len(index) if index is not None else 1
+
+    partials = {}
+    for column in SUM_COLUMNS:
+        if column in df:
+            values = df[column].to_numpy(dtype=np.float64, na_value=0.0)
+            partials[column] = np.bincount(codes, weights=values, minlength=n_groups)
+        else:
+            partials[column] = np.zeros(n_groups)
+
+    # Same fallback as before: without a new_customers column, conversions stand in for it.
+    if "new_customers" not in df:
+        partials["new_customers"] = partials["conversions"].copy()
+
+    for column in MEAN_COLUMNS:
+        if column in df:
+            values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            present = ~np.isnan(values)
+            partials[f"{column}_sum"] = np.bincount(codes, weights=np.where(present, values, 0.0), minlength=n_groups)
+            partials[f"{column}_count"] = np.bincount(codes, weights=present, minlength=n_groups)
+        else:
+            partials[f"{column}_sum"] = np.zeros(n_groups)
+            partials[f"{column}_count"] = np.zeros(n_groups)
+
+    partials["row_count"] = np.bincount(codes, minlength=n_groups)
+
+    if "campaign_name" in df:
+        partials["first_campaign_name"] = df["campaign_name"].to_numpy()[first_rows]
+    else:
+        partials["first_campaign_name"] = np.full(n_groups, "Unknown Campaign", dtype=object)
+
+    out = pd.DataFrame(partials)
+    if index is not None:
+        out.index = index
+    return out
+
+
+def merge_partials(partials_list):
+    """
+    Combines partial aggregates (from compute_partials) computed over different rows.
+    Groups are matched on the index; the first campaign name seen is kept.
+    """
+    frames = [p for p in partials_list if p is not None and len(p)]
+    if not frames:
+        return None
+    combined = pd.concat(frames)
+    if combined.index.nlevels == 1 and combined.index.name is None:
+        combined.index = np.zeros(len(combined), dtype=np.intp)
+    grouped = combined.groupby(level=list(range(combined.index.nlevels)), sort=True)
+    merged = grouped.sum(numeric_only=True)
+    merged["first_campaign_name"] = grouped["first_campaign_name"].first()
+    if combined.index.nlevels == 1 and combined.index.name is None:
+        merged = merged.reset_index(drop=True)
+    return merged
+
+
+def finalize_totals(partials):
+    """
+    Turns partial aggregates into totals: means for MEAN_COLUMNS plus the derived ratios.
+    """
+    out = partials.copy()
+    for column in MEAN_COLUMNS:
+        sums = out.pop(f"{column}_sum").to_numpy(dtype=np.float64)
+        counts = out.pop(f"{column}_count").to_numpy(dtype=np.float64)
+        out[column] = np.divide(sums, counts, out=np.full(len(out), np.nan), where=counts > 0)
+    _add_ratios(out)
+    return out
+
+
+def compute_totals(df, group_by=None):
+    """
+    Computes totals, means and derived ratios for every group in one pass over NumPy arrays.
+    group_by can be None or any combination of 'campaign_name', 'channel' and 'date'.
+    Returns a DataFrame with one row per group (a single row when group_by is None).
+    """
+    return finalize_totals(compute_partials(df, group_by))
+
+
+def _add_ratios(totals):
+    """
+    Adds CPA, conversion rate, CTR and ROAS columns in place, vectorized over all groups.
+    Rates are stored as percentages; zero denominators give 0.
+    """
+    def safe_div(num, den):
+        num = totals[num].to_numpy()
+        den = totals[den].to_numpy()
+        return np.divide(num, den, out=np.zeros(len(totals)), where=den > 0)
+
+    totals["cpa"] = safe_div("spend", "new_customers")
+    totals["conversion_rate"] = safe_div("conversions", "clicks") * 100
+    totals["ctr"] = safe_div("clicks", "impressions") * 100
+    totals["roas"] = safe_div("revenue", "spend")
+
+
+def _format_rate(value):
+    # Called only with a non-zero denominator: a zero rate reads "0.0%", a missing one "0%".
+    return f"{round(value, 2)}%"
+
+
+def metrics_from_row(category_name, row, campaign_name=None):
+    """
+    Turns one row of compute_totals() into the metrics dictionary the app and prompts use.
+    """
+    metrics = {}
+    metrics['Campaign Name'] = campaign_name if campaign_name is not None else row["first_campaign_name"]
+    # Money is rounded to cents so summation order never leaks float noise into the prompt.
+    metrics['Total Spend'] = round(float(row["spend"]), 2)
+    metrics['Total Revenue'] = round(float(row["revenue"]), 2)
+    metrics['Total Impressions'] = int(row["impressions"])
+    metrics['Total Clicks'] = int(row["clicks"])
+    metrics['Total Conversions'] = int(row["conversions"])
+    metrics['Total New Customers'] = int(row["new_customers"])
+
+    metrics['CPA'] = round(float(row["cpa"]), 2)
+    metrics['Conversion Rate'] = _format_rate(float(row["conversion_rate"])) if row["clicks"] > 0 else "0%"
+    metrics['CTR'] = _format_rate(float(row["ctr"])) if row["impressions"] > 0 else "0%"
+    metrics['ROAS'] = round(float(row["roas"]), 2)
+
+    if category_name == "Customer Acquisition":
+        pass
+
+    elif category_name == "Customer Satisfaction":
+        csat = row["customer_satisfaction_score"]
+        metrics['Average CSAT Score'] = round(float(csat), 2) if not pd.isna(csat) else "N/A (Not in data)"
+
+    elif category_name == "Revenue Growth":
+        # ROAS and Revenue are already in base metrics
+        pass
+
+    elif category_name == "Customer Retention":
+        churn = row["churn_rate"]
+        metrics['Retention Volume'] = int(row["retained_customers"]) if row["retained_customers"] > 0 else "Data Not Available"
+        metrics['Average Churn Rate'] = round(float(churn), 4) if not pd.isna(churn) else "Data Not Available"
+
+    else:
+        metrics['info'] = "General category, showing summary."
+
+    return metrics
+
+
+def compute_all_metrics(df, group_by=None, categories=CATEGORIES):
+    """
+    Computes the metrics dictionaries for every category from a single aggregation pass.
+    Without group_by returns {category: metrics}.
+    With group_by returns {group_key: {category: metrics}} where group_key is a value
+    (one grouping column) or a tuple (several columns).
+    """
+    if df is None or df.empty:
+        return {"error": "No data available"}
+
+    totals = compute_totals(df, group_by)
+
+    if not group_by:
+        row = totals.iloc[0]
+        return {category: metrics_from_row(category, row) for category in categories}
+
+    grouped_by_campaign = group_by == "campaign_name" or (
+        not isinstance(group_by, str) and list(group_by)[:1] == ["campaign_name"])
+
+    results = {}
+    for key, row in zip(totals.index, totals.itertuples(index=False)):
+        row = row._asdict()
+        campaign = (key[0] if isinstance(key, tuple) else key) if grouped_by_campaign else None
+        results[key] = {category: metrics_from_row(category, row, campaign) for category in categories}
+    return results
@@ -0,0 +1,68 @@
+"""
+Multi-campaign audits: packs several campaigns of one category into a single request so
+the system prompt is sent once per batch instead of once per campaign.
+
+plan_batches() sizes the batches to a token budget; parse_reports() checks the model's
+array of reports and tells the caller which campaigns still need an answer, so a bad
+batch can be split and retried (see batch.audit_portfolio).
+"""
+import json
+
+from src.prompts import count_tokens
+from src.report import strip_fences, validate_report
+
+DEFAULT_TOKEN_BUDGET = 12_000
+# Completion tokens reserved per report, and the most we ask for in one response.
+REPORT_TOKENS = 450
+DEFAULT_OUTPUT_BUDGET = 8_000
+MAX_BATCH_SIZE = 16
+
+
+def plan_batches(block_tokens, fixed_tokens, token_budget=DEFAULT_TOKEN_BUDGET,
+                 output_budget=DEFAULT_OUTPUT_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Greedily groups campaign blocks, in order, so that every batch's prompt (fixed_tokens
+    for the system prompt and instructions plus its blocks) stays within token_budget and
+    its expected reports within output_budget. Returns a list of lists of block indexes.
+    A block that is too large on its own still gets a batch of one.
+    """
+    max_reports = max(1, min(max_batch_size, output_budget // REPORT_TOKENS))
+    batches, current, used = [], [], fixed_tokens
+    for index, tokens in enumerate(block_tokens):
+        if current and (used + tokens > token_budget or len(current) >= max_reports):
+            batches.append(current)
+            current, used = [], fixed_tokens
+        current.append(index)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def block_token_counts(blocks):
+    return [count_tokens(block)[0] for block in blocks]
+
+
+def parse_reports(content, campaign_names):
+    """
+    Parses a multi-campaign response. Returns (reports, missing) where reports maps each
+    campaign name to its report dict (without 'campaign_name') and missing lists the
+    campaigns with no valid report, in input order. Unknown names and duplicates are ignored.
+    """
+    expected = {str(name): name for name in campaign_names}
+    reports = {}
+    try:
+        data = json.loads(strip_fences(content))
+    except ValueError:
+        data = None
+    entries = data.get("reports") if isinstance(data, dict) else data
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        name = expected.get(str(entry.get("campaign_name", "")).strip())
+        report, invalid = validate_report(entry)
+        if name is None or name in reports or invalid:
+            continue
+        reports[name] = report
+    missing = [name for name in campaign_names if name not in reports]
+    return reports, missing
@@ -0,0 +1,503 @@
+import hashlib
+import os
+import re
+import textwrap
+import threading
+import time
+from string import Formatter
+
+from src.startup import load_env
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+# Map category to specific prompt file (Target Explanation)
+CATEGORY_PROMPT_FILES = {
+    "Customer Acquisition": "customer_acquisition.md",
+    "Customer Satisfaction": "customer_satisfaction.md",
+    "Revenue Growth": "revenue_growth.md",
+    "Customer Retention": "customer_retention.md"
+}
+DEFAULT_PROMPT_FILE = "response_generation.md"
+
+SYSTEM_PROMPT_TEMPLATE = """
+            You are a senior marketing performance auditor.
+
+            Your job is to diagnose paid advertising campaigns and deliver a decisive business verdict.
+
+            You think step-by-step internally but NEVER reveal your reasoning process.
+
+            ------------------------------------------------------------
+            STEP 1 — Diagnose Performance
+            Evaluate every metric.
+            Label each as STRONG, NORMAL, or WEAK based on industry standards.
+
+            Do not analyze metrics in isolation.
+            Identify relationships between them.
+            Explain cause-and-effect chains.
+
+            ------------------------------------------------------------
+            STEP 2 — Identify Root Cause
+            Go beyond surface metrics.
+            Find the single biggest leverage point.
+            Is the problem:
+            - Audience
+            - Message
+            - Offer
+            - Budget allocation
+            - Landing page
+            - Timing
+
+            Choose ONE primary root cause.
+
+            ------------------------------------------------------------
+            STEP 3 — Make a Decision
+            Give ONE clear verdict:
+            - Continue
+            - Fix
+            - Cut
+
+            Be decisive.
+
+            ------------------------------------------------------------
+            IMPORTANT CONTEXT
+
+            The analysis MUST align with this campaign target:
+
+            TARGET:
+            {target}
+
+            TARGET EXPLANATION:
+            {target_explanation}
+
+            ------------------------------------------------------------
+            COMMUNICATION STYLE
+
+            Write for a smart business owner.
+
+            1) First explain in plain English (no acronyms).
+            2) Then briefly reference technical metrics (CTR, ROAS, CAC).
+
+            Be direct.
+            Be blunt if money is being wasted.
+            Never invent data.
+
+            ------------------------------------------------------------
+            OUTPUT RULES
+
+            Return ONLY valid JSON.
+            No markdown.
+            No explanation outside JSON.
+            Match the exact schema provided below:
+            {{
+            "headline": "Short punchy headline summary",
+            "analysis": "Detailed analysis of the performance step-by-step",
+            "core_issue": "The one main problem",
+            "why_it_matters": "Business impact explanation",
+            "recommended_action": "Specific action to take",
+            "expected_outcome": "What will happen after fix",
+            "detected_issues": ["Issue 1", "Issue 2"],
+            "confidence_score": 85
+            }}
+            """
+
+USER_PROMPT_TEMPLATE = """
+            BUSINESS:
+            (Infer business type from campaign data)
+            Goal: {category}
+
+            CAMPAIGN:
+            Name: {campaign_name}
+            Spend: ${spend}
+            Revenue: ${revenue}
+            Sales: {sales}
+            Impressions: {impressions}
+            Clicks: {clicks}
+
+            METRICS:
+            Click-through rate: {ctr}
+            Conversion rate: {conversion_rate}
+            Return on ad spend: {roas}
+            Cost per customer: ${cpa} (CPA estimated as Cost per Customer)
+
+            TREND:
+            {trend}
+
+            Return JSON:
+            {{
+            "headline": "",
+            "analysis": "",
+            "core_issue": "",
+            "why_it_matters": "",
+            "recommended_action": "",
+            "expected_outcome": "",
+            "detected_issues": [],
+            "confidence_score": 0
+            }}
+            Please audit this performance based on the metrics above.
+        """
+
+# Multi-campaign audits: one request carries several campaign blocks and asks for an
+# array of reports keyed by campaign name.
+CAMPAIGN_BLOCK_TEMPLATE = """
+            CAMPAIGN {index}:
+            Name: {campaign_name}
+            Spend: ${spend}
+            Revenue: ${revenue}
+            Sales: {sales}
+            Impressions: {impressions}
+            Clicks: {clicks}
+            Click-through rate: {ctr}
+            Conversion rate: {conversion_rate}
+            Return on ad spend: {roas}
+            Cost per customer: ${cpa}
+            Trend:
+            {trend}
+        """
+
+PORTFOLIO_USER_PROMPT_TEMPLATE = """
+            BUSINESS:
+            (Infer business type from campaign data)
+            Goal: {category}
+
+            Audit each of the {count} campaigns below on its own merits. Where it helps the
+            decision, compare them (e.g. which one deserves budget first).
+
+            {campaigns}
+
+            Return JSON:
+            {{
+            "reports": [
+                {{
+                "campaign_name": "",
+                "headline": "",
+                "analysis": "",
+                "core_issue": "",
+                "why_it_matters": "",
+                "recommended_action": "",
+                "expected_outcome": "",
+                "detected_issues": [],
+                "confidence_score": 0
+                }}
+            ]
+            }}
+            Return exactly one report per campaign, with campaign_name copied exactly as given.
+        """
+
+
+def _hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+# Compaction (off unless PROMPT_COMPACT=1): same instructions in fewer input tokens. It changes
+# every prompt's text, so switching it either way misses every cached response and
+# precomputed audit once (their keys include the prompt versions).
+load_env()
+COMPACT_DEFAULT = os.getenv("PROMPT_COMPACT", "0").lower() in ("1", "true", "yes")
+
+_RULER = re.compile(r"^\s*[-=_*]{10,}\s*$")
+_SCHEMA_BLOCK = re.compile(r"Return JSON:\s*\{\{.*?\}\}", re.DOTALL)
+# Sections of the category files that repeat what the system prompt already says.
+REDUNDANT_SECTIONS = ("Reasoning mode:",)
+
+
+def compact_text(text):
+    """
+    Removes common indentation, trailing spaces and separator rulers, and collapses
+    runs of blank lines into one.
+    """
+    out = []
+    for line in textwrap.dedent(text).splitlines():
+        line = "" if _RULER.match(line) else line.rstrip()
+        if line or (out and out[-1]):
+            out.append(line)
+    return "\n".join(out).strip()
+
+
+def _normalize(line):
+    return re.sub(r"[^a-z0-9{}]+", " ", line.lower()).strip()
+
+
+def drop_sections(text, titles=REDUNDANT_SECTIONS):
+    """
+    Drops sections (a title line and the lines under it, up to the next blank line).
+    """
+    out = []
+    skipping = False
+    for line in text.splitlines():
+        if line.strip() in titles:
+            skipping = True
+            continue
+        if skipping and not line.strip():
+            skipping = False
+            continue
+        if not skipping:
+            out.append(line)
+    return "\n".join(out)
+
+
+def dedupe_lines(text, already_said):
+    """
+    Drops non-blank lines of text that already appear (ignoring case and punctuation)
+    in already_said.
+    """
+    seen = {_normalize(line) for line in already_said.splitlines()}
+    seen.discard("")
+    return "\n".join(line for line in text.splitlines() if not line.strip() or _normalize(line) not in seen)
+
+
+def _static_first(template):
+    """
+    Moves the template section holding {target} to the end, so everything before it is
+    identical for every category and the provider's prompt prefix cache can reuse it.
+    """
+    sections, current = [], []
+    for line in template.splitlines():
+        if _RULER.match(line):
+            sections.append(current)
+            current = []
+        current.append(line)
+    sections.append(current)
+    dynamic = [sec for sec in sections if any("{target}" in line for line in sec)]
+    static = [sec for sec in sections if sec not in dynamic]
+    return "\n".join(line for sec in static + dynamic for line in sec)
+
+
+COMPACT_SYSTEM_PROMPT_TEMPLATE = compact_text(_static_first(SYSTEM_PROMPT_TEMPLATE)).replace(
+    "TARGET:\n{target}", "TARGET: {target}")
+COMPACT_USER_PROMPT_TEMPLATE = compact_text(
+    _SCHEMA_BLOCK.sub("Return JSON in the exact schema given in the instructions.", USER_PROMPT_TEMPLATE))
+
+
+def render_system_prompt(target, target_explanation, compact=COMPACT_DEFAULT):
+    """
+    Builds the full system prompt for a target. In compact form the explanation loses
+    the sections and lines that repeat the system prompt.
+    """
+    if not compact:
+        return CompiledTemplate(SYSTEM_PROMPT_TEMPLATE, target=target, target_explanation=target_explanation).render()
+    static = COMPACT_SYSTEM_PROMPT_TEMPLATE.split("{target}")[0] + target
+    explanation = dedupe_lines(compact_text(drop_sections(target_explanation)), static)
+    return CompiledTemplate(COMPACT_SYSTEM_PROMPT_TEMPLATE, target=target,
+                            target_explanation=compact_text(explanation)).render()
+
+
+_encoders = {}
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]| {2,}|\n")
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Returns (token_count, method). Uses tiktoken when it and its encoding files are
+    available; otherwise an offline estimate (words, punctuation, space runs, newlines).
+    """
+    encoder = _encoders.get(model)
+    if encoder is None:
+        try:
+            import tiktoken
+            encoder = tiktoken.encoding_for_model(model)
+        except Exception:
+            encoder = False
+        _encoders[model] = encoder
+    if encoder:
+        return len(encoder.encode(text)), "tiktoken"
+    return len(_TOKEN_PATTERN.findall(text)), "estimate"
+
+
+def compaction_report(metrics_by_category, user_fields):
+    """
+    Input tokens per category before and after compaction, plus the length of the
+    system prompt prefix shared by all categories (what a prefix cache can reuse).
+    metrics_by_category maps category -> metrics; user_fields turns metrics into
+    the user template values (llm.user_prompt_fields).
+    """
+    registries = {False: PromptRegistry(check_interval=None, compact=False),
+                  True: PromptRegistry(check_interval=None, compact=True)}
+    report = {"categories": {}}
+    for compact, registry in registries.items():
+        systems = []
+        for category, metrics in metrics_by_category.items():
+            system, user = registry.compiled(category)
+            user = user.render(**user_fields(metrics))
+            systems.append(system)
+            sys_tokens, method = count_tokens(system)
+            user_tokens, _ = count_tokens(user)
+            entry = report["categories"].setdefault(category, {})
+            entry["compact" if compact else "original"] = {
+                "system": sys_tokens, "user": user_tokens, "total": sys_tokens + user_tokens}
+            report["method"] = method
+        shared = os.path.commonprefix(systems)
+        report["shared_prefix_tokens_" + ("compact" if compact else "original")] = count_tokens(shared)[0]
+    for entry in report["categories"].values():
+        before, after = entry["original"]["total"], entry["compact"]["total"]
+        entry["saved_pct"] = round(100 * (before - after) / before, 1) if before else 0.0
+    return report
+
+
+class CompiledTemplate:
+    """
+    A str.format template parsed once into literal chunks and field names.
+    Fields given to the constructor are baked in; render() fills in the rest.
+    """
+
+    def __init__(self, template, **fixed):
+        self.parts = []
+        literal = ""
+        for text, field, spec, conversion in Formatter().parse(template):
+            literal += text
+            if field is None:
+                continue
+            if field in fixed:
+                literal += format(fixed[field], spec or "")
+                continue
+            self.parts.append((literal, field, spec or ""))
+            literal = ""
+        self.tail = literal
+        self.fields = tuple(field for _, field, _ in self.parts)
+        self.version = _hash(template, *(f"{k}={v}" for k, v in sorted(fixed.items())))
+
+    def render(self, **values):
+        out = []
+        for literal, field, spec in self.parts:
+            out.append(literal)
+            out.append(format(values[field], spec) if spec else str(values[field]))
+        out.append(self.tail)
+        return "".join(out)
+
+
+class PromptRegistry:
+    """
+    Loads every file in prompts/ once and keeps the compiled system and user templates
+    per category in memory. File mtimes are checked at most every check_interval seconds,
+    and only changed files are reloaded, so normal requests do no file I/O.
+    """
+
+    def __init__(self, prompts_dir=PROMPTS_DIR, check_interval=2.0, compact=COMPACT_DEFAULT):
+        self.prompts_dir = prompts_dir
+        self.check_interval = check_interval
+        self.compact = compact
+        self._files = {}
+        self._compiled = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self, force=False):
+        """
+        Re-reads prompt files whose mtime changed (or all of them with force=True).
+        Returns the names of the files that were reloaded.
+        """
+        changed = []
+        with self._lock:
+            try:
+                names = sorted(n for n in os.listdir(self.prompts_dir) if n.endswith(".md"))
+            except OSError as e:
+                print(f"Error listing prompts directory {self.prompts_dir}: {e}")
+                names = []
+
+            for name in names:
+                path = os.path.join(self.prompts_dir, name)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    if not force and name in self._files and self._files[name]["mtime"] == mtime:
+                        continue
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except OSError as e:
+                    print(f"Error loading prompt {name}: {e}")
+                    continue
+                self._files[name] = {"text": text, "mtime": mtime, "version": _hash(text)}
+                changed.append(name)
+
+            for name in set(self._files) - set(names):
+                del self._files[name]
+                changed.append(name)
+
+            if changed:
+                self._compiled.clear()
+            self._last_check = time.monotonic()
+        return changed
+
+    def _maybe_reload(self):
+        if self.check_interval is not None and time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+
+    def text(self, name):
+        """
+        Returns the raw contents of prompts/<name>, or "" if there is no such file.
+        """
+        self._maybe_reload()
+        entry = self._files.get(name)
+        return entry["text"] if entry else ""
+
+    def version(self, name):
+        self._maybe_reload()
+        entry = self._files.get(name)
+        return entry["version"] if entry else "missing"
+
+    def prompt_file(self, category):
+        return CATEGORY_PROMPT_FILES.get(category, DEFAULT_PROMPT_FILE)
+
+    def _entry(self, category):
+        self._maybe_reload()
+        entry = self._compiled.get(category)
+        if entry is None:
+            system = render_system_prompt(category, self.text(self.prompt_file(category)), self.compact)
+            user_template = COMPACT_USER_PROMPT_TEMPLATE if self.compact else USER_PROMPT_TEMPLATE
+            user = CompiledTemplate(user_template, category=category)
+            entry = (system, user, _hash(system))
+            self._compiled[category] = entry
+        return entry
+
+    def compiled(self, category):
+        """
+        Returns (system_prompt, user_template) for a category. The system prompt is a
+        ready string; user_template is a CompiledTemplate to render with the metrics.
+        """
+        system, user, _ = self._entry(category)
+        return system, user
+
+    def versions(self, category):
+        """
+        Version hashes of the templates used for a category, for cache keys.
+        """
+        _, user, system_version = self._entry(category)
+        prompt_file = self.prompt_file(category)
+        return {
+            prompt_file: self.version(prompt_file),
+            "system": system_version,
+            "user": user.version,
+        }
+
+    def portfolio(self, category):
+        """
+        Returns (system_prompt, portfolio_template, block_template) for multi-campaign
+        audits; blocks are rendered per campaign and joined into the portfolio template.
+        """
+        system, _, _ = self._entry(category)
+        entry = self._compiled.get(("portfolio", category))
+        if entry is None:
+            clean = compact_text if self.compact else (lambda text: text)
+            entry = (CompiledTemplate(clean(PORTFOLIO_USER_PROMPT_TEMPLATE), category=category),
+                     CompiledTemplate(clean(CAMPAIGN_BLOCK_TEMPLATE)))
+            self._compiled[("portfolio", category)] = entry
+        return (system,) + entry
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the shared registry, loading the prompt files on first use.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
@@ -0,0 +1,183 @@
+"""
+Structured output for audit reports: the report schema, the response_format that asks
+the API for it, and a tolerant parser.
+
+parse_report() strips markdown fences and surrounding prose, and when the JSON is
+broken or cut off it keeps every field that arrived complete. The caller then only has
+to re-ask for the fields listed in `missing` (see llm.complete_report) instead of
+regenerating the whole report.
+"""
+import json
+import os
+import re
+
+from src.startup import load_env
+from src.stream_parser import ReportStreamParser
+
+# Report keys in the order the prompts define them.
+REPORT_FIELDS = ["headline", "analysis", "core_issue", "why_it_matters", "recommended_action",
+                 "expected_outcome", "detected_issues", "confidence_score"]
+
+TEXT_FIELDS = REPORT_FIELDS[:6]
+
+
+def report_schema(fields=REPORT_FIELDS):
+    """
+    Strict JSON schema for a report (or for a subset of its fields).
+    """
+    properties = {field: {"type": "string"} for field in fields if field in TEXT_FIELDS}
+    if "detected_issues" in fields:
+        properties["detected_issues"] = {"type": "array", "items": {"type": "string"}}
+    if "confidence_score" in fields:
+        properties["confidence_score"] = {"type": "integer"}
+    ordered = {field: properties[field] for field in fields}
+    return {"type": "object", "properties": ordered, "required": list(fields), "additionalProperties": False}
+
+
+def portfolio_schema():
+    entry = report_schema()
+    entry = dict(entry, properties={"campaign_name": {"type": "string"}, **entry["properties"]},
+                 required=["campaign_name"] + entry["required"])
+    return {"type": "object", "properties": {"reports": {"type": "array", "items": entry}},
+            "required": ["reports"], "additionalProperties": False}
+
+
+# LLM_JSON_MODE: 'schema' (strict structured output, default), 'json' (JSON mode) or 'off'.
+load_env()
+JSON_MODE = os.getenv("LLM_JSON_MODE", "schema").lower()
+
+
+def response_format(schema=None, name="audit_report"):
+    """
+    The response_format argument for chat.completions.create, or None when JSON_MODE is 'off'.
+    """
+    if JSON_MODE == "off":
+        return None
+    if JSON_MODE == "json":
+        return {"type": "json_object"}
+    return {"type": "json_schema",
+            "json_schema": {"name": name, "strict": True, "schema": schema or report_schema()}}
+
+
+def format_kwargs(schema=None, name="audit_report"):
+    """
+    Keyword arguments to splat into chat.completions.create.
+    """
+    fmt = response_format(schema, name)
+    return {"response_format": fmt} if fmt else {}
+
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```\s*$")
+_DECODER = json.JSONDecoder()
+
+
+def strip_fences(content):
+    """
+    Removes markdown code fences, any prose before the first '{' and, when the JSON
+    object parses, any prose after it.
+    """
+    text = _FENCE.sub("", (content or "").strip())
+    start = text.find("{")
+    if start < 0:
+        return ""
+    try:
+        _, end = _DECODER.raw_decode(text, start)
+    except ValueError:
+        # Broken or cut off: a '}' inside a string is not the end of the object, so
+        # everything is kept for the stream parser to recover the complete fields.
+        return text[start:]
+    return text[start:end]
+
+
+def _clean(field, value):
+    """
+    Coerces a field to its schema type. Returns None when the value cannot be used.
+    """
+    if field == "confidence_score":
+        try:
+            return max(0, min(100, int(float(str(value).strip().rstrip("%")))))
+        except (TypeError, ValueError):
+            return None
+    if field == "detected_issues":
+        if isinstance(value, str):
+            value = [value] if value.strip() else []
+        if not isinstance(value, list):
+            return None
+        return [str(item) for item in value if str(item).strip()]
+    if isinstance(value, (dict, list)) or value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_report(data, fields=REPORT_FIELDS):
+    """
+    Returns (report, missing): the usable fields coerced to their types, and the
+    fields that are absent or invalid.
+    """
+    report = {}
+    for field in fields:
+        if isinstance(data, dict) and field in data:
+            value = _clean(field, data[field])
+            if value is not None:
+                report[field] = value
+    return report, [field for field in fields if field not in report]
+
+
+class ParsedReport:
+    """
+    Result of parse_report: the usable fields, the ones still missing, and whether the
+    raw text had to be repaired.
+    """
+
+    def __init__(self, report, missing, repaired):
+        self.report = report
+        self.missing = missing
+        self.repaired = repaired
+
+    @property
+    def complete(self):
+        return not self.missing
+
+    def to_json(self):
+        return json.dumps(self.report)
+
+
+def parse_report(content, fields=REPORT_FIELDS):
+    """
+    Parses model output into a report. Fences and surrounding prose are dropped; if the
+    JSON is still invalid (typically cut off at max tokens) the fields that arrived
+    complete are kept and the rest are reported as missing.
+    """
+    text = strip_fences(content)
+    try:
+        data = json.loads(text)
+        repaired = text != (content or "").strip()
+    except ValueError:
+        parser = ReportStreamParser()
+        parser.feed(text)
+        data = parser.fields
+        repaired = True
+    report, missing = validate_report(data, fields)
+    return ParsedReport(report, missing, repaired)
+
+
+def reask_message(partial, missing):
+    """
+    Follow-up user message asking only for the missing fields of a partial report.
+    """
+    return (
+        "Your previous answer was cut off or invalid. These fields are already done:\n"
+        f"{json.dumps(partial, ensure_ascii=False)}\n"
+        f"Return JSON with only these fields, consistent with the ones above: {', '.join(missing)}."
+    )
+
+
+def merge_reports(partial, extra, fields=REPORT_FIELDS):
+    """
+    Adds the fields of `extra` that `partial` lacks, keeping the schema's key order.
+    """
+    merged = dict(partial)
+    for field, value in extra.items():
+        merged.setdefault(field, value)
+    return {field: merged[field] for field in fields if field in merged}
@@ -0,0 +1,394 @@
+"""
+Model routing: which model answers each category, and what happens when it is slow or down.
+
+Every category has a route, an ordered list of models: cheap and fast first, then the
+fallbacks. LLM_ROUTE sets the route of every category and LLM_ROUTE_<CATEGORY> (e.g.
+LLM_ROUTE_REVENUE_GROWTH) overrides one; either is a comma-separated list of models or
+the name of a tier ("fast", "quality", or any LLM_TIER_<NAME>=model,model).
+
+A call goes to the first model of the route. If it fails, the next model is tried at
+once (fallback). With LLM_HEDGE=true, if it has not answered after that model's observed
+p95 latency (at most LLM_HEDGE_AFTER_SECONDS), a second request is started on the next
+model, or a duplicate on the same one at the end of the route (hedging), and whichever
+answers first wins. Nothing waits past LLM_DEADLINE_SECONDS, so a degraded endpoint
+costs a bounded delay, not the tail.
+
+Hedging is off by default because every hedge is another billed request, and the
+loser is usually answered in full as well. Token usage of losing completions is
+recorded like the winner's (telemetry.record_usage); a losing stream is closed at its
+first chunk, and its usage is never reported by the API.
+
+Latency and errors are tracked per model (ModelStats). A model whose recent error rate
+is above LLM_MAX_ERROR_RATE, whose p95 is above LLM_MAX_P95_SECONDS or whose circuit
+breaker is open is moved to the back of its routes until its bad calls age out.
+
+Streams race on the first content chunk; the winner streams the rest and the other
+attempts are closed. Try it against the mock server with:
+    python -m benchmarks.bench_router
+"""
+import contextvars
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain
+
+from src import telemetry
+from src.client import CircuitOpenError, get_manager
+from src.startup import load_env
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TIERS = {
+    "fast": [DEFAULT_MODEL],
+    "quality": ["gpt-4o", DEFAULT_MODEL],
+}
+
+# Health is judged on the calls of the last STATS_WINDOW_SECONDS, so a demoted model is
+# tried first again once its bad period has aged out.
+STATS_WINDOW_SECONDS = 300
+STATS_MAX_SAMPLES = 200
+# With fewer calls than this, the p95 / error rate is not trusted yet.
+MIN_LATENCY_SAMPLES = 20
+MIN_ERROR_SAMPLES = 5
+
+
+class RouteError(Exception):
+    """
+    Raised when every attempt of a routed call failed, or none answered before the deadline.
+    """
+
+
+class ModelStats:
+    """
+    Recent calls of one model for one kind of call ('complete', or 'stream' where the
+    latency is the time to the first content chunk).
+    """
+
+    def __init__(self, max_samples=STATS_MAX_SAMPLES, window_seconds=STATS_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._samples = deque(maxlen=max_samples)  # (monotonic time, seconds, or None for an error)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok=True):
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds if ok else None))
+
+    def summary(self):
+        """
+        {'calls', 'error_rate', 'p95'} over the window. error_rate and p95 are None
+        until there are enough calls to go by.
+        """
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            recent = [seconds for at, seconds in self._samples if at >= cutoff]
+        latencies = sorted(seconds for seconds in recent if seconds is not None)
+        p95 = latencies[math.ceil(0.95 * len(latencies)) - 1] if len(latencies) >= MIN_LATENCY_SAMPLES else None
+        errors = len(recent) - len(latencies)
+        error_rate = errors / len(recent) if len(recent) >= MIN_ERROR_SAMPLES else None
+        return {"calls": len(recent), "error_rate": error_rate, "p95": p95}
+
+
+class RoutedStream:
+    """
+    The winning stream of Router.stream(): the events read while racing, then the rest.
+    `model` is the model that answered. Close it when done.
+    """
+
+    def __init__(self, model, stream, head):
+        self.model = model
+        self.stream = stream
+        self.head = head
+
+    def __iter__(self):
+        return chain(self.head, self.stream)
+
+    def close(self):
+        self.stream.close()
+
+
+def _read_to_first_content(stream):
+    """
+    Reads events until the first one with content; returns (stream, events read).
+    """
+    head = []
+    try:
+        for event in stream:
+            head.append(event)
+            if event.choices and event.choices[0].delta.content:
+                break
+    except Exception:
+        stream.close()
+        raise
+    return stream, head
+
+
+def _close_stream(model, result):
+    stream, _ = result
+    stream.close()
+
+
+def _record_usage(model, response):
+    telemetry.record_usage(model, getattr(response, "usage", None))
+
+
+def _discarder(discard, model, context):
+    """
+    Done-callback for an attempt that lost the race: passes its result, if it
+    succeeded, to discard(model, result) in context (the caller's, so usage still
+    lands in its audit).
+    """
+    def callback(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        telemetry.increment(f"llm_route_discarded_total:{model}")
+        context.run(discard, model, future.result())
+    return callback
+
+
+def _slug(category):
+    return re.sub(r"\W+", "_", category).strip("_").upper()
+
+
+def _parse_route(value, tiers):
+    value = value.strip()
+    if value.lower() in tiers:
+        return list(tiers[value.lower()])
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+class Router:
+    """
+    Sends each category's calls down its route (see the module docstring). routes maps
+    category -> list of models; other categories use default_route. hedge_after caps the
+    hedging delay in seconds, and is the delay while a model has too few calls for a p95
+    (None: no cap, and no hedging until there is a p95).
+    """
+
+    def __init__(self, routes=None, default_route=(DEFAULT_MODEL,), hedge=False, hedge_after=None,
+                 deadline=60.0, max_attempts=3, max_error_rate=0.5, max_p95=None, workers=32, manager=None):
+        self.routes = {_slug(category): list(models) for category, models in (routes or {}).items()}
+        self.default_route = list(default_route)
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.max_error_rate = max_error_rate
+        self.max_p95 = max_p95
+        self.workers = workers
+        self.manager = manager
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        load_env()
+        tiers = dict(DEFAULT_TIERS)
+        routes = {}
+        for name, value in os.environ.items():
+            if name.startswith("LLM_TIER_") and value.strip():
+                tiers[name[len("LLM_TIER_"):].lower()] = [model.strip() for model in value.split(",") if model.strip()]
+        for name, value in os.environ.items():
+            if name.startswith("LLM_ROUTE_") and value.strip():
+                routes[name[len("LLM_ROUTE_"):]] = _parse_route(value, tiers)
+        hedge_after = os.getenv("LLM_HEDGE_AFTER_SECONDS")
+        max_p95 = os.getenv("LLM_MAX_P95_SECONDS")
+        return cls(
+            routes=routes,
+            default_route=_parse_route(os.getenv("LLM_ROUTE", "fast"), tiers) or [DEFAULT_MODEL],
+            hedge=os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes"),
+            hedge_after=float(hedge_after) if hedge_after else None,
+            deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "60")),
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            max_error_rate=float(os.getenv("LLM_MAX_ERROR_RATE", "0.5")),
+            max_p95=float(max_p95) if max_p95 else None,
+            workers=int(os.getenv("LLM_ROUTER_WORKERS", "32")),
+        )
+
+    def _manager(self):
+        return self.manager or get_manager()
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="llm-route")
+        return self._pool
+
+    def route(self, category):
+        """
+        The configured models for category, in order.
+        """
+        return list(self.routes.get(_slug(category or "")) or self.default_route)
+
+    def route_key(self, category):
+        """
+        The route as one string, for cache keys: a report is cached for the route that
+        was asked, whichever of its models wrote it.
+        """
+        return ",".join(self.route(category))
+
+    def stats(self, model, kind="complete"):
+        with self._stats_lock:
+            stats = self._stats.get((model, kind))
+            if stats is None:
+                stats = self._stats[(model, kind)] = ModelStats()
+        return stats
+
+    def healthy(self, model, kind="complete"):
+        if self._manager().breaker_for(model).state == "open":
+            return False
+        summary = self.stats(model, kind).summary()
+        if summary["error_rate"] is not None and summary["error_rate"] > self.max_error_rate:
+            return False
+        if self.max_p95 is not None and summary["p95"] is not None and summary["p95"] > self.max_p95:
+            return False
+        return True
+
+    def plan(self, category, kind="complete"):
+        """
+        The route with the models that look degraded moved to the back.
+        """
+        route = self.route(category)
+        healthy = [model for model in route if self.healthy(model, kind)]
+        return healthy + [model for model in route if model not in healthy]
+
+    def hedge_delay(self, model, kind="complete"):
+        if not self.hedge:
+            return None
+        p95 = self.stats(model, kind).summary()["p95"]
+        if p95 is None:
+            return self.hedge_after
+        # With more than 5% of calls slow, the p95 is the tail itself: the cap still hedges.
+        return min(p95, self.hedge_after) if self.hedge_after is not None else p95
+
+    def snapshot(self):
+        """
+        {'model/kind': stats summary} of every model used so far, for debugging.
+        """
+        with self._stats_lock:
+            keys = list(self._stats)
+        return {f"{model}/{kind}": self.stats(model, kind).summary() for model, kind in keys}
+
+    def complete(self, category, **kwargs):
+        """
+        A chat completion for category, routed. Returns (model, response).
+        """
+        manager = self._manager()
+
+        def call(model, timeout):
+            return manager.chat_completion(model=model, read_timeout=timeout, **kwargs)
+
+        # Losing attempts are billed too.
+        return self._race(self.plan(category, "complete"), call, "complete", discard=_record_usage)
+
+    def stream(self, category, **kwargs):
+        """
+        A streaming chat completion for category, routed; attempts race to their first
+        content chunk. Returns a RoutedStream.
+        """
+        manager = self._manager()
+
+        def call(model, timeout):
+            # The deadline only bounds the race: once streaming, the client's read timeout applies.
+            return _read_to_first_content(manager.chat_completion(model=model, stream=True, **kwargs))
+
+        model, (stream, head) = self._race(self.plan(category, "stream"), call, "stream", discard=_close_stream)
+        return RoutedStream(model, stream, head)
+
+    def _attempt(self, model, call, kind, timeout):
+        started = time.perf_counter()
+        try:
+            result = call(model, timeout)
+        except CircuitOpenError:
+            raise  # never reached the API; the breaker already marks the model down
+        except Exception:
+            self.stats(model, kind).record(time.perf_counter() - started, ok=False)
+            telemetry.increment(f"llm_model_errors_total:{model}")
+            raise
+        seconds = time.perf_counter() - started
+        self.stats(model, kind).record(seconds)
+        telemetry.observe(f"model_seconds:{model}", seconds)
+        return result
+
+    def _race(self, models, call, kind, discard=None):
+        """
+        Runs call(model, timeout) down models with fallback and hedging and returns
+        (model, result) of the first success. discard(model, result) gets the results
+        of attempts that succeed after that, in the caller's context.
+        """
+        deadline = time.monotonic() + self.deadline
+        queue = list(models)
+        launched = {}  # future -> model
+        pending = {}  # future -> model, until it finishes
+        errors = []
+        hedge_at = current = None
+
+        def launch(model, reason):
+            nonlocal hedge_at, current
+            if reason:
+                telemetry.increment(f"llm_route_{reason}_total:{model}")
+            # Run in a copy of this context, so telemetry lands in the caller's audit.
+            context = contextvars.copy_context()
+            future = self._executor().submit(context.run, self._attempt, model, call, kind,
+                                             max(deadline - time.monotonic(), 0.001))
+            launched[future] = pending[future] = current = model
+            delay = self.hedge_delay(model, kind)
+            hedge_at = time.monotonic() + delay if delay is not None else None
+
+        launch(queue.pop(0), None)
+        winner = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                timeout = deadline - now
+                if hedge_at is not None and len(launched) < self.max_attempts:
+                    timeout = max(0.0, min(timeout, hedge_at - now))
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    model = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{model}: {e}")
+                        continue
+                    winner = future
+                    return model, result
+                if done:
+                    # Every finished attempt failed: the next model, if any, right away.
+                    if queue and len(launched) < self.max_attempts:
+                        launch(queue.pop(0), "fallback")
+                elif len(launched) < self.max_attempts and hedge_at is not None and time.monotonic() >= hedge_at:
+                    # Still waiting after the model's p95: hedge on the next model, or the same one.
+                    launch(queue.pop(0) if queue else current, "hedge")
+            if pending:
+                telemetry.increment("llm_route_deadline_total")
+                raise RouteError(f"No model answered within {self.deadline:.0f}s" +
+                                 (f" ({'; '.join(errors)})" if errors else ""))
+            raise RouteError("; ".join(errors) or "No model to route to")
+        finally:
+            for future, model in launched.items():
+                if future is not winner and discard is not None:
+                    future.add_done_callback(_discarder(discard, model, contextvars.copy_context()))
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Returns the process-wide Router, configured from the environment.
+    """
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router.from_env()
+    return _router
@@ -0,0 +1,245 @@
+"""
+Deterministic pre-audit: applies the interpretation rules from the prompt files to the
+metrics and answers clear-cut cases locally, in the same JSON schema the LLM returns.
+Ambiguous cases are left for generate_response.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.report import REPORT_FIELDS
+
+STRONG, NORMAL, WEAK = "STRONG", "NORMAL", "WEAK"
+
+# (weak threshold, strong threshold, higher_is_better). Rates are in percent.
+# cpa_ratio is cost per customer divided by revenue per sale: above 1 every customer costs
+# more than they bring in.
+THRESHOLDS = {
+    "ctr": (1.0, 2.0, True),
+    "conversion_rate": (2.0, 5.0, True),
+    "roas": (2.0, 4.0, True),
+    "cpa_ratio": (0.75, 0.33, False),
+    "customer_satisfaction_score": (3.5, 4.3, True),
+    "churn_rate": (0.10, 0.05, False),
+}
+
+METRIC_LABELS = {
+    "ctr": "Click-through rate",
+    "conversion_rate": "Conversion rate",
+    "roas": "Return on ad spend",
+    "cpa_ratio": "Cost per customer",
+    "customer_satisfaction_score": "Customer satisfaction",
+    "churn_rate": "Churn rate",
+}
+
+# Metrics that decide the verdict for each category.
+PRIMARY_METRICS = {
+    "Customer Acquisition": ["cpa_ratio", "conversion_rate", "ctr"],
+    "Customer Satisfaction": ["customer_satisfaction_score", "ctr"],
+    "Revenue Growth": ["roas", "conversion_rate"],
+    "Customer Retention": ["churn_rate", "roas"],
+}
+
+# Below this ROAS the campaign loses money on every dollar spent.
+BREAK_EVEN_ROAS = 1.0
+
+
+def metric_values(totals):
+    """
+    Numeric inputs for the rules from a compute_totals() DataFrame, as a dict of
+    arrays with one entry per group.
+    """
+    aov = np.divide(totals["revenue"].to_numpy(float), totals["conversions"].to_numpy(float),
+                    out=np.full(len(totals), np.nan), where=totals["conversions"].to_numpy() > 0)
+    cpa = np.where(totals["new_customers"].to_numpy() > 0, totals["cpa"].to_numpy(float), np.nan)
+    return {
+        "ctr": np.where(totals["impressions"].to_numpy() > 0, totals["ctr"].to_numpy(float), np.nan),
+        "conversion_rate": np.where(totals["clicks"].to_numpy() > 0, totals["conversion_rate"].to_numpy(float), np.nan),
+        "roas": np.where(totals["spend"].to_numpy() > 0, totals["roas"].to_numpy(float), np.nan),
+        "cpa_ratio": np.divide(cpa, aov, out=np.full(len(totals), np.nan), where=aov > 0),
+        "customer_satisfaction_score": totals["customer_satisfaction_score"].to_numpy(float),
+        "churn_rate": totals["churn_rate"].to_numpy(float),
+    }
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except ValueError:
+        return np.nan
+
+
+def values_from_metrics(metrics):
+    """
+    Same inputs as metric_values() but read from a single metrics dictionary
+    (as returned by get_metrics_for_category), as plain floats.
+    """
+    conversions = _number(metrics.get("Total Conversions", 0))
+    new_customers = _number(metrics.get("Total New Customers", 0))
+    revenue = _number(metrics.get("Total Revenue", 0))
+    aov = revenue / conversions if conversions > 0 else np.nan
+    cpa = _number(metrics.get("CPA", np.nan)) if new_customers > 0 else np.nan
+    return {
+        "ctr": _number(metrics.get("CTR")) if _number(metrics.get("Total Impressions", 0)) > 0 else np.nan,
+        "conversion_rate": _number(metrics.get("Conversion Rate")) if _number(metrics.get("Total Clicks", 0)) > 0 else np.nan,
+        "roas": _number(metrics.get("ROAS")) if _number(metrics.get("Total Spend", 0)) > 0 else np.nan,
+        "cpa_ratio": cpa / aov if aov and aov > 0 else np.nan,
+        "customer_satisfaction_score": _number(metrics.get("Average CSAT Score", np.nan)),
+        "churn_rate": _number(metrics.get("Average Churn Rate", np.nan)),
+    }
+
+
+def label_values(values):
+    """
+    Labels every metric STRONG / NORMAL / WEAK, vectorized over all rows.
+    Missing metrics get None.
+    """
+    labels = {}
+    for metric, (weak, strong, higher_is_better) in THRESHOLDS.items():
+        v = np.atleast_1d(np.asarray(values[metric], dtype=float))
+        if higher_is_better:
+            conditions = [np.isnan(v), v < weak, v >= strong]
+        else:
+            conditions = [np.isnan(v), v > weak, v <= strong]
+        labels[metric] = np.select(conditions, [None, WEAK, STRONG], default=NORMAL)
+    return labels
+
+
+def verdicts(category, values, labels):
+    """
+    Vectorized verdicts for a category: 'Continue', 'Fix', 'Cut', or None when the case is
+    not clear-cut and should go to the LLM.
+    """
+    n_rows = len(labels["roas"])
+    primary = PRIMARY_METRICS.get(category)
+    if not primary:
+        return np.full(n_rows, None, dtype=object)
+
+    prim = np.column_stack([labels[m] for m in primary])
+    known = np.all(prim != None, axis=1)  # noqa: E711 - elementwise comparison
+    all_strong = np.all(prim == STRONG, axis=1)
+    all_weak = np.all(prim == WEAK, axis=1)
+    any_weak_anywhere = np.any(np.column_stack(list(labels.values())) == WEAK, axis=1)
+    roas = np.atleast_1d(np.asarray(values["roas"], dtype=float))
+    losing_money = roas < BREAK_EVEN_ROAS
+
+    return np.select(
+        [~known, all_weak & losing_money, all_weak, all_strong & ~any_weak_anywhere],
+        [None, "Cut", "Fix", "Continue"],
+        default=None,
+    ).astype(object)
+
+
+def _fmt(metric, value):
+    if metric in ("ctr", "conversion_rate"):
+        return f"{value:.2f}%"
+    if metric == "churn_rate":
+        return f"{value * 100:.1f}%"
+    if metric == "cpa_ratio":
+        return f"{value:.2f}x revenue per sale"
+    return f"{value:.2f}"
+
+
+ROOT_CAUSES = {
+    "Customer Acquisition": ("Audience and message fit",
+                             "people click but few of them buy, so each customer costs too much"),
+    "Customer Satisfaction": ("Message and post-click experience",
+                              "the ads and the experience after the click are not matching what customers expect"),
+    "Revenue Growth": ("Budget allocation",
+                       "spend is not turning into enough revenue to justify it"),
+    "Customer Retention": ("Offer and customer experience",
+                           "customers are leaving faster than the business can replace them profitably"),
+}
+
+
+def build_report(category, verdict, values_row, labels_row):
+    """
+    Builds the report dictionary (same schema as the LLM's) for a decided case.
+    """
+    primary = PRIMARY_METRICS[category]
+    weak = [m for m in THRESHOLDS if labels_row[m] == WEAK]
+    strong = [m for m in THRESHOLDS if labels_row[m] == STRONG]
+    labelled = [f"{METRIC_LABELS[m]}: {_fmt(m, values_row[m])} ({labels_row[m]})"
+                for m in THRESHOLDS if labels_row[m] is not None]
+    root_cause, explanation = ROOT_CAUSES[category]
+
+    if verdict == "Continue":
+        report = {
+            "headline": f"{category}: healthy across the board - keep going and scale carefully",
+            "core_issue": "Limited scale, not efficiency",
+            "why_it_matters": "Every key signal is above benchmark, so the money spent is working. "
+                              "The risk is leaving growth on the table by not scaling what works.",
+            "recommended_action": "Increase budget gradually (10-20% at a time) on the best-performing segments "
+                                  "and watch the cost per customer as you scale.",
+            "expected_outcome": "More customers and revenue at a similar efficiency.",
+            "detected_issues": [f"{METRIC_LABELS[m]} is {NORMAL.lower()} - room to improve"
+                                for m in THRESHOLDS if labels_row[m] == NORMAL],
+            "confidence_score": 85,
+        }
+    else:
+        losing = verdict == "Cut"
+        report = {
+            "headline": (f"{category}: this campaign is losing money - stop it"
+                         if losing else f"{category}: key signals are weak - fix before spending more"),
+            "core_issue": f"{root_cause}: {explanation}",
+            "why_it_matters": ("Each dollar spent brings back less than a dollar in revenue, so more spend means bigger losses."
+                               if losing else
+                               "Money is going out faster than results are coming in; scaling now would multiply the waste."),
+            "recommended_action": ("Pause the campaign and move the budget to proven campaigns, then relaunch "
+                                   "with a new audience and offer as a small test."
+                                   if losing else
+                                   f"Fix the {root_cause.lower()} first: tighten the audience, refresh the message "
+                                   "and offer, and check the landing page before adding budget."),
+            "expected_outcome": ("Losses stop immediately and budget goes to campaigns that pay back."
+                                 if losing else
+                                 "Better conversion and lower cost per customer within a few weeks."),
+            "detected_issues": [f"{METRIC_LABELS[m]} is weak ({_fmt(m, values_row[m])})" for m in weak],
+            "confidence_score": 90 if losing else 80,
+        }
+
+    report["analysis"] = (
+        f"Rule-based pre-audit for {category}. "
+        f"Strong: {', '.join(METRIC_LABELS[m] for m in strong) or 'none'}. "
+        f"Weak: {', '.join(METRIC_LABELS[m] for m in weak) or 'none'}. "
+        f"Decision metrics ({', '.join(METRIC_LABELS[m] for m in primary)}) all point the same way, "
+        f"so the verdict is {verdict}. Metrics: {'; '.join(labelled)}."
+    )
+    # Keep the key order of the schema in system_prompt.
+    return {key: report[key] for key in REPORT_FIELDS}
+
+
+def pre_audit(category, metrics):
+    """
+    Runs the rules on one metrics dictionary.
+    Returns {"verdict", "labels", "report"}; verdict and report are None when the case
+    is ambiguous and needs the LLM.
+    """
+    values = values_from_metrics(metrics)
+    labels = label_values(values)
+    verdict = verdicts(category, values, labels)[0]
+    labels_row = {metric: label[0] for metric, label in labels.items()}
+    report = build_report(category, verdict, values, labels_row) if verdict else None
+    return {"verdict": verdict, "labels": labels_row, "report": report}
+
+
+def pre_audit_totals(category, totals):
+    """
+    Vectorized pre-audit over every group of a compute_totals() DataFrame.
+    Returns a DataFrame with the labels and a 'verdict' column (None = escalate).
+    """
+    values = metric_values(totals)
+    labels = label_values(values)
+    out = pd.DataFrame(labels, index=totals.index)
+    out["verdict"] = verdicts(category, values, labels)
+    return out
+
+
+def fast_response(category, metrics):
+    """
+    JSON report string for a clear-cut case, or None if the LLM should decide.
+    """
+    result = pre_audit(category, metrics)
+    return json.dumps(result["report"]) if result["report"] else None
@@ -0,0 +1,155 @@
+"""
+Declared schema of the campaign data and a typed, validating CSV reader.
+
+Campaign and channel names repeat on every row, so they are loaded as categoricals;
+dates are parsed; counters fit in int32 and scores and rates in float32, which keeps
+the in-memory frame a fraction of what pd.read_csv infers (object strings and 64-bit
+numbers). Spend and revenue stay float64: float32 keeps only about 7 significant
+digits, which loses cents on amounts above roughly $100,000.
+Only the schema's columns are read, and load_data(category=...) narrows that further
+to the columns one category needs.
+"""
+import numpy as np
+import pandas as pd
+
+# Bump when the dtypes change: columnar stores written with another version are rebuilt.
+SCHEMA_VERSION = 2
+
+CAMPAIGN_SCHEMA = {
+    "campaign_name": "category",
+    "date": "datetime64",
+    "channel": "category",
+    "spend": "float64",
+    "revenue": "float64",
+    "conversions": "int32",
+    "impressions": "int32",
+    "clicks": "int32",
+    "new_customers": "int32",
+    "customer_satisfaction_score": "float32",
+    "retained_customers": "int32",
+    "churn_rate": "float32",
+}
+
+# Every category reports these (base metrics and the trend).
+REQUIRED_COLUMNS = ["campaign_name", "spend", "revenue", "conversions", "impressions", "clicks"]
+BASE_COLUMNS = REQUIRED_COLUMNS + ["date", "channel", "new_customers"]
+CATEGORY_COLUMNS = {
+    "Customer Acquisition": BASE_COLUMNS,
+    "Customer Satisfaction": BASE_COLUMNS + ["customer_satisfaction_score"],
+    "Revenue Growth": BASE_COLUMNS,
+    "Customer Retention": BASE_COLUMNS + ["retained_customers", "churn_rate"],
+}
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class SchemaError(ValueError):
+    """
+    Raised when the data cannot be loaded under the campaign schema (e.g. missing columns).
+    """
+
+
+def columns_for(category=None):
+    """
+    Schema columns needed for one category, or all of them.
+    """
+    return list(CATEGORY_COLUMNS.get(category, CAMPAIGN_SCHEMA))
+
+
+def _read_dtypes(columns):
+    """
+    dtypes for pd.read_csv. Dates are read as categories (few distinct values) and parsed
+    once per distinct value; counters as int64, because the parser wraps values that do
+    not fit an int32 instead of failing. apply_schema range-checks and downcasts them.
+    """
+    read_as = {"date": "category"}
+    return {column: read_as.get(column, "int64" if CAMPAIGN_SCHEMA[column] == "int32" else CAMPAIGN_SCHEMA[column])
+            for column in columns}
+
+
+def _parse_dates(values):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categories = pd.to_datetime(values.cat.categories.astype(str), errors="coerce")
+        return pd.Series(categories.take(values.cat.codes.to_numpy(), allow_fill=True),
+                         index=values.index, name=values.name)
+    return pd.to_datetime(values, errors="coerce")
+
+
+def apply_schema(df, source="data"):
+    """
+    Casts df to the campaign schema in place of pandas' inferred types and validates it.
+    Values that do not parse become missing, counters with missing or out-of-range
+    values stay float, and every problem is printed once per column. Raises SchemaError
+    when a required column is missing.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in df]
+    if missing:
+        raise SchemaError(f"{source} is missing required columns: {', '.join(missing)}")
+
+    for column, dtype in CAMPAIGN_SCHEMA.items():
+        if column not in df:
+            continue
+        values = df[column]
+        if dtype == "category":
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                df[column] = values.astype("category")
+            continue
+        if dtype.startswith("datetime"):
+            if not pd.api.types.is_datetime64_any_dtype(values):
+                parsed = _parse_dates(values)
+                bad = int(parsed.isna().sum() - values.isna().sum())
+                if bad:
+                    print(f"{source}: {bad} unparseable values in '{column}' treated as missing")
+                df[column] = parsed
+            continue
+        if values.dtype == dtype:
+            continue
+        numeric = pd.to_numeric(values, errors="coerce")
+        bad = int(numeric.isna().sum() - values.isna().sum())
+        if bad:
+            print(f"{source}: {bad} non-numeric values in '{column}' treated as missing")
+        if dtype == "int32":
+            if numeric.isna().any() or (numeric.dtype.kind == "f" and (numeric % 1 != 0).any()):
+                # Missing or fractional counts: keep them as they are, as floats.
+                df[column] = numeric.astype("float64")
+                continue
+            if (numeric.abs() > INT32_MAX).any():
+                print(f"{source}: values in '{column}' exceed int32, kept as int64")
+                df[column] = numeric.astype("int64")
+                continue
+        df[column] = numeric.astype(dtype)
+
+    counters = [column for column in ("spend", "conversions", "impressions", "clicks") if column in df]
+    negative = [column for column in counters if (df[column] < 0).any()]
+    if negative:
+        print(f"{source}: negative values in {', '.join(negative)}")
+    return df
+
+
+def read_campaign_csv(source, columns=None, name=None):
+    """
+    Reads a campaign CSV (path or file object) under the schema, keeping only `columns`
+    (default: every schema column). Columns outside the schema are skipped.
+    """
+    wanted = set(columns or CAMPAIGN_SCHEMA)
+    usecols = lambda column: column in wanted  # noqa: E731
+    name = name or (source if isinstance(source, str) else "data")
+    start = source.tell() if hasattr(source, "tell") else None
+    try:
+        # Fast path: the C parser converts straight to the compact types.
+        df = pd.read_csv(source, usecols=usecols, dtype=_read_dtypes(wanted))
+    except (ValueError, OverflowError):
+        # Missing counts, stray text or out-of-range values: read loosely and let
+        # apply_schema coerce and report them.
+        if start is not None:
+            source.seek(start)
+        df = pd.read_csv(source, usecols=usecols,
+                         dtype={column: "category" for column in wanted if CAMPAIGN_SCHEMA[column] == "category"})
+    return apply_schema(df, name)
+
+
+def memory_usage(df):
+    """
+    Bytes held by df, including the strings behind object columns.
+    """
+    return int(df.memory_usage(deep=True, index=True).sum())
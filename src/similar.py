@@ -0,0 +1,252 @@
+"""
+Near-duplicate reuse of audit reports.
+
+The exact-match cache (src/cache.py) misses whenever any metric moves, e.g. spend going
+from $5,000 to $5,010. This index keeps the metric vector of every stored report,
+grouped by category, campaign and prompt versions. It hands back a prior report when
+every numeric metric of a new audit is within `tolerance` (relative) of that report's
+metrics. Callers flag such answers as reused (see llm.generate_response_stream and
+batch.audit_one).
+
+Vectors are compared in log space, where a relative change is a fixed distance, so
+the test is one Chebyshev-distance scan over the group's small float32 matrix. The
+index is held in memory and capped at max_entries, evicting the least recently used.
+It is also written through to a table in the response cache's SQLite file, so a new
+process (e.g. tomorrow's batch run) starts warm.
+
+Settings come from the environment:
+    SIMILAR_CACHE_TOLERANCE     relative tolerance per metric (default 0.02; 0 turns reuse off)
+    SIMILAR_CACHE_MAX_ENTRIES   reports kept in the index (default 4096)
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src.cache import DEFAULT_CACHE_PATH, DEFAULT_TTL_SECONDS
+
+DEFAULT_TOLERANCE = 0.02
+DEFAULT_MAX_ENTRIES = 4096
+# Metrics that are not part of the vector (text, or already in the group key).
+SKIP_METRICS = ("Campaign Name", "Trend")
+# Stand-in for log(0): zero only ever matches zero.
+ZERO_LOG = -50.0
+
+
+def _numeric_items(metrics):
+    for name in sorted(metrics):
+        if name in SKIP_METRICS:
+            continue
+        value = metrics[name]
+        if isinstance(value, dict):
+            # e.g. 'Trend Changes': the trend's window-over-window ratios (trends.change_ratios).
+            for key in sorted(value):
+                yield f"{name}/{key}", value[key]
+        else:
+            yield name, value
+
+
+def metric_vector(metrics):
+    """
+    (names, log values) for the numeric metrics of an audit, including the entries of
+    nested dicts such as 'Trend Changes'. Percent strings such as '3.0%' count as
+    numbers; other text, like the trend summary, is left out.
+    """
+    names, values = [], []
+    for name, value in _numeric_items(metrics):
+        if isinstance(value, str):
+            try:
+                value = float(value.strip().rstrip("%").replace(",", ""))
+            except ValueError:
+                continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+            continue
+        names.append(name)
+        values.append(math.log(value) if value > 0 else ZERO_LOG)
+    return tuple(names), np.array(values, dtype=np.float32)
+
+
+def group_key(*parts):
+    """
+    Groups reports that may stand in for each other: same category, campaign, metric
+    names and prompts. Only vectors within one group are compared.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Match:
+    """
+    A reused report and how far its metrics were from the new audit's (max relative change).
+    """
+
+    def __init__(self, response, max_change):
+        self.response = response
+        self.max_change = max_change
+
+
+class _Group:
+    def __init__(self, dims):
+        self.ids = []
+        self.vectors = np.empty((0, dims), dtype=np.float32)
+
+    def add(self, entry_id, vector):
+        self.ids.append(entry_id)
+        self.vectors = np.vstack([self.vectors, vector])
+
+    def remove(self, entry_id):
+        index = self.ids.index(entry_id)
+        del self.ids[index]
+        self.vectors = np.delete(self.vectors, index, axis=0)
+
+
+class SimilarCache:
+    """
+    In-memory near-duplicate index with LRU eviction, written through to SQLite when
+    path is given.
+    """
+
+    def __init__(self, tolerance=DEFAULT_TOLERANCE, max_entries=DEFAULT_MAX_ENTRIES, path=None,
+                 ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.tolerance = tolerance
+        self.max_distance = math.log1p(tolerance)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._groups = {}
+        # entry id -> (group key, response, created_at), least recently used first
+        self._entries = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS similar_reports (
+                id INTEGER PRIMARY KEY,
+                grp TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM similar_reports WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT id, grp, vector, response, created_at FROM similar_reports ORDER BY id DESC LIMIT ?",
+            (self.max_entries,)).fetchall()
+        for entry_id, group, blob, response, created_at in reversed(rows):
+            self._insert(entry_id, group, np.frombuffer(blob, dtype=np.float32), response, created_at)
+            self._next_id = max(self._next_id, entry_id + 1)
+
+    def _insert(self, entry_id, group, vector, response, created_at):
+        bucket = self._groups.get(group)
+        if bucket is None:
+            bucket = self._groups[group] = _Group(len(vector))
+        bucket.add(entry_id, vector)
+        self._entries[entry_id] = (group, response, created_at)
+
+    def _remove(self, entry_id):
+        group, _, _ = self._entries.pop(entry_id)
+        bucket = self._groups[group]
+        bucket.remove(entry_id)
+        if not bucket.ids:
+            del self._groups[group]
+
+    def lookup(self, group, metrics):
+        """
+        Returns a Match for the closest stored report in group whose metrics are all
+        within tolerance, or None.
+        """
+        names, vector = metric_vector(metrics)
+        key = group_key(group, names)
+        now = time.time()
+        with self._lock:
+            bucket = self._groups.get(key)
+            if bucket is not None:
+                distances = np.abs(bucket.vectors - vector).max(axis=1, initial=0.0)
+                index = int(np.argmin(distances))
+                entry_id = bucket.ids[index]
+                _, response, created_at = self._entries[entry_id]
+                if distances[index] <= self.max_distance and not (self.ttl_seconds and now - created_at > self.ttl_seconds):
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return Match(response, math.expm1(float(distances[index])))
+            self.misses += 1
+            return None
+
+    def add(self, group, metrics, response):
+        names, vector = metric_vector(metrics)
+        key = group_key(group, names)
+        now = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._insert(entry_id, key, vector, response, now)
+            doomed = []
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                doomed.append((oldest,))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO similar_reports (id, grp, vector, response, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (entry_id, key, vector.tobytes(), response, now))
+                self._conn.executemany("DELETE FROM similar_reports WHERE id = ?", doomed)
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM similar_reports")
+                self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "groups": len(self._groups),
+        }
+
+
+_default_cache = None
+
+
+def get_similar_cache():
+    """
+    Returns the shared index, stored next to the response cache (LLM_CACHE_PATH). Returns
+    None when LLM_CACHE_DISABLED is set or SIMILAR_CACHE_TOLERANCE is 0.
+    """
+    global _default_cache
+    if os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes"):
+        return None
+    tolerance = float(os.getenv("SIMILAR_CACHE_TOLERANCE", DEFAULT_TOLERANCE))
+    if tolerance <= 0:
+        return None
+    if _default_cache is None:
+        _default_cache = SimilarCache(
+            tolerance=tolerance,
+            max_entries=int(os.getenv("SIMILAR_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        )
+    return _default_cache
@@ -0,0 +1,55 @@
+"""
+Startup helpers: load the environment once, and defer heavy imports until first use.
+
+The landing page of app.py only needs Streamlit. pandas, numpy, pyarrow and openai
+come in with src.data, src.llm and src.jobs, so app.py holds those as lazy_module()
+proxies and the import happens when an audit is first requested. Check with:
+    python -m benchmarks.bench_startup
+"""
+import importlib
+import threading
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def load_env():
+    """
+    Loads .env into os.environ the first time it is called; later calls do nothing.
+    Modules that read settings at import time call this first.
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access. Imports go
+    through importlib, so concurrent first uses from several sessions are safe.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
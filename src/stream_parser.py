@@ -0,0 +1,85 @@
+import json
+import time
+
+
+class ReportStreamParser:
+    """
+    Incremental parser for the JSON report the model streams back.
+
+    Feed it text chunks as they arrive; every call returns the top-level fields
+    (e.g. 'headline', 'analysis') that became complete with that chunk.
+    Anything before the first '{' (such as a markdown fence) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.started_at = time.perf_counter()
+        self.first_field_seconds = None
+        self.done = False
+
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        """
+        Adds a chunk of text and returns a list of (field, value) pairs completed by it.
+        """
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self.done:
+            ch = buf[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._value_start is None:
+                        self._key = json.loads(buf[self._key_start:self._pos + 1])
+                self._pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._key_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 1 and ch == "}":
+                    self._finish_value(self._pos, completed)
+                    self.done = True
+                self._depth -= 1
+            elif ch == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = self._pos + 1
+            elif ch == "," and self._depth == 1:
+                self._finish_value(self._pos, completed)
+            self._pos += 1
+
+        return completed
+
+    def _finish_value(self, end, completed):
+        if self._key is None or self._value_start is None:
+            return
+        raw = self.buffer[self._value_start:end].strip()
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            value = raw
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        if self.first_field_seconds is None:
+            self.first_field_seconds = time.perf_counter() - self.started_at
+        self._key = None
+        self._key_start = None
+        self._value_start = None
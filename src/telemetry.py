@@ -0,0 +1,301 @@
+"""
+Lightweight in-process instrumentation: per-stage timings, token accounting and cost per audit.
+
+Disabled by default; set TELEMETRY_ENABLED=1 (or call enable()) to record. When disabled,
+timed() hands back a shared no-op context manager, so instrumented code pays one flag check.
+Set TELEMETRY_PORT to also serve the Prometheus text format over HTTP.
+"""
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.startup import load_env
+
+# USD per 1M tokens: (input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Label name of labelled histograms, when not a stage (e.g. "model_seconds:gpt-4o").
+HISTOGRAM_LABELS = {"model_seconds": "model"}
+MAX_SAMPLES = 4096
+
+load_env()
+_enabled = os.getenv("TELEMETRY_ENABLED", "").lower() in ("1", "true", "yes")
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_recent_audits = deque(maxlen=50)
+_current_audit = contextvars.ContextVar("current_audit", default=None)
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _recent_audits.clear()
+
+
+class Histogram:
+    """
+    Keeps count and sum plus the last MAX_SAMPLES observations for quantiles.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self, qs=QUANTILES):
+        if not self.samples:
+            return {q: 0.0 for q in qs}
+        # Imported here so importing telemetry (e.g. from app.py) does not pull in numpy.
+        import numpy as np
+        values = np.quantile(np.fromiter(self.samples, dtype=float), qs)
+        return dict(zip(qs, values.tolist()))
+
+
+def observe(name, value):
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.observe(value)
+
+
+def increment(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _StageTimer:
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def record_stage(stage, seconds):
+    """
+    Records a stage duration measured elsewhere (e.g. across a streamed response).
+    """
+    if not _enabled:
+        return
+    observe(f"stage_seconds:{stage}", seconds)
+    audit = _current_audit.get()
+    if audit is not None:
+        audit["stages"][stage] = audit["stages"].get(stage, 0.0) + seconds
+
+
+def timed(stage):
+    """
+    Times a block as `stage`. Use as a context manager:
+        with telemetry.timed("llm_call"): ...
+    """
+    return _StageTimer(stage) if _enabled else _NOOP
+
+
+def instrument(stage):
+    """
+    Decorator version of timed().
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _StageTimer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cost_usd(model, prompt_tokens, completion_tokens):
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+def record_usage(model, usage):
+    """
+    Records token counts from a response's `usage` and the resulting cost.
+    """
+    if not _enabled or usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    cost = cost_usd(model, prompt_tokens, completion_tokens)
+    increment(f"prompt_tokens_total:{model}", prompt_tokens)
+    increment(f"completion_tokens_total:{model}", completion_tokens)
+    increment(f"cost_usd_total:{model}", cost)
+    audit = _current_audit.get()
+    if audit is not None:
+        audit["prompt_tokens"] += prompt_tokens
+        audit["completion_tokens"] += completion_tokens
+        audit["cost_usd"] += cost
+
+
+class AuditSpan:
+    """
+    Groups the stages and token usage of one audit. On exit records the audit's
+    total latency and cost.
+    """
+
+    def __init__(self, category):
+        self.category = category
+        self.record = None
+        self._token = None
+
+    def __enter__(self):
+        if not _enabled:
+            return self
+        self.record = {"category": self.category, "stages": {}, "prompt_tokens": 0,
+                       "completion_tokens": 0, "cost_usd": 0.0, "started": time.time()}
+        self._token = _current_audit.set(self.record)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.record is None:
+            return False
+        _current_audit.reset(self._token)
+        self.record["seconds"] = time.perf_counter() - self._started
+        self.record["error"] = exc_type.__name__ if exc_type else None
+        observe("audit_seconds", self.record["seconds"])
+        observe("audit_cost_usd", self.record["cost_usd"])
+        increment("audits_total")
+        with _lock:
+            _recent_audits.append(self.record)
+        return False
+
+
+def audit(category):
+    """
+    Context manager for one audit:
+        with telemetry.audit("Revenue Growth"): ...
+    """
+    return AuditSpan(category)
+
+
+def snapshot():
+    """
+    Current counters, per-histogram quantiles and the most recent audits.
+    """
+    with _lock:
+        histograms = {
+            name: {"count": h.count, "sum": h.total, "quantiles": h.quantiles()}
+            for name, h in _histograms.items()
+        }
+        return {"counters": dict(_counters), "histograms": histograms, "recent_audits": list(_recent_audits)}
+
+
+def _split(name):
+    base, _, label = name.partition(":")
+    return base, label
+
+
+def render_prometheus(prefix="marketing_engine"):
+    """
+    Prometheus text exposition format: histograms as summaries with p50/p95/p99.
+    """
+    snap = snapshot()
+    lines = []
+    seen_types = set()
+
+    for name, value in sorted(snap["counters"].items()):
+        base, label = _split(name)
+        metric = f"{prefix}_{base}"
+        if metric not in seen_types:
+            lines.append(f"# TYPE {metric} counter")
+            seen_types.add(metric)
+        labels = f'{{model="{label}"}}' if label else ""
+        lines.append(f"{metric}{labels} {value}")
+
+    for name, hist in sorted(snap["histograms"].items()):
+        base, label = _split(name)
+        metric = f"{prefix}_{base}"
+        if metric not in seen_types:
+            lines.append(f"# TYPE {metric} summary")
+            seen_types.add(metric)
+        label_part = f'{HISTOGRAM_LABELS.get(base, "stage")}="{label}",' if label else ""
+        for q, v in hist["quantiles"].items():
+            lines.append(f'{metric}{{{label_part}quantile="{q}"}} {v:.6f}')
+        plain = f"{{{label_part.rstrip(',')}}}" if label else ""
+        lines.append(f"{metric}_sum{plain} {hist['sum']:.6f}")
+        lines.append(f"{metric}_count{plain} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def serve_metrics(port=None, host="127.0.0.1"):
+    """
+    Serves render_prometheus() on http://host:port/metrics from a background thread.
+    Safe to call more than once; only the first call starts a server.
+    """
+    global _server
+    if _server is not None:
+        return _server
+    port = int(port if port is not None else os.getenv("TELEMETRY_PORT", 0))
+    if not port:
+        return None
+    _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
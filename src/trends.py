@@ -0,0 +1,262 @@
+"""
+Time-series metrics: daily / weekly / monthly rollups, rolling windows and
+period-over-period changes per campaign and channel.
+
+Everything starts from daily partials (compute_partials grouped by campaign, channel
+and day). They are mergeable, so new days are folded in with update_daily_partials()
+(the ingest store does this on every run) and the rollups only ever read the small
+daily table, never the raw rows again.
+"""
+import numpy as np
+import pandas as pd
+
+from src.metrics import GROUP_KEYS, compute_partials, finalize_totals, merge_partials
+
+PERIODS = {"daily": "D", "weekly": "W", "monthly": "M"}
+WINDOWS = (7, 30)
+
+# Metrics compared across periods, with how they are written in the trend summary.
+TREND_METRICS = {
+    "revenue": "revenue",
+    "spend": "spend",
+    "roas": "ROAS",
+    "cpa": "CPA",
+    "ctr": "CTR",
+    "conversion_rate": "conversion rate",
+}
+
+
+def daily_partials(df):
+    """
+    Mergeable partials per campaign, channel and day. Returns None when the data has no
+    date column.
+    """
+    if df is None or df.empty or "date" not in df:
+        return None
+    frame = df.assign(date=pd.to_datetime(df["date"]).dt.normalize())
+    for key in ("campaign_name", "channel"):
+        if key not in frame:
+            frame[key] = "Unknown"
+    return compute_partials(frame, GROUP_KEYS)
+
+
+def update_daily_partials(daily, new_rows):
+    """
+    Folds newly arrived rows into existing daily partials. Days already present are
+    combined, so late rows for an old day are counted too.
+    """
+    return merge_partials([daily, daily_partials(new_rows)])
+
+
+def _regroup(daily, by, period="daily"):
+    """
+    Re-aggregates daily partials to `by` + period start date; still partials.
+    """
+    frame = daily.reset_index()
+    if period != "daily":
+        frame["date"] = frame["date"].dt.to_period(PERIODS[period]).dt.start_time
+    keys = list(by) + ["date"]
+    frame = frame.drop(columns=[key for key in GROUP_KEYS if key in frame and key not in keys])
+    return merge_partials([frame.set_index(keys)])
+
+
+def overall_daily(daily):
+    """
+    Daily partials summed over all campaigns and channels (indexed by date only). Enough
+    for trend_summary(), and as many rows as there are days.
+    """
+    if daily is None or not len(daily):
+        return None
+    return _regroup(daily, ())
+
+
+def rollup(daily, period="weekly", by=("campaign_name", "channel")):
+    """
+    Totals and ratios per group and period ('daily', 'weekly' or 'monthly'), indexed by
+    `by` + the period's start date.
+    """
+    return finalize_totals(_regroup(daily, by, period))
+
+
+def period_over_period(daily, period="weekly", by=("campaign_name", "channel")):
+    """
+    rollup() plus '<metric>_prev' and '<metric>_change_pct' for every TREND_METRICS entry,
+    comparing each period with the one right before it (NaN when that period has no data).
+    """
+    by = list(by)
+    totals = rollup(daily, period, by).reset_index()
+    columns = ["date"] + list(TREND_METRICS)
+    prev = totals.groupby(by, sort=False)[columns].shift(1) if by else totals[columns].shift(1)
+    expected = (totals["date"].dt.to_period(PERIODS[period]) - 1).dt.start_time
+    consecutive = (prev["date"] == expected).to_numpy()
+
+    for metric in TREND_METRICS:
+        current = totals[metric].to_numpy(dtype=np.float64)
+        before = np.where(consecutive, prev[metric].to_numpy(dtype=np.float64), np.nan)
+        totals[f"{metric}_prev"] = before
+        totals[f"{metric}_change_pct"] = np.divide((current - before) * 100, np.abs(before),
+                                                   out=np.full(len(totals), np.nan), where=before != 0)
+    return totals.set_index(by + ["date"])
+
+
+def rolling(daily, window=7, by=("campaign_name", "channel")):
+    """
+    Trailing `window`-day totals and ratios (ROAS, CPA, CTR, ...) for every group and day
+    that has data, indexed by `by` + date.
+    """
+    by = list(by)
+    partials = _regroup(daily, by).reset_index()
+    numeric = [c for c in partials.columns if c not in by + ["date", "first_campaign_name"]]
+    if by:
+        # Indexed by `by` + date already.
+        rolled = partials.groupby(by, sort=False).rolling(f"{window}D", on="date")[numeric].sum()
+    else:
+        rolled = partials.rolling(f"{window}D", on="date")[numeric].sum()
+        rolled.index = pd.Index(partials["date"], name="date")
+    rolled["first_campaign_name"] = partials.set_index(by + ["date"])["first_campaign_name"]
+    return finalize_totals(rolled)
+
+
+def _cumulative(daily, by):
+    partials = _regroup(daily, by).reset_index().sort_values(by + ["date"])
+    numeric = [c for c in partials.columns if c not in by + ["date", "first_campaign_name"]]
+    source = partials.groupby(by, sort=False)[numeric] if by else partials[numeric]
+    cumulative = pd.concat([partials[by + ["date"]], source.cumsum()], axis=1)
+    return cumulative.sort_values("date"), numeric
+
+
+def _cumulative_at(cumulative, points, by, numeric, offsets):
+    """
+    Cumulative partials of each group as of its point's date minus each offset (in days),
+    zero before the group's first day. Returns an array shaped (offsets, points, numeric),
+    from a single as-of merge.
+    """
+    n_points = len(points)
+    stacked = pd.concat([points.assign(date=points["date"] - pd.Timedelta(days=offset)) for offset in offsets],
+                        ignore_index=True)
+    stacked["_order"] = np.arange(len(stacked))
+    found = pd.merge_asof(stacked.sort_values("date"), cumulative, on="date", by=by or None, direction="backward")
+    values = found.sort_values("_order")[numeric].to_numpy(dtype=np.float64, na_value=0.0)
+    return np.nan_to_num(values).reshape(len(offsets), n_points, len(numeric))
+
+
+def window_changes(daily, windows=WINDOWS, by=()):
+    """
+    For every group: its last day, days of history, and for each window the totals of the
+    last `window` days next to the `window` days before them, e.g. 'roas_7d' and
+    'roas_prev_7d'. Previous values are NaN when the history is shorter than two windows.
+    Computed from cumulative sums, so all comparisons come from one as-of lookup.
+    """
+    by = list(by)
+    cumulative, numeric = _cumulative(daily, by)
+    if by:
+        grouped = cumulative.groupby(by, sort=True)["date"]
+        points = grouped.max().reset_index()
+        first = grouped.min().to_numpy()
+    else:
+        points = pd.DataFrame({"date": [cumulative["date"].max()]})
+        first = cumulative["date"].min()
+
+    history_days = (points["date"] - first).dt.days.to_numpy() + 1
+    columns = {"last_date": points["date"].to_numpy(), "history_days": history_days}
+
+    offsets = sorted({0} | {w for w in windows} | {2 * w for w in windows})
+    at = _cumulative_at(cumulative, points, by, numeric, offsets)
+    position = {offset: i for i, offset in enumerate(offsets)}
+    # One finalize_totals over every (window, current/previous) slice stacked together.
+    slices = []
+    for window in windows:
+        slices.append(at[position[0]] - at[position[window]])
+        slices.append(at[position[window]] - at[position[2 * window]])
+    stacked = pd.DataFrame(np.concatenate(slices), columns=numeric).assign(first_campaign_name="")
+    totals = finalize_totals(stacked)
+
+    n_points = len(points)
+    for i, window in enumerate(windows):
+        full_history = history_days >= 2 * window
+        for metric in TREND_METRICS:
+            values = totals[metric].to_numpy()
+            columns[f"{metric}_{window}d"] = values[2 * i * n_points:(2 * i + 1) * n_points]
+            columns[f"{metric}_prev_{window}d"] = np.where(
+                full_history, values[(2 * i + 1) * n_points:(2 * i + 2) * n_points], np.nan)
+    index = pd.MultiIndex.from_frame(points[by]) if len(by) > 1 else (pd.Index(points[by[0]]) if by else None)
+    return pd.DataFrame(columns, index=index)
+
+
+def _fmt(metric, value):
+    if metric in ("revenue", "spend", "cpa"):
+        return f"${value:,.2f}"
+    if metric in ("ctr", "conversion_rate"):
+        return f"{value:.2f}%"
+    return f"{value:.2f}"
+
+
+def _describe_window(row, window):
+    parts = []
+    has_previous = not np.isnan(row[f"revenue_prev_{window}d"])
+    for metric, label in TREND_METRICS.items():
+        value = row[f"{metric}_{window}d"]
+        if not has_previous:
+            parts.append(f"{label} {_fmt(metric, value)}")
+            continue
+        before = row[f"{metric}_prev_{window}d"]
+        if metric in ("revenue", "spend"):
+            change = f"{(value - before) * 100 / before:+.1f}%" if before else "new"
+            parts.append(f"{label} {_fmt(metric, value)} ({change})")
+        else:
+            parts.append(f"{label} {_fmt(metric, value)} (was {_fmt(metric, before)})")
+    if has_previous:
+        return f"Last {window} days vs the {window} days before: " + ", ".join(parts)
+    return f"Last {window} days (no earlier period to compare): " + ", ".join(parts)
+
+
+def format_trend(row, windows=WINDOWS):
+    """
+    Short text summary of one window_changes() row, for the user prompt.
+    """
+    days = int(row["history_days"])
+    last = pd.Timestamp(row["last_date"]).strftime("%Y-%m-%d")
+    if days < 2:
+        return f"Only one day of data ({last}); no trend available yet."
+    lines = [f"History: {days} days up to {last}."]
+    lines += [_describe_window(row, window) for window in windows if days >= window]
+    if len(lines) == 1:
+        lines.append(_describe_window(row, windows[0]))
+    return "\n".join(lines)
+
+
+def change_ratios(row, windows=WINDOWS):
+    """
+    The numbers behind one window_changes() row's trend: for every window with an earlier
+    period, each metric's last-window value over the previous one (e.g. 'roas_7d': 1.12),
+    rounded to 4 digits. Unlike the summary text they do not move with the end date, so
+    near-duplicate reuse (src/similar.py) can compare them.
+    """
+    ratios = {}
+    for window in windows:
+        for metric in TREND_METRICS:
+            value, before = row[f"{metric}_{window}d"], row[f"{metric}_prev_{window}d"]
+            if np.isfinite(value) and np.isfinite(before) and before > 0 and value >= 0:
+                ratios[f"{metric}_{window}d"] = round(float(value / before), 4)
+    return ratios
+
+
+def trend_summaries(daily, by="campaign_name", windows=WINDOWS):
+    """
+    {group key: (trend summary text, change_ratios)} for every group, from one vectorized pass.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    table = window_changes(daily, windows, by)
+    return {key: (format_trend(row, windows), change_ratios(row, windows))
+            for key, row in zip(table.index, table.to_dict("records"))}
+
+
+def trend_summary(daily, windows=WINDOWS):
+    """
+    (trend summary text, change_ratios) over all campaigns and channels, or (None, {})
+    without daily data.
+    """
+    if daily is None or not len(daily):
+        return None, {}
+    row = window_changes(daily, windows).iloc[0].to_dict()
+    return format_trend(row, windows), change_ratios(row, windows)
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from src.client import CircuitBreaker, CircuitOpenError, ClientConfig, ClientManager
+
+
+def expire(breaker):
+    """
+    Moves an open breaker to half-open without sleeping.
+    """
+    breaker.opened_at -= breaker.reset_seconds
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_admits_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    for _ in range(3):
+        breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_neutral_outcome_frees_the_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+    breaker.record_neutral()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+def manager_raising(error):
+    def create(**kwargs):
+        raise error
+
+    manager = ClientManager(ClientConfig(api_key="test", breaker_failures=1, breaker_reset_seconds=60))
+    manager._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return manager
+
+
+def test_other_errors_during_the_trial_do_not_wedge_the_breaker():
+    manager = manager_raising(ValueError("bad request"))
+    breaker = manager.breaker_for("m")
+    breaker.record_failure()
+    expire(breaker)
+
+    with pytest.raises(ValueError):
+        manager.chat_completion(model="m", messages=[])
+    assert breaker.state == "half-open"
+    with pytest.raises(ValueError):
+        manager.chat_completion(model="m", messages=[])
+
+
+def test_outage_errors_open_the_breaker():
+    manager = manager_raising(openai.APIConnectionError(request=None))
+    with pytest.raises(openai.APIConnectionError):
+        manager.chat_completion(model="m", messages=[])
+    with pytest.raises(CircuitOpenError):
+        manager.chat_completion(model="m", messages=[])
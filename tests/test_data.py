@@ -0,0 +1,25 @@
+import pytest
+
+from src import data
+from src.metrics import CATEGORIES
+
+CSV = """campaign_name,date,channel,spend,revenue,conversions,impressions,clicks,new_customers,customer_satisfaction_score,retained_customers,churn_rate
+Summer Sale,2026-02-01,Meta,5000,12000,350,150000,4500,220,4.3,680,0.05
+Summer Sale,2026-02-02,Google,2500.5,4000.25,120,80000,2400,90,4.1,300,0.07
+Winter Push,2026-02-02,Meta,1000,0,0,20000,0,0,3.2,10,0.2
+"""
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "campaign_data.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+@pytest.mark.parametrize("category", CATEGORIES)
+def test_category_columns_give_the_same_metrics(csv_path, category):
+    full = data.load_data(csv_path, use_store=False)
+    narrow = data.load_data(csv_path, use_store=False, category=category)
+    assert set(narrow.columns) < set(full.columns)
+    assert data.get_metrics_for_category(category, narrow) == data.get_metrics_for_category(category, full)
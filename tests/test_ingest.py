@@ -0,0 +1,81 @@
+import os
+import shutil
+
+from src import data, ingest
+
+HEADER = "campaign_name,date,channel,spend,revenue,conversions,impressions,clicks\n"
+
+
+def row(day, spend, campaign="Summer Sale"):
+    return f"{campaign},2026-02-{day:02d},Meta,{spend},{spend * 2},10,1000,100\n"
+
+
+def write(path, *rows, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        if mode == "w":
+            f.write(HEADER)
+        f.writelines(rows)
+
+
+def total_spend(store):
+    return float(store.load()["spend"].sum())
+
+
+def test_first_ingest_then_only_new_rows(tmp_path):
+    csv = tmp_path / "campaign_data.csv"
+    write(csv, row(1, 100), row(2, 200))
+    store = ingest.sync(str(csv))
+    assert store.manifest["total_rows"] == 2
+
+    write(csv, row(3, 300), mode="a")
+    store = ingest.CampaignStore(ingest.default_store_dir(str(csv)))
+    assert store.ingest([str(csv)]) == 1
+    assert store.ingest([str(csv)]) == 0
+    assert total_spend(store) == 600
+    assert len(store.manifest["parts"]) == 2
+    assert float(store.campaign_totals().loc["Summer Sale", "spend"]) == 600
+
+
+def test_same_size_edit_rebuilds(tmp_path):
+    csv = tmp_path / "campaign_data.csv"
+    write(csv, row(1, 100), row(2, 200))
+    ingest.sync(str(csv))
+    write(csv, row(1, 300), row(2, 200))
+    os.utime(csv, ns=(0, os.stat(csv).st_mtime_ns + 1_000_000))
+    assert total_spend(ingest.sync(str(csv))) == 500
+
+
+def test_rebuild_then_load(tmp_path, capsys):
+    csv = tmp_path / "campaign_data.csv"
+    write(csv, row(1, 100), row(2, 200))
+    ingest.sync(str(csv))
+
+    ingest.main([str(csv), "--rebuild"])
+    assert '"rows_added": 2' in capsys.readouterr().out
+
+    df = data.load_data(str(csv))
+    assert "unavailable" not in capsys.readouterr().out
+    assert float(df["spend"].sum()) == 300
+
+
+def test_reset_is_saved(tmp_path):
+    csv = tmp_path / "campaign_data.csv"
+    write(csv, row(1, 100))
+    store = ingest.sync(str(csv))
+    store.reset()
+    reopened = ingest.CampaignStore(store.store_dir)
+    assert reopened.manifest["sources"] == {}
+    assert reopened.load() is None
+
+
+def test_moving_data_with_its_store_stays_incremental(tmp_path):
+    old = tmp_path / "old"
+    old.mkdir()
+    write(old / "campaign_data.csv", row(1, 2500), row(2, 2500))
+    ingest.sync(str(old / "campaign_data.csv"))
+
+    new = tmp_path / "new"
+    shutil.move(str(old), str(new))
+    store = ingest.CampaignStore(ingest.default_store_dir(str(new / "campaign_data.csv")))
+    assert store.ingest([str(new / "campaign_data.csv")]) == 0
+    assert total_spend(store) == 5000
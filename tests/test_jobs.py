@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from src.jobs import CANCELLED, DONE, FAILED, JobExecutor, audit_key
+
+
+@pytest.fixture
+def executor():
+    executor = JobExecutor(max_workers=2)
+    yield executor
+    executor.shutdown()
+
+
+def streaming(release, chunks=("a", "b")):
+    """
+    A job function that appends chunks, waiting for `release` after the first.
+    """
+    def run(job):
+        for i, chunk in enumerate(chunks):
+            if job.cancelled:
+                return None
+            job.append(chunk)
+            if i == 0:
+                release.wait(5)
+        return "result"
+    return run
+
+
+def test_identical_jobs_are_deduplicated(executor):
+    release = threading.Event()
+    first = executor.submit("key", streaming(release))
+    second = executor.submit("key", streaming(release))
+    assert second is first and first.subscribers == 2
+    release.set()
+    assert first.wait(5)
+    assert first.status == DONE and first.result == "result" and first.text == "ab"
+    # A finished job is not joined again.
+    assert executor.submit("key", streaming(release)) is not first
+
+
+def test_job_stops_once_every_subscriber_cancelled(executor):
+    release = threading.Event()
+    job = executor.submit("key", streaming(release))
+    executor.submit("key", streaming(release))
+    assert executor.cancel(job.id) is False
+    assert not job.cancelled
+    assert executor.cancel(job.id) is True
+    release.set()
+    assert job.wait(5) and job.status == CANCELLED
+    assert job.text == "a"
+
+
+def test_unsubscribe_never_stops_the_job(executor):
+    release = threading.Event()
+    job = executor.submit("key", streaming(release))
+    executor.submit("key", streaming(release))
+    executor.unsubscribe(job.id)
+    executor.unsubscribe(job.id)
+    assert job.subscribers == 1 and not job.cancelled
+    assert executor.cancel(job.id) is True
+    release.set()
+    job.wait(5)
+
+
+def test_cancelled_key_starts_a_new_job(executor):
+    release = threading.Event()
+    job = executor.submit("key", streaming(release))
+    executor.cancel(job.id)
+    assert executor.submit("key", streaming(release)) is not job
+    release.set()
+
+
+def test_read_returns_unseen_chunks(executor):
+    release = threading.Event()
+    job = executor.submit("key", streaming(release))
+    chunks, done = job.read(0, timeout=5)
+    assert chunks == ["a"] and not done
+    release.set()
+    job.wait(5)
+    assert job.read(1) == (["b"], True)
+
+
+def test_failures_are_reported(executor):
+    def broken(job):
+        raise RuntimeError("boom")
+
+    job = executor.submit("key", broken)
+    assert job.wait(5) and job.status == FAILED and job.error == "boom"
+
+
+def test_add_finished_is_readable_without_running(executor):
+    job = executor.add_finished("key", "report", {"headline": "A"}, timings={"materialized_at": 1.0})
+    assert executor.get(job.id) is job
+    assert job.done and job.text == "report" and job.timings["materialized_at"] == 1.0
+
+
+def test_audit_key_separates_modes():
+    metrics = {"Total Spend": 1}
+    assert audit_key("Revenue Growth", metrics) == audit_key("Revenue Growth", dict(metrics))
+    assert audit_key("Revenue Growth", metrics) != audit_key("Revenue Growth", metrics, fast=True)
+    assert audit_key("Revenue Growth", metrics) != audit_key("Revenue Growth", metrics, refresh=True)
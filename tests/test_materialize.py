@@ -0,0 +1,38 @@
+import pytest
+
+import src.llm as llm_handler
+from src import data, materialize
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = materialize.MaterializedStore(":memory:")
+    monkeypatch.setattr(materialize, "get_store", lambda: store)
+    return store
+
+
+def test_lookup_only_stats_the_file(tmp_path, store, monkeypatch):
+    csv = tmp_path / "campaign_data.csv"
+    csv.write_text("campaign_name,spend\nA,1\n")
+    version = materialize.data_version(str(csv))
+    store.record_file(data.file_identity(str(csv)), version)
+    store.put(version, "Revenue Growth", materialize.ALL_CAMPAIGNS, llm_handler.report_version("Revenue Growth"),
+              {"Total Spend": 1}, "{}")
+
+    def no_hashing(path):
+        raise AssertionError("lookup hashed the data file")
+
+    monkeypatch.setattr(materialize, "data_version", no_hashing)
+    assert materialize.lookup("Revenue Growth", str(csv)).report == "{}"
+
+    csv.write_text("campaign_name,spend\nA,1\nB,2\n")
+    assert materialize.lookup("Revenue Growth", str(csv)) is None
+
+
+def test_pruned_versions_forget_their_files(store):
+    for i in range(materialize.KEEP_VERSIONS + 1):
+        store.start_run(f"v{i}", "data.csv")
+        store.record_file((f"/data{i}.csv", i, 10), f"v{i}")
+    store.prune()
+    assert store.version_for(("/data0.csv", 0, 10)) is None
+    assert store.version_for((f"/data{materialize.KEEP_VERSIONS}.csv", materialize.KEEP_VERSIONS, 10)) is not None
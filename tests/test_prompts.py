@@ -0,0 +1,26 @@
+import importlib
+
+from src import prompts
+
+
+def test_compaction_is_opt_in(monkeypatch):
+    monkeypatch.delenv("PROMPT_COMPACT", raising=False)
+    try:
+        assert not importlib.reload(prompts).COMPACT_DEFAULT
+        monkeypatch.setenv("PROMPT_COMPACT", "true")
+        assert importlib.reload(prompts).COMPACT_DEFAULT
+    finally:
+        monkeypatch.undo()
+        importlib.reload(prompts)
+
+
+def test_compaction_changes_the_prompt_versions():
+    """
+    Cache keys and precomputed audits include these versions, so switching compaction
+    never serves a report written for the other prompt.
+    """
+    original = prompts.PromptRegistry(check_interval=None, compact=False)
+    compact = prompts.PromptRegistry(check_interval=None, compact=True)
+    for category in prompts.CATEGORY_PROMPT_FILES:
+        assert original.versions(category)["system"] != compact.versions(category)["system"]
+        assert len(compact.compiled(category)[0]) < len(original.compiled(category)[0])
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from src.data import get_metrics_for_category
+from src.similar import SimilarCache, metric_vector
+
+GROUP = ("route", 0.7, "Revenue Growth", "Summer Sale", {"system": "v1"})
+
+
+def metrics(spend=5000.0, revenue=12000.0, **extra):
+    return {"Campaign Name": "Summer Sale", "Total Spend": spend, "Total Revenue": revenue,
+            "ROAS": f"{revenue / spend:.2f}", "CTR": "3.00%", **extra}
+
+
+def campaign_frame(days, growth=0.0, seed=0):
+    """
+    `days` days of one campaign; revenue grows by `growth` per day.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2026-01-01", periods=days, freq="D")
+    spend = 1000 + rng.normal(0, 5, days)
+    revenue = 2500 * (1 + growth) ** np.arange(days) + rng.normal(0, 5, days)
+    return pd.DataFrame({"campaign_name": "Summer Sale", "date": dates, "channel": "Meta", "spend": spend,
+                         "revenue": revenue, "conversions": 50, "impressions": 20000, "clicks": 600,
+                         "new_customers": 40})
+
+
+def test_metric_vector_reads_numbers_percentages_and_nested_ratios():
+    names, values = metric_vector(metrics(**{"Trend": "up", "Trend Changes": {"revenue_7d": 1.5}}))
+    assert names == ("CTR", "ROAS", "Total Revenue", "Total Spend", "Trend Changes/revenue_7d")
+    assert np.isclose(values[0], np.log(3.0))
+    assert np.isclose(values[-1], np.log(1.5))
+
+
+def test_hit_within_tolerance_and_miss_outside():
+    cache = SimilarCache(tolerance=0.02)
+    cache.add(GROUP, metrics(), "report")
+
+    match = cache.lookup(GROUP, metrics(spend=5050.0, revenue=12100.0))
+    assert match is not None and match.response == "report"
+    assert 0 < match.max_change <= 0.02
+    assert cache.lookup(GROUP, metrics(spend=5500.0)) is None
+    assert cache.lookup(GROUP[:3] + ("Winter Sale", GROUP[4]), metrics()) is None
+
+
+def test_zero_only_matches_zero():
+    cache = SimilarCache(tolerance=0.02)
+    cache.add(GROUP, metrics(**{"Total Conversions": 0}), "report")
+    assert cache.lookup(GROUP, metrics(**{"Total Conversions": 0})) is not None
+    assert cache.lookup(GROUP, metrics(**{"Total Conversions": 1})) is None
+
+
+def test_one_more_day_of_a_steady_trend_is_reused():
+    cache = SimilarCache(tolerance=0.02)
+    before = get_metrics_for_category("Revenue Growth", campaign_frame(60))
+    after = get_metrics_for_category("Revenue Growth", campaign_frame(61))
+    assert before["Trend"] != after["Trend"]
+    cache.add(GROUP, before, "report")
+    assert cache.lookup(GROUP, after) is not None
+
+
+def test_reversed_trend_is_not_reused():
+    cache = SimilarCache(tolerance=0.02)
+    rising = campaign_frame(60, growth=0.01)
+    falling = rising.assign(revenue=rising["revenue"].to_numpy()[::-1])
+    up = get_metrics_for_category("Revenue Growth", rising)
+    down = get_metrics_for_category("Revenue Growth", falling)
+    # Same totals, opposite direction.
+    assert up["Total Revenue"] == down["Total Revenue"]
+    cache.add(GROUP, up, "report")
+    assert cache.lookup(GROUP, down) is None
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SimilarCache(path=path).add(GROUP, metrics(), "report")
+    assert SimilarCache(path=path).lookup(GROUP, metrics()).response == "report"
@@ -0,0 +1,63 @@
+import json
+
+from src.stream_parser import ReportStreamParser
+
+REPORT = {
+    "headline": "ROAS is up, but \"Summer\" spend is {uneven}",
+    "analysis": "Revenue grew 12%, driven by Meta.\nSpend, clicks and CTR held steady.",
+    "confidence_score": 82,
+    "detected_issues": ["CTR below 1%", {"channel": "Email", "note": "no conversions]"}],
+}
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for i in range(0, len(text), size):
+        completed += parser.feed(text[i:i + size])
+    return completed
+
+
+def test_fields_complete_in_order_whatever_the_chunking():
+    text = json.dumps(REPORT)
+    for size in (1, 2, 7, len(text)):
+        parser = ReportStreamParser()
+        assert feed_in_chunks(parser, text, size) == list(REPORT.items())
+        assert parser.fields == REPORT
+        assert parser.done
+
+
+def test_field_is_reported_only_once_it_is_complete():
+    parser = ReportStreamParser()
+    assert parser.feed('{"headline": "Spend is') == []
+    assert parser.first_field_seconds is None
+    assert parser.feed(' flat", "analy') == [("headline", "Spend is flat")]
+    assert parser.first_field_seconds is not None
+    assert parser.feed('sis": "Fine"}') == [("analysis", "Fine")]
+
+
+def test_fence_before_the_object_and_text_after_it_are_ignored():
+    parser = ReportStreamParser()
+    completed = parser.feed('```json\n{"headline": "Up"}\n```\n{"headline": "Again"}')
+    assert completed == [("headline", "Up")]
+    assert parser.done
+    assert parser.feed('{"analysis": "More"}') == []
+
+
+def test_cut_off_stream_keeps_only_the_complete_fields():
+    parser = ReportStreamParser()
+    parser.feed('{"headline": "Up", "confidence_score": 70, "analysis": "Revenue grew by')
+    assert parser.fields == {"headline": "Up", "confidence_score": 70}
+    assert not parser.done
+
+
+def test_invalid_values_are_kept_as_raw_text():
+    parser = ReportStreamParser()
+    completed = parser.feed('{"confidence_score": about 80, "headline": "Up"}')
+    assert completed == [("confidence_score", "about 80"), ("headline", "Up")]
+
+
+def test_garbage_input_yields_no_fields():
+    for text in ("", "Sorry, I can't help with that.", "[1, 2, 3]", '"headline": "Up",', "}}}"):
+        parser = ReportStreamParser()
+        assert feed_in_chunks(parser, text, 3) == []
+        assert parser.fields == {}